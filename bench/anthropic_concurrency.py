@@ -0,0 +1,79 @@
+"""
+Wall time of N concurrent process_query_list() calls vs one, with a stubbed Anthropic client.
+
+The planning loop runs against bench.fake_llm.FakePlanner (AsyncAnthropic stand-in, latency
+simulated with asyncio.sleep) and the in-tree custom MCP servers. For comparison the same run
+is repeated with a planner that blocks the event loop for its latency, like the synchronous
+Anthropic() client did before the planning loop moved to AsyncAnthropic. With a non-blocking
+client N concurrent queries take about as long as one; a blocking one takes about N times.
+
+Usage (from the repository root):
+    python -m bench.anthropic_concurrency --concurrency 8
+    python -m bench.anthropic_concurrency --concurrency 16 --planner-latency 0.5 --tool-rounds 3
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from loguru import logger
+
+from bench.fake_llm import FakePlanner, _FakeStream
+from bench.mcp_servers import connect_custom_servers, load_queries
+from mcp_clients.client import BaseMCPClient
+
+
+class BlockingPlanner(FakePlanner):
+    """FakePlanner whose calls block the event loop for their latency (synchronous client)."""
+
+    async def create(self, **kwargs):
+        message = self._next_message(kwargs)
+        time.sleep(self._delay())
+        return message
+
+    def stream(self, **kwargs):
+        message = self._next_message(kwargs)
+        time.sleep(self._delay())
+        return _FakeStream(message, 0.0)
+
+
+async def run_level(client: BaseMCPClient, queries: list, concurrency: int, model: str) -> float:
+    """Run `concurrency` queries at once and return the wall time in seconds."""
+    batch = [queries[i % len(queries)] for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client.process_query_list(query, model) for query in batch))
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent queries (N)")
+    parser.add_argument("--planner-latency", type=float, default=1.0)
+    parser.add_argument("--tool-rounds", type=int, default=2)
+    parser.add_argument("--tools-per-round", type=int, default=2)
+    parser.add_argument("--stdio-servers", action="store_true", help="run MCP servers as subprocesses")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    # In-process MCP servers log every request through the standard logging module
+    logging.disable(logging.INFO)
+
+    client = BaseMCPClient("mcp_client_system_prompt.txt")
+    await connect_custom_servers(client, in_process=not args.stdio_servers)
+    queries = load_queries()
+    try:
+        print(f"{'client':<10} {'1 query':>9} {f'{args.concurrency} queries':>12} {'ratio':>7}")
+        for name, planner_class in (("async", FakePlanner), ("blocking", BlockingPlanner)):
+            # No jitter: both levels see the same per-call latency
+            client.anthropic = planner_class(args.planner_latency, 0.0, args.tool_rounds, args.tools_per_round)
+            single = await run_level(client, queries, 1, client.model)
+            concurrent = await run_level(client, queries, args.concurrency, client.model)
+            print(f"{name:<10} {single:8.2f}s {concurrent:11.2f}s {concurrent / single:6.1f}x")
+    finally:
+        await client.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
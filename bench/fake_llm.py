@@ -0,0 +1,259 @@
+"""
+Offline stand-ins for the model providers, used by the benchmarks (bench.replay).
+
+FakeLLM replaces core.llm.call_gpt / call_gemini, so call_llm keeps its cache, scheduler,
+metrics and tracing; only the provider round trip is simulated. Responses are synthetic but
+shaped like the parser of each call site expects:
+  - expression:    {"index": k} within the candidate list
+  - classify:      {"indices": [k]} / "SELECTED_INDEX: k" within the numbered catalog
+  - map:           the layout samples of the layouts whose description is in the prompt
+  - image_prompts: unique keywords for every "slot|path" target
+  - progress:      one plain-text progress line
+
+FakePlanner replaces BaseMCPClient.anthropic (messages.create / messages.stream). It plans
+`tool_rounds` rounds of `tools_per_round` tool calls, picking the available MCP tools whose
+names and descriptions share the most words with the intent, then answers with text.
+
+Picks depend only on the prompt (timestamps masked) and latency is `latency + U(0, jitter)`
+seconds from a seeded RNG, so runs are repeatable up to scheduling order.
+"""
+
+import asyncio
+from collections import Counter
+from datetime import date
+import hashlib
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import core.llm
+from core.llm_replay import LLM_REPLAY_KEY_IGNORE
+
+_WORD = re.compile(r"[a-z]{3,}")
+# Timestamps in prompts must not change the picks between runs
+_VOLATILE = re.compile(LLM_REPLAY_KEY_IGNORE) if LLM_REPLAY_KEY_IGNORE else None
+_STOP_WORDS = {"the", "and", "for", "with", "from", "that", "this", "what", "show", "get", "list",
+               "recent", "user", "retrieve", "returns", "args", "json", "str", "int", "can", "you", "are", "was"}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _digest(text: str) -> int:
+    if _VOLATILE is not None:
+        text = _VOLATILE.sub("", text)
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _words(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOP_WORDS}
+
+
+class FakeLLM:
+    """Synthetic provider for call_llm (install() patches core.llm, uninstall() restores it)."""
+
+    def __init__(self,
+                 layouts_by_type: Optional[Mapping[str, Sequence[Dict]]] = None,
+                 latency: float = 0.5,
+                 jitter: float = 0.3,
+                 seed: int = 0):
+        self.layouts_by_type = layouts_by_type or {}
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self._saved = None
+
+    def install(self) -> "FakeLLM":
+        if self._saved is None:
+            self._saved = (core.llm.call_gpt, core.llm.call_gemini)
+            core.llm.call_gpt = core.llm.call_gemini = self
+        return self
+
+    def uninstall(self) -> None:
+        if self._saved is not None:
+            core.llm.call_gpt, core.llm.call_gemini = self._saved
+            self._saved = None
+
+    async def __call__(self, prompt: str, model_name: str, site: str = "other") -> str:
+        await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+        text = self.respond(prompt, site)
+        self.calls[site] += 1
+        core.llm._record_usage(model_name, site, estimate_tokens(prompt), estimate_tokens(text))
+        return text
+
+    # ----- responses per call site -----
+
+    def respond(self, prompt: str, site: str) -> str:
+        handler = getattr(self, f"_respond_{site}", None)
+        return handler(prompt) if handler else "OK"
+
+    def _respond_expression(self, prompt: str) -> str:
+        count = prompt.count('{"index": ')
+        return json.dumps({"index": _digest(prompt) % count if count else 0})
+
+    def _respond_classify(self, prompt: str) -> str:
+        count = len(re.findall(r"^\[\d+\] ", prompt, re.M))
+        index = _digest(prompt) % count if count else 0
+        if '"indices"' in prompt:
+            return json.dumps({"indices": [index]})
+        return f"SELECTED_INDEX: {index}"
+
+    def _respond_map(self, prompt: str) -> str:
+        result = {}
+        for slot, layouts in self.layouts_by_type.items():
+            # Longest description found in the prompt wins (short ones may be prefixes of others)
+            matches = [l for l in layouts if (l.get("layout_data") or {}).get("description", "") in prompt
+                       and (l.get("layout_data") or {}).get("description")]
+            if matches:
+                best = max(matches, key=lambda l: len(l["layout_data"]["description"]))
+                result[slot] = best["layout_data"].get("sample") or {}
+        return json.dumps(result, ensure_ascii=False)
+
+    def _respond_image_prompts(self, prompt: str) -> str:
+        try:
+            targets = json.loads(prompt.split("Targets:\n", 1)[1])
+        except (IndexError, ValueError):
+            return "{}"
+        keywords = {}
+        for i, target in enumerate(targets):
+            subject = " ".join(_WORD.findall(str(target.get("path", "")).lower())[-2:]) or "still life"
+            keywords[f"{target.get('slot')}|{target.get('path')}"] = f"{subject} {target.get('slot')} {i}"
+        return json.dumps(keywords)
+
+    def _respond_progress(self, prompt: str) -> str:
+        return "Checking your recent activity now"
+
+
+class _FakeStream:
+    """messages.stream(...) context: one content_block_stop event per block, spread over the latency."""
+
+    def __init__(self, message: SimpleNamespace, delay: float):
+        self._message = message
+        self._delay = delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> bool:
+        return False
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        blocks = self._message.content
+        for block in blocks:
+            await asyncio.sleep(self._delay / len(blocks))
+            yield SimpleNamespace(type="content_block_stop", content_block=block)
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return self._message
+
+
+class FakePlanner:
+    """AsyncAnthropic stand-in for the MCP planning loop (assign to BaseMCPClient.anthropic)."""
+
+    def __init__(self,
+                 latency: float = 1.0,
+                 jitter: float = 0.5,
+                 tool_rounds: int = 2,
+                 tools_per_round: int = 2,
+                 seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tool_rounds = tool_rounds
+        self.tools_per_round = tools_per_round
+        self._rng = random.Random(seed)
+        self._tool_words: Dict[str, set] = {}
+        self.calls = 0
+        self.tool_calls = 0
+        self.messages = SimpleNamespace(create=self.create, stream=self.stream)
+
+    async def create(self, **kwargs) -> SimpleNamespace:
+        message = self._next_message(kwargs)
+        await asyncio.sleep(self._delay())
+        return message
+
+    def stream(self, **kwargs) -> _FakeStream:
+        return _FakeStream(self._next_message(kwargs), self._delay())
+
+    async def close(self) -> None:
+        pass
+
+    def _delay(self) -> float:
+        return self.latency + self._rng.uniform(0, self.jitter)
+
+    def _next_message(self, kwargs: Dict[str, Any]) -> SimpleNamespace:
+        self.calls += 1
+        messages = kwargs.get("messages") or []
+        query = str(messages[0].get("content", "")) if messages else ""
+        done_rounds = self._completed_rounds(messages)
+        if done_rounds < self.tool_rounds:
+            tools = self._rank_tools(query, kwargs.get("tools") or [])
+            picked = tools[done_rounds * self.tools_per_round:(done_rounds + 1) * self.tools_per_round]
+        else:
+            picked = []
+        if picked:
+            blocks = [SimpleNamespace(type="tool_use", id=f"toolu_{self._rng.getrandbits(64):016x}",
+                                      name=tool["name"], input=self._arguments(tool, query)) for tool in picked]
+            self.tool_calls += len(blocks)
+            stop_reason = "tool_use"
+        else:
+            blocks = [SimpleNamespace(type="text", text="I have collected the data needed for this request.")]
+            stop_reason = "end_turn"
+        usage = SimpleNamespace(input_tokens=estimate_tokens(json.dumps(messages, default=str)),
+                                output_tokens=40 * len(blocks))
+        return SimpleNamespace(content=blocks, usage=usage, stop_reason=stop_reason)
+
+    def _completed_rounds(self, messages: List[Dict[str, Any]]) -> int:
+        """Tool rounds already planned in this conversation (the next round is planned after them)."""
+        return sum(1 for m in messages if m.get("role") == "assistant" and self._planned_by_us(m))
+
+    @staticmethod
+    def _planned_by_us(message: Dict[str, Any]) -> bool:
+        # The forced sequentialthinking turn is appended by the client as plain dicts
+        content = message.get("content")
+        return isinstance(content, list) and any(not isinstance(block, dict) for block in content)
+
+    def _rank_tools(self, query: str, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        intent_line = next((line for line in query.splitlines() if line.startswith("intent:")), query)
+        intent = _words(intent_line)
+        scored = []
+        for tool in tools:
+            name = tool.get("name", "")
+            if name == "sequentialthinking" or "send" in name:
+                continue
+            words = self._tool_words.get(name)
+            if words is None:
+                words = self._tool_words[name] = _words(name.replace("_", " ") + " " + (tool.get("description") or ""))
+            scored.append((-len(intent & words), name, tool))
+        scored.sort(key=lambda item: item[:2])
+        return [tool for _, _, tool in scored]
+
+    @staticmethod
+    def _arguments(tool: Dict[str, Any], query: str) -> Dict[str, Any]:
+        schema = tool.get("input_schema") or {}
+        properties = schema.get("properties") or {}
+        keyword = max(sorted(_words(query.split("\n", 1)[0])) or ["today"], key=len)
+        args = {}
+        for name in schema.get("required") or []:
+            kind = (properties.get(name) or {}).get("type", "string")
+            if kind == "integer":
+                args[name] = 5
+            elif kind == "number":
+                args[name] = 1.0
+            elif kind == "boolean":
+                args[name] = False
+            elif kind == "array":
+                args[name] = []
+            elif kind == "object":
+                args[name] = {}
+            elif "date" in name or "time" in name:
+                args[name] = date.today().isoformat()
+            else:
+                args[name] = keyword
+        return args
@@ -0,0 +1,102 @@
+"""
+Legacy single-POST image batch vs the chunked streaming client (core.image_client).
+
+Starts bench.stub_image_server in-process and reports time to first image, total time and
+images lost per batch.
+
+Usage (from the repository root):
+    python -m bench.image_stream --images 8 --batches 5 --fail-rate 0.1
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import sys
+import time
+
+import httpx
+from loguru import logger
+import uvicorn
+
+from bench.stub_image_server import create_app
+from core.image_client import ImageServiceClient
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def legacy_batch(url: str, requests: list) -> tuple:
+    """The previous call_image_service: one POST, timeout=10, all-or-nothing."""
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            resp = await client.post(url, json={"requests": requests})
+            resp.raise_for_status()
+            images = [d["image_data"] for d in resp.json().get("images")]
+    except Exception:
+        images = []
+    elapsed = time.perf_counter() - started
+    return (elapsed if images else None), elapsed, len(requests) - len(images)
+
+
+async def streaming_batch(client: ImageServiceClient, url: str, requests: list) -> tuple:
+    started = time.perf_counter()
+    first = []
+
+    async def on_image(index: int, image: str) -> None:
+        if not first:
+            first.append(time.perf_counter() - started)
+
+    results = await client.generate(url, requests, on_image=on_image)
+    return (first[0] if first else None), time.perf_counter() - started, sum(r is None for r in results)
+
+
+def _summary(name: str, rows: list, images_per_batch: int) -> str:
+    firsts = [r[0] for r in rows if r[0] is not None]
+    first_text = f"{statistics.median(firsts):6.2f}s" if firsts else "     -"
+    return (f"{name:<10} first image p50 {first_text}  total p50 {statistics.median(r[1] for r in rows):6.2f}s"
+            f"  max {max(r[1] for r in rows):6.2f}s  lost {sum(r[2] for r in rows)}/{images_per_batch * len(rows)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8, help="images per batch")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--jitter", type=float, default=0.6)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(args.latency, args.jitter, 1.0, args.fail_rate, seed=1), host="127.0.0.1", port=port, log_level="warning"
+    ))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    url = f"http://127.0.0.1:{port}/generate"
+
+    client = ImageServiceClient(backoff=0.1)
+    legacy, streaming = [], []
+    for b in range(args.batches):
+        requests = [{"prompt": f"image {b}-{i}", "width": args.size, "height": args.size, "model": "stub"}
+                    for i in range(args.images)]
+        legacy.append(await legacy_batch(url, requests))
+        streaming.append(await streaming_batch(client, url, requests))
+    await client.aclose()
+
+    print(_summary("legacy", legacy, args.images))
+    print(_summary("streaming", streaming, args.images))
+    server.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
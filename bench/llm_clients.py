@@ -0,0 +1,108 @@
+"""
+Per-call OpenAI client (the previous call_gpt) vs the pooled provider registry (core.llm.llm_clients).
+
+Starts bench.stub_openai_server in-process and sends --calls chat completions through each
+path, --concurrency at a time. The stub answers after --latency seconds, so the reported
+p50/p99 is that latency plus the client-side overhead (client construction, connection
+setup, request encoding). Also reports how many TCP connections the stub saw.
+
+The stub speaks plain HTTP: per-call clients also pay a TLS handshake against the real API,
+so their overhead here is a lower bound.
+
+Usage (from the repository root):
+    python -m bench.llm_clients --calls 500 --concurrency 8
+    python -m bench.llm_clients --latency 0.05 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+
+from loguru import logger
+from openai import AsyncOpenAI
+import uvicorn
+
+from bench.stub_openai_server import create_app
+import core.llm
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+async def per_call_client(base_url: str, prompt: str, model_name: str) -> str:
+    """The previous call_gpt: a new AsyncOpenAI client (and connection pool) for every call.
+
+    The old code never closed these clients; here they are closed so leaked sockets do not
+    pile up over the run and the numbers show only construction and connection setup.
+    """
+    async with AsyncOpenAI(api_key="stub", base_url=base_url) as client:
+        response = await client.chat.completions.create(model=model_name, messages=[{"role": "user", "content": prompt}])
+    return response.choices[0].message.content
+
+
+async def pooled_client(base_url: str, prompt: str, model_name: str) -> str:
+    return await core.llm.call_gpt(prompt, model_name, site="bench")
+
+
+async def run_path(call, base_url: str, calls: int, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await call(base_url, f"bench prompt {i}", "gpt-4.1-mini")
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(_one(i) for i in range(calls)))
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response latency (s)")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    app = create_app(args.latency)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    # The registry reads these on first use
+    core.llm.OPENAI_BASE_URL = base_url
+    core.llm.OPENAI_API_KEY = "stub"
+
+    print(f"{args.calls} calls, concurrency {args.concurrency}, stub latency {args.latency * 1000:.0f}ms")
+    print(f"{'client':<10} {'p50':>9} {'p99':>9} {'max':>9} {'connections':>12}")
+    try:
+        for name, call in (("per-call", per_call_client), ("pooled", pooled_client)):
+            await run_path(call, base_url, min(args.concurrency, args.calls), args.concurrency)  # warm-up
+            app.state.connections = set()
+            lat = [v * 1000 for v in await run_path(call, base_url, args.calls, args.concurrency)]
+            print(f"{name:<10} {percentile(lat, 50):7.2f}ms {percentile(lat, 99):7.2f}ms {max(lat):7.2f}ms"
+                  f" {len(app.state.connections):>12}")
+    finally:
+        await core.llm.llm_clients.aclose()
+        server.should_exit = True
+        await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
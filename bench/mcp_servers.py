@@ -0,0 +1,58 @@
+"""
+Connect a BaseMCPClient to the in-tree custom MCP servers (no npm / network servers) for benchmarks.
+
+    client = BaseMCPClient("mcp_client_system_prompt.txt")
+    await connect_custom_servers(client, in_process=True)
+    ...
+    await client.cleanup()
+"""
+
+import asyncio
+import json
+import os
+from typing import List, Optional, Sequence
+
+from mcp_clients.client import BaseMCPClient
+from mcp_clients.manager import BaseMCPManager
+
+CUSTOM_SERVERS_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "mcp_clients", "user_client", "custom_mcp_servers")
+)
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "queries.jsonl")
+
+
+def custom_server_paths(names: Optional[Sequence[str]] = None) -> List[str]:
+    """Server scripts in the order the manager starts them, optionally only the given module names."""
+    paths = BaseMCPManager.load_custom_mcp_servers(None, CUSTOM_SERVERS_DIR)
+    if names:
+        wanted = set(names)
+        paths = [p for p in paths if os.path.splitext(os.path.basename(p))[0] in wanted]
+    return paths
+
+
+async def connect_custom_servers(client: BaseMCPClient,
+                                 paths: Optional[Sequence[str]] = None,
+                                 in_process: bool = True) -> None:
+    """Add every server concurrently under the same ids as BaseMCPManager (custom_<module>)."""
+    client.in_process_custom_servers = in_process
+    paths = list(paths) if paths is not None else custom_server_paths()
+    results = await asyncio.gather(*(
+        client.add_server(f"custom_{os.path.splitext(os.path.basename(p))[0]}", p) for p in paths
+    ))
+    failed = [p for p, ok in zip(paths, results) if not ok]
+    if failed:
+        raise RuntimeError(f"Failed to start MCP servers: {failed}")
+
+
+def load_queries(path: str = DEFAULT_QUERIES) -> List[dict]:
+    """process_query_list() payloads ({"intent", "context"}) from a JSONL request file."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("intent"):
+                queries.append({"intent": row["intent"], "context": row.get("context") or {}})
+    return queries
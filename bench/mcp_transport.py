@@ -0,0 +1,109 @@
+"""
+stdio subprocesses vs in-process transport for the bundled custom MCP servers.
+
+For each mode (stdio first, so the in-process imports do not inflate its numbers) all custom
+servers are started as MCP_IN_PROCESS_CUSTOM_SERVERS would do, the same tool is called
+--calls times through BaseMCPServerConnection.call_tool (no tool result cache), and the
+per-call p50/p95/max latency, the startup time and the RSS of this process plus its child
+processes are reported.
+
+Usage (from the repository root):
+    python -m bench.mcp_transport
+    python -m bench.mcp_transport --server samsung_health --calls 500
+    python -m bench.mcp_transport --only samsung_calendar   # start only that server
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from loguru import logger
+import psutil
+
+from bench.fake_llm import FakePlanner
+from bench.mcp_servers import connect_custom_servers, custom_server_paths
+from mcp_clients.client import BaseMCPClient
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def total_rss() -> int:
+    """RSS of this process and all of its descendants, in bytes."""
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+async def run_mode(in_process: bool, paths: list, server: str, tool_name: str, calls: int) -> dict:
+    rss_before = total_rss()
+    client = BaseMCPClient("mcp_client_system_prompt.txt")
+    started = time.perf_counter()
+    await connect_custom_servers(client, paths, in_process=in_process)
+    startup = time.perf_counter() - started
+    try:
+        connection = client.server_connections[f"custom_{server}"]
+        tools = await connection.get_tools()
+        tool = next((t for t in tools if t["name"] == tool_name), None) if tool_name else tools[0]
+        if tool is None:
+            raise SystemExit(f"Tool {tool_name!r} not found on {server}: {[t['name'] for t in tools]}")
+        arguments = FakePlanner._arguments(tool, "today")
+        await connection.call_tool(tool["name"], arguments)  # warm-up
+        latencies = []
+        for _ in range(calls):
+            call_started = time.perf_counter()
+            await connection.call_tool(tool["name"], arguments)
+            latencies.append(time.perf_counter() - call_started)
+        rss_after = total_rss()
+    finally:
+        await client.cleanup()
+    return {
+        "tool": tool["name"],
+        "startup_s": startup,
+        "latencies_s": latencies,
+        "rss_mb": rss_after / 2**20,
+        "rss_delta_mb": (rss_after - rss_before) / 2**20,
+        "processes": len(paths) if not in_process else 0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="samsung_calendar", help="custom server module whose tool is called")
+    parser.add_argument("--tool", help="tool name (default: the server's first tool)")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="start only these server modules (default: all)")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    # In-process MCP servers log every request through the standard logging module
+    logging.disable(logging.INFO)
+
+    paths = custom_server_paths(args.only)
+    if not any(os.path.splitext(os.path.basename(p))[0] == args.server for p in paths):
+        raise SystemExit(f"Server {args.server!r} is not among the started servers")
+
+    rows = [(name, await run_mode(in_process, paths, args.server, args.tool, args.calls))
+            for name, in_process in (("stdio", False), ("in-process", True))]
+
+    print(f"{len(paths)} servers, {args.calls} calls of {args.server}.{rows[0][1]['tool']}")
+    print(f"{'mode':<11} {'startup':>8} {'p50':>9} {'p95':>9} {'max':>9} {'rss total':>10} {'rss delta':>10} {'subprocs':>9}")
+    for name, row in rows:
+        lat = [v * 1000 for v in row["latencies_s"]]
+        print(f"{name:<11} {row['startup_s']:7.2f}s {percentile(lat, 50):7.2f}ms {percentile(lat, 95):7.2f}ms"
+              f" {max(lat):7.2f}ms {row['rss_mb']:7.0f} MB {row['rss_delta_mb']:7.0f} MB {row['processes']:>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Planning iterations per request: regression check for tool_result / tool_use_id pairing.
+
+Runs the replay intents through process_query_list() with a stub planner (bench.fake_llm)
+and the in-tree custom MCP servers. Tool calls finish out of order (random extra delay per
+call) and every result is tagged with the id of the call that produced it. The planner
+accepts a round only when each tool_result carries its own tool_use_id; a mis-paired round
+is planned again, as the model re-issues calls it did not get answers for. With correct
+pairing every request takes tool_rounds + 1 iterations.
+
+Usage (from the repository root):
+    python -m bench.planning_iterations
+    python -m bench.planning_iterations --tool-rounds 3 --tools-per-round 4 --check
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import sys
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from bench.fake_llm import FakePlanner
+from bench.mcp_servers import connect_custom_servers, load_queries
+from mcp_clients.client import BaseMCPClient
+
+
+class PairingPlanner(FakePlanner):
+    """FakePlanner that only counts a round as done when its tool results are paired correctly."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mispaired_rounds = 0
+
+    def _completed_rounds(self, messages: List[Dict[str, Any]]) -> int:
+        done = 0
+        for i, message in enumerate(messages):
+            if message.get("role") != "assistant" or not self._planned_by_us(message):
+                continue
+            reply = messages[i + 1].get("content") if i + 1 < len(messages) else None
+            if self._paired(reply):
+                done += 1
+            elif i + 2 == len(messages):
+                # Count each mis-paired round once, when it is the latest one
+                self.mispaired_rounds += 1
+        return done
+
+    @staticmethod
+    def _paired(content: Any) -> bool:
+        if not isinstance(content, list):
+            return False
+        return all(str(block.get("content", "")).startswith(f"[{block.get('tool_use_id')}]")
+                   for block in content if isinstance(block, dict) and block.get("type") == "tool_result")
+
+
+def tag_tool_results(client: BaseMCPClient, max_delay: float, seed: int) -> None:
+    """Delay every tool call randomly and prefix its result with the tool_use_id."""
+    execute = client._execute_single_tool_call
+    rng = random.Random(seed)
+
+    async def _execute(tool_call):
+        await asyncio.sleep(rng.uniform(0, max_delay))
+        result, error = await execute(tool_call)
+        if isinstance(result, dict):
+            result = dict(result, tool_result=f"[{tool_call.id}] {result.get('tool_result', '')}")
+        return result, error
+
+    client._execute_single_tool_call = _execute
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tool-rounds", type=int, default=2)
+    parser.add_argument("--tools-per-round", type=int, default=3)
+    parser.add_argument("--planner-latency", type=float, default=0.05)
+    parser.add_argument("--tool-delay", type=float, default=0.05, help="max extra delay per tool call (s)")
+    parser.add_argument("--no-stream", action="store_true", help="plan with messages.create instead of streaming")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any request needs extra iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    # In-process MCP servers log every request through the standard logging module
+    logging.disable(logging.INFO)
+
+    client = BaseMCPClient("mcp_client_system_prompt.txt")
+    await connect_custom_servers(client)
+    planner = PairingPlanner(args.planner_latency, 0.0, args.tool_rounds, args.tools_per_round, args.seed)
+    client.anthropic = planner
+    client.stream_tool_use = not args.no_stream
+    tag_tool_results(client, args.tool_delay, args.seed)
+
+    expected = args.tool_rounds + 1
+    counts = []
+    try:
+        for query in load_queries():
+            calls = planner.calls
+            await client.process_query_list(query, client.model)
+            counts.append(planner.calls - calls)
+            marker = "" if counts[-1] == expected else "  <-- extra iterations"
+            print(f"{counts[-1]:>3}  {query['intent'][:70]}{marker}")
+    finally:
+        await client.cleanup()
+
+    extra = sum(max(0, n - expected) for n in counts)
+    print(f"requests {len(counts)}  iterations/request {sum(counts) / max(1, len(counts)):.2f} (expected {expected})"
+          f"  extra iterations {extra}  mis-paired rounds {planner.mispaired_rounds}")
+    return 1 if args.check and extra else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
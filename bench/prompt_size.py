@@ -0,0 +1,96 @@
+"""
+Prompt size (and optionally latency) of the layout classifier / data mapper prompts per schema mode.
+
+Usage (from the repository root):
+    python -m bench.prompt_size
+    python -m bench.prompt_size --intent "Show my spending history for this month." --live --repeat 3
+
+Token counts use tiktoken when installed, otherwise a chars/4 estimate.
+--live calls the configured models through core.llm.call_llm (response cache bypassed).
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from loguru import logger
+
+from core.data_mapper import DataMapper
+from core.layout_classifier import LayoutClassifier
+from core.layout_schema import SCHEMA_RENDER_MODES
+from core.llm import call_llm
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def build_prompts(mode: str, intent: str, context: dict, user_data: str):
+    classifier = LayoutClassifier(schema_mode=mode)
+    middle = classifier.layouts_by_type.get("middle", [])
+    classify_prompt = classifier._create_generic_prompt(
+        intent, context, user_data, classifier._build_candidates_text(middle), "middle", 1
+    )
+
+    mapper = DataMapper(schema_mode=mode)
+    layouts = {"middle": middle[0] if middle else {}}
+    for slot in ("top", "bottom", "button"):
+        pool = classifier.fixed_layouts.get(slot) or []
+        layouts[slot] = pool[0] if pool else {}
+
+    def _slot(key):
+        data = (layouts.get(key) or {}).get("layout_data") or {}
+        return mapper.extract_parameters_schema(data) or {}, data.get("description", "")
+
+    (top_s, top_d), (mid_s, mid_d), (bot_s, bot_d), (btn_s, btn_d) = [_slot(k) for k in ("top", "middle", "bottom", "button")]
+    mapping_prompt = mapper._build_4layouts_prompt(
+        intent=intent, context=context, user_data_text=user_data,
+        top_desc=top_d, mid_desc=mid_d, bottom_desc=bot_d, button_desc=btn_d,
+        top_schema=top_s, mid_schema=mid_s, bottom_schema=bot_s, button_schema=btn_s,
+    )
+    return {"classify": classify_prompt, "mapping": mapping_prompt}
+
+
+async def measure_latency(prompt: str, model_name: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call_llm(prompt, model_name=model_name, use_cache=False)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intent", default="Tell me the weather in Seoul right now.")
+    parser.add_argument("--user-data", default="")
+    parser.add_argument("--live", action="store_true", help="also measure end-to-end LLM latency")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--classify-model", default="gpt-5-nano")
+    parser.add_argument("--mapping-model", default="gpt-4.1-mini")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    models = {"classify": args.classify_model, "mapping": args.mapping_model}
+    print(f"{'mode':<10} {'prompt':<9} {'chars':>8} {'tokens':>8} {'latency_s':>10}")
+    for mode in SCHEMA_RENDER_MODES:
+        prompts = build_prompts(mode, args.intent, {}, args.user_data)
+        for name, prompt in prompts.items():
+            latency = await measure_latency(prompt, models[name], args.repeat) if args.live else None
+            latency_text = f"{latency:10.2f}" if latency is not None else f"{'-':>10}"
+            print(f"{mode:<10} {name:<9} {len(prompt):>8} {count_tokens(prompt):>8} {latency_text}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,315 @@
+"""
+Offline replay benchmark: recorded requests through main.process() end to end.
+
+Everything runs in this process, without network access:
+  - call_llm and the Anthropic planning loop are served by bench.fake_llm, or by recorded
+    fixtures (--fixtures, core.llm_replay)
+  - MCP tools are the in-tree custom servers (mcp_clients/user_client/custom_mcp_servers)
+  - images come from bench.stub_image_server on a local port
+Socket.IO events are captured instead of sent. Reports throughput, end-to-end and
+first-result latency, p50/p95/p99 per pipeline stage, event-loop lag and peak RSS.
+
+Usage (from the repository root):
+    python -m bench.replay --concurrency 8 --repeat 2
+    python -m bench.replay --llm-latency 0.2 --planner-latency 0.4 --json replay.json
+    python -m bench.replay --record cache/fixtures.jsonl      # synthetic responses -> fixtures
+    python -m bench.replay --fixtures cache/fixtures.jsonl    # fixtures (recorded or LLM_REPLAY_MODE=record)
+
+Request file: one {"intent": str, "context"?: dict, "protocolVersion"?: int} per line;
+lines without an intent are skipped.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+import json
+import logging
+import os
+import resource
+import socket
+import sys
+import time
+
+from loguru import logger
+import psutil
+import uvicorn
+
+from bench.fake_llm import FakeLLM, FakePlanner
+from bench.stub_image_server import create_app
+from core.llm import set_llm_cache
+from core.llm_cache import create_llm_cache
+from core.llm_replay import LLMReplayStore, ReplayAnthropic, set_replay_store
+from core.pipeline import PipelineRun
+import main
+from mcp_clients import client as mcp_client_module
+from mcp_clients.manager import BaseMCPManager
+
+DEFAULT_REQUESTS = os.path.join(os.path.dirname(__file__), "replay_requests.jsonl")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def load_requests(path: str) -> list:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if isinstance(row, dict) and isinstance(row.get("intent"), str) and row["intent"]:
+                rows.append(row)
+    return rows
+
+
+class LoopLagMonitor:
+    """Samples how late a short sleep wakes up; the overshoot is time the loop was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list = []
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+
+class Recorder:
+    """Replaces main.sio.emit and PipelineRun.log_timings to collect per-request results."""
+
+    def __init__(self):
+        self.sent_at: dict = {}
+        self.first_result: dict = {}
+        self.outcome: dict = {}
+        self.events: Counter = Counter()
+        self.stage_durations: dict = {}
+        self._emit = main.sio.emit
+        self._log_timings = PipelineRun.log_timings
+
+    def install(self) -> None:
+        recorder = self
+
+        async def emit(event, data=None, room=None, **kwargs):
+            recorder.events[event] += 1
+            if event in ("result_slot", "result") and room not in recorder.first_result:
+                recorder.first_result[room] = time.perf_counter() - recorder.sent_at[room]
+            if event == "result":
+                failed = isinstance(data, str) and data.startswith("error")
+                recorder.outcome[room] = "error" if failed else "ok"
+
+        def log_timings(run):
+            for name, timing in run.timings().items():
+                recorder.stage_durations.setdefault(name, []).append(timing["duration"])
+            recorder._log_timings(run)
+
+        main.sio.emit = emit
+        PipelineRun.log_timings = log_timings
+
+    def uninstall(self) -> None:
+        main.sio.emit = self._emit
+        PipelineRun.log_timings = self._log_timings
+
+
+async def start_mcp(anthropic) -> None:
+    """Connect the user MCP service to the in-tree custom servers only (no npm / network servers)."""
+    service = main.mcp_user_service
+    manager = service.mcp_manager
+    await BaseMCPManager.init_mcp_client(
+        manager,
+        custom_servers=True,
+        external_servers=False,
+        custom_base_dir=os.path.join(manager.config_dir, "custom_mcp_servers"),
+    )
+    service._initialized = True
+    manager.mcp_client_instance.anthropic = anthropic
+
+
+async def replay(requests: list, args, recorder: Recorder) -> tuple:
+    queue: asyncio.Queue = asyncio.Queue()
+    for r in range(args.repeat):
+        for i, row in enumerate(requests):
+            queue.put_nowait((f"replay-{r}-{i}", row))
+    durations = []
+
+    async def worker():
+        while not queue.empty():
+            sid, row = queue.get_nowait()
+            recorder.sent_at[sid] = time.perf_counter()
+            await main.query(sid, {"clientId": sid, **row})
+            session = main.active_sessions.get(sid)
+            if session:
+                try:
+                    await session["task"]
+                except Exception as e:
+                    recorder.outcome[sid] = "error"
+                    logger.error(f"{sid} failed: {e}")
+            durations.append(time.perf_counter() - recorder.sent_at[sid])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return durations, time.perf_counter() - started
+
+
+def _row(name: str, values: list, scale: float = 1.0) -> str:
+    if not values:
+        return f"{name:<28} {'-':>6}"
+    p = [percentile(values, q) * scale for q in (50, 95, 99)]
+    return f"{name:<28} {len(values):>6} {p[0]:>9.3f} {p[1]:>9.3f} {p[2]:>9.3f} {max(values) * scale:>9.3f}"
+
+
+async def run(args) -> dict:
+    planner = FakePlanner(args.planner_latency, args.planner_jitter, args.tool_rounds, args.tools_per_round, args.seed)
+    fake_llm = FakeLLM(main.layout_classifier.snapshot.layouts_by_type, args.llm_latency, args.llm_jitter, args.seed)
+    if args.fixtures:
+        # Recorded responses instead of the synthetic ones (core.llm_replay)
+        store = LLMReplayStore(args.fixtures, mode="replay", latency_scale=args.fixture_latency_scale, on_miss=args.on_miss)
+        anthropic = ReplayAnthropic(store=store)
+    else:
+        fake_llm.install()
+        store = LLMReplayStore(args.record, mode="record") if args.record else None
+        anthropic = ReplayAnthropic(planner, store) if store else planner
+    set_replay_store(store)
+    set_llm_cache(create_llm_cache("memory" if args.llm_cache else "off"))
+    main.IMAGE_CACHE_ENABLED = args.image_cache
+    main.preload_agent_expressions()
+    mcp_client_module.MCP_IN_PROCESS_CUSTOM_SERVERS = not args.stdio_servers
+    await start_mcp(anthropic)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(args.image_latency, args.image_jitter, 1.0, 0.0, seed=args.seed),
+        host="127.0.0.1", port=port, log_level="warning",
+    ))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    main.IMAGE_SERVICE_URL = f"http://127.0.0.1:{port}/generate"
+
+    requests = load_requests(args.requests)
+    recorder = Recorder()
+    recorder.install()
+    lag = LoopLagMonitor()
+    rss_start = psutil.Process().memory_info().rss
+    lag.start()
+    try:
+        durations, wall = await replay(requests, args, recorder)
+    finally:
+        await lag.stop()
+        recorder.uninstall()
+        fake_llm.uninstall()
+        if store is not None:
+            store.close()
+            set_replay_store(None)
+        await main.mcp_user_service.cleanup()
+        await main.image_client.aclose()
+        server.should_exit = True
+        await serve_task
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    total = len(durations)
+    outcomes = Counter(recorder.outcome.get(sid, "none") for sid in recorder.sent_at)
+    return {
+        "requests": total,
+        "concurrency": args.concurrency,
+        "wall_s": wall,
+        "throughput_rps": total / wall if wall else 0.0,
+        "outcomes": dict(outcomes),
+        "end_to_end_s": durations,
+        "first_result_s": list(recorder.first_result.values()),
+        "stages_s": recorder.stage_durations,
+        "loop_lag_s": lag.samples,
+        "rss_start_mb": rss_start / 2**20,
+        "rss_peak_mb": peak_rss / 2**20,
+        "llm_calls": {site: n for site, n in store.hits.items() if site != "plan"} if args.fixtures else dict(fake_llm.calls),
+        "planner_calls": store.hits["plan"] if args.fixtures else planner.calls,
+        "tool_calls": None if args.fixtures else planner.tool_calls,
+        "replay": store.stats() if store else None,
+        "events": dict(recorder.events),
+    }
+
+
+def report(result: dict) -> None:
+    n = max(1, result["requests"])
+    print(f"requests {result['requests']}  concurrency {result['concurrency']}  wall {result['wall_s']:.2f}s"
+          f"  throughput {result['throughput_rps']:.2f} req/s  outcomes {result['outcomes']}")
+    print(f"{'':<28} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}   (seconds)")
+    print(_row("end_to_end", result["end_to_end_s"]))
+    print(_row("first_result", result["first_result_s"]))
+    for name, values in sorted(result["stages_s"].items()):
+        print(_row(f"stage.{name}", values))
+    print(f"{'':<28} {'samples':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}   (ms)")
+    print(_row("event_loop_lag", result["loop_lag_s"], 1000))
+    print(f"rss start {result['rss_start_mb']:.0f} MB  peak {result['rss_peak_mb']:.0f} MB")
+    tool_calls = f"{result['tool_calls'] / n:.1f}" if result["tool_calls"] is not None else "-"
+    print(f"per request: llm calls {sum(result['llm_calls'].values()) / n:.1f} {result['llm_calls']}"
+          f"  planner calls {result['planner_calls'] / n:.1f}  tool calls {tool_calls}")
+    if result["replay"]:
+        replay = result["replay"]
+        print(f"fixtures ({replay['mode']}) {replay['path']}: loaded {replay['fixtures']}  recorded {replay['recorded']}"
+              f"  misses {replay['misses'] or 0}")
+
+
+async def main_async() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", default=DEFAULT_REQUESTS, help="JSONL file of recorded requests")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the file this many times")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--planner-latency", type=float, default=1.0)
+    parser.add_argument("--planner-jitter", type=float, default=0.5)
+    parser.add_argument("--tool-rounds", type=int, default=2)
+    parser.add_argument("--tools-per-round", type=int, default=2)
+    parser.add_argument("--image-latency", type=float, default=0.8)
+    parser.add_argument("--image-jitter", type=float, default=0.6)
+    parser.add_argument("--llm-cache", action="store_true", help="keep the in-memory LLM response cache on")
+    parser.add_argument("--image-cache", action="store_true", help="keep the on-disk image cache on")
+    parser.add_argument("--stdio-servers", action="store_true", help="run MCP servers as subprocesses")
+    parser.add_argument("--record", help="append the fake LLM / planner responses to this fixture file")
+    parser.add_argument("--fixtures", help="serve LLM and planner calls from this fixture file instead")
+    parser.add_argument("--fixture-latency-scale", type=float, default=1.0, help="multiplier for recorded latencies")
+    parser.add_argument("--on-miss", choices=("error", "site"), default="site",
+                        help="unmatched prompt: fail the call, or serve a fixture of the same model and call site")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write raw samples to this file")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    # MCP servers and httpx log every request through the standard logging module
+    logging.disable(logging.INFO)
+
+    result = await run(args)
+    report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
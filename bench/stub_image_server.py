@@ -0,0 +1,99 @@
+"""
+Local stub of the image generation service (POST /generate) for benchmarks.
+
+Usage (from the repository root):
+    python -m bench.stub_image_server --port 8000 --latency 0.8 --jitter 0.6 --fail-rate 0.05
+
+Each image takes `latency + per-megapixel * MP + U(0, jitter)` seconds; images of one request
+are generated concurrently. The reply format follows the Accept header like the real service
+is expected to: NDJSON or SSE stream one {"index", "image_data"} per image as it finishes
+(failed images are sent as {"index", "error"}), anything else gets the legacy JSON body
+{"images": [{"image_data"}, ...]} after the slowest image (HTTP 500 if any image failed).
+Images are solid-colour PNGs of the requested size.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import struct
+import zlib
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def solid_png(width: int, height: int, rgb: tuple) -> bytes:
+    def _chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(rgb) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + _chunk(b"IDAT", zlib.compress(row * height, 6))
+        + _chunk(b"IEND", b"")
+    )
+
+
+def create_app(latency: float = 0.8, jitter: float = 0.6, per_megapixel: float = 1.0,
+               fail_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="Stub image service")
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.images = 0
+
+    async def _generate(index: int, req: dict) -> dict:
+        width, height = int(req.get("width") or 512), int(req.get("height") or 512)
+        await asyncio.sleep(latency + per_megapixel * width * height / 1e6 + rng.uniform(0, jitter))
+        app.state.images += 1
+        if rng.random() < fail_rate:
+            return {"index": index, "error": "stub failure"}
+        rgb = tuple(hashlib.md5(str(req.get("prompt")).encode()).digest()[:3])
+        return {"index": index, "image_data": base64.b64encode(solid_png(width, height, rgb)).decode("ascii")}
+
+    @app.post("/generate")
+    async def generate(request: Request):
+        app.state.requests += 1
+        reqs = (await request.json()).get("requests") or []
+        accept = request.headers.get("accept", "")
+        tasks = [asyncio.create_task(_generate(i, r)) for i, r in enumerate(reqs)]
+
+        if "ndjson" in accept or "event-stream" in accept:
+            sse = "ndjson" not in accept
+
+            async def _stream():
+                for done in asyncio.as_completed(tasks):
+                    line = json.dumps(await done)
+                    yield f"data: {line}\n\n" if sse else line + "\n"
+
+            return StreamingResponse(_stream(), media_type="text/event-stream" if sse else "application/x-ndjson")
+
+        results = await asyncio.gather(*tasks)
+        if any("error" in r for r in results):
+            return JSONResponse({"detail": "generation failed"}, status_code=500)
+        return {"images": [{"image_data": r["image_data"]} for r in results]}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.8, help="base seconds per image")
+    parser.add_argument("--jitter", type=float, default=0.6, help="extra uniform random seconds per image")
+    parser.add_argument("--per-megapixel", type=float, default=1.0, help="extra seconds per megapixel")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.latency, args.jitter, args.per_megapixel, args.fail_rate, args.seed),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Local stub of the OpenAI Chat Completions API (POST /v1/chat/completions) for benchmarks.
+
+Usage (from the repository root):
+    python -m bench.stub_openai_server --port 8100 --latency 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub python main.py
+
+Every request waits `latency + U(0, jitter)` seconds and answers with a fixed assistant
+message and token usage. The app counts requests and distinct client connections
+(app.state.requests, app.state.connections) so callers can see connection reuse.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI, Request
+
+
+def create_app(latency: float = 0.0, jitter: float = 0.0, reply: str = "OK", seed: int = 0) -> FastAPI:
+    app = FastAPI(title="Stub OpenAI API")
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.connections = set()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        if request.client is not None:
+            app.state.connections.add((request.client.host, request.client.port))
+        body = await request.json()
+        await asyncio.sleep(latency + rng.uniform(0, jitter))
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages") or [])
+        return {
+            "id": f"chatcmpl-stub-{app.state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": max(1, prompt_chars // 4),
+                "completion_tokens": max(1, len(reply) // 4),
+                "total_tokens": max(1, prompt_chars // 4) + max(1, len(reply) // 4),
+            },
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="base seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random seconds per request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.latency, args.jitter, seed=args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,32 +3,39 @@ import json
 from typing import Dict, Any, Optional
 from loguru import logger
 from .llm import call_llm
+from .tracing import tracer
+from .layout_schema import ImagePathPlan, extract_parameters_schema, image_path_plans, schema_render_cache
+
+# Schema format in the 4-layouts mapping prompt: json (original prompt) | minified | signature
+DATA_MAPPER_SCHEMA_MODE = os.getenv("DATA_MAPPER_SCHEMA_MODE", "json")
+# Only internal processing hints are stripped; examples/defaults guide the generated values
+DATA_MAPPER_STRIP_KEYS = ("tool_type", "render_size")
+# Stand-in for missing slot schemas; one shared object so the render cache (keyed by identity) can hit
+_EMPTY_SCHEMA: Dict[str, Any] = {}
 
 class DataMapper:
     """
     선택된 레이아웃의 파라미터를 LLM을 통해서만 매핑하는 클래스
     """
     
-    def __init__(self):
-        pass
+    def __init__(self, schema_mode: str = DATA_MAPPER_SCHEMA_MODE):
+        self.schema_mode = schema_mode
     
     def extract_parameters_schema(self, layout_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """레이아웃 JSON에서 parameters 스키마를 일관되게 추출한다.
 
         일부 레이아웃은 최상위에 `parameters` 키가 있고, 일부는 `properties.parameters` 아래에 정의되어 있음.
-        없으면 None 반환.
+        없으면 None 반환. (core.layout_schema 공용 구현 사용)
+        """
+        return extract_parameters_schema(layout_data)
+
+    def image_path_plan(self, layout_data: Dict[str, Any]) -> ImagePathPlan:
+        """레이아웃 parameters 스키마의 이미지 경로 plan (tool_type: image_search 대상).
+
+        스키마 객체별로 한 번만 컴파일되며(레지스트리 로드 시 미리 컴파일), 요청마다
+        `plan.resolve(mapped_data)`로 실제 경로만 계산한다.
         """
-        if not isinstance(layout_data, dict):
-            return None
-        if "parameters" in layout_data and isinstance(layout_data.get("parameters"), dict):
-            return layout_data.get("parameters")
-        # footer 등 스키마가 properties 하위에 존재
-        props = layout_data.get("properties")
-        if isinstance(props, dict):
-            parameters = props.get("parameters")
-            if isinstance(parameters, dict):
-                return parameters
-        return None
+        return image_path_plans.get(self.extract_parameters_schema(layout_data))
 
     def _parse_json_from_text(self, text: str) -> Any:
         """응답 텍스트에서 JSON 객체를 최대한 견고하게 파싱한다."""
@@ -109,14 +116,17 @@ class DataMapper:
             button_schema=slots["button"]["schema"],
         )
 
-        try:
-            response_text = await call_llm(prompt, model_name=model_name)
-            parsed = self._parse_json_from_text(response_text) or {}
-            if not isinstance(parsed, dict):
-                raise ValueError("4-layouts mapping result is not a JSON object")
-        except Exception as e:
-            logger.error(f"4-layouts 매핑 호출 실패: {e}")
-            parsed = {}
+        with tracer.span("map.layouts", {"gen_ai.request.model": model_name, "map.prompt_chars": len(prompt)}) as span:
+            try:
+                response_text = await call_llm(prompt, model_name=model_name, priority="critical", site="map",
+                                               validate=lambda r: isinstance(self._parse_json_from_text(r), dict))
+                parsed = self._parse_json_from_text(response_text) or {}
+                if not isinstance(parsed, dict):
+                    raise ValueError("4-layouts mapping result is not a JSON object")
+            except Exception as e:
+                logger.error(f"4-layouts 매핑 호출 실패: {e}")
+                span.set_error(str(e))
+                parsed = {}
 
         # 키 보정 및 폴백 처리
         result: Dict[str, Any] = {}
@@ -170,6 +180,12 @@ class DataMapper:
         def _js(v: Any) -> str:
             return json.dumps(v, ensure_ascii=False, indent=2)
 
+        def _schema(v: Optional[Dict[str, Any]]) -> str:
+            # 레이아웃별 스키마 렌더링은 캐시됨 (스키마 객체 단위)
+            if self.schema_mode == "minified":
+                return schema_render_cache.render(v or _EMPTY_SCHEMA, "minified", strip_keys=DATA_MAPPER_STRIP_KEYS)
+            return schema_render_cache.render(v or _EMPTY_SCHEMA, self.schema_mode)
+
         prompt = template_content
         prompt = prompt.replace("{{INTENT}}", str(intent))
         prompt = prompt.replace("{{CONTEXT}}", _js(context))
@@ -178,9 +194,9 @@ class DataMapper:
         prompt = prompt.replace("{{DESC_MIDDLE}}", str(mid_desc or ""))
         prompt = prompt.replace("{{DESC_BOTTOM}}", str(bottom_desc or ""))
         prompt = prompt.replace("{{DESC_BUTTON}}", str(button_desc or ""))
-        prompt = prompt.replace("{{SCHEMA_TOP}}", _js(top_schema or {}))
-        prompt = prompt.replace("{{SCHEMA_MIDDLE}}", _js(mid_schema or {}))
-        prompt = prompt.replace("{{SCHEMA_BOTTOM}}", _js(bottom_schema or {}))
-        prompt = prompt.replace("{{SCHEMA_BUTTON}}", _js(button_schema or {}))
+        prompt = prompt.replace("{{SCHEMA_TOP}}", _schema(top_schema))
+        prompt = prompt.replace("{{SCHEMA_MIDDLE}}", _schema(mid_schema))
+        prompt = prompt.replace("{{SCHEMA_BOTTOM}}", _schema(bottom_schema))
+        prompt = prompt.replace("{{SCHEMA_BUTTON}}", _schema(button_schema))
         return prompt
 
@@ -0,0 +1,122 @@
+"""
+How generated images are delivered to the client.
+
+IMAGE_DELIVERY selects the value injected at each image path:
+  - "data_uri": `data:image/png;base64,...` strings (default; the media type follows the image bytes)
+  - "blob":     a content-addressed URL (`<IMAGE_BLOB_BASE_URL>/blobs/<sha256>`) served from
+                the in-memory ImageBlobStore; payloads carry ~80 bytes per image instead of megabytes
+  - "binary":   raw bytes, which Socket.IO sends as binary attachments (no base64, no JSON escaping;
+                the client receives an ArrayBuffer)
+"""
+
+import base64
+from collections import OrderedDict
+import hashlib
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+from loguru import logger
+
+IMAGE_DELIVERY_MODES = ("data_uri", "blob", "binary")
+IMAGE_DELIVERY = os.getenv("IMAGE_DELIVERY", "data_uri").strip().lower()
+# Byte budget of the blob store (least recently used images are evicted first)
+IMAGE_BLOB_MAX_BYTES = int(os.getenv("IMAGE_BLOB_MAX_BYTES", str(256 * 1024 * 1024)))
+# Prefix of blob URLs, e.g. "http://localhost:8001" when the client is served from another origin
+IMAGE_BLOB_BASE_URL = os.getenv("IMAGE_BLOB_BASE_URL", "").rstrip("/")
+BLOB_ROUTE_PREFIX = "/blobs/"
+
+if IMAGE_DELIVERY not in IMAGE_DELIVERY_MODES:
+    logger.warning(f"Unknown IMAGE_DELIVERY={IMAGE_DELIVERY!r}; using data_uri (expected one of {IMAGE_DELIVERY_MODES})")
+    IMAGE_DELIVERY = "data_uri"
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_media_type(data: bytes) -> str:
+    for magic, media_type in _SIGNATURES:
+        if data.startswith(magic):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+class ImageBlobStore:
+    """In-memory content-addressed image store (sha256 -> bytes), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = IMAGE_BLOB_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, data: bytes, media_type: Optional[str] = None) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return digest
+        self._blobs[digest] = (data, media_type or sniff_media_type(data))
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and len(self._blobs) > 1:
+            _, (old, _) = self._blobs.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+        return digest
+
+    def get(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._blobs.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._blobs.move_to_end(digest)
+        self.hits += 1
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._blobs),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+image_blobs = ImageBlobStore()
+
+
+def blob_url(digest: str) -> str:
+    return f"{IMAGE_BLOB_BASE_URL}{BLOB_ROUTE_PREFIX}{digest}"
+
+
+def deliver_image(image: Union[str, bytes], mode: str = IMAGE_DELIVERY) -> Any:
+    """Turn an image (base64 text from the image service, or raw bytes from the image cache)
+    into the value injected into the result."""
+    if mode == "data_uri":
+        if isinstance(image, (bytes, bytearray)):
+            media_type = sniff_media_type(image)
+            image = base64.b64encode(image).decode("ascii")
+        else:
+            media_type = sniff_media_type(base64.b64decode(image[:32]))
+        return f"data:{media_type};base64,{image}"
+    data = image if isinstance(image, (bytes, bytearray)) else base64.b64decode(image)
+    if mode == "binary":
+        return data
+    return blob_url(image_blobs.put(data))
+
+
+def is_delivered_image(value: Any) -> bool:
+    """True for any value deliver_image can produce (used by the injection check)."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) > 0
+    if not isinstance(value, str):
+        return False
+    return value.startswith("data:image/") or value.startswith(f"{IMAGE_BLOB_BASE_URL}{BLOB_ROUTE_PREFIX}")
@@ -0,0 +1,165 @@
+"""
+Disk-backed, content-addressed cache of generated images.
+
+Images are keyed by a hash of (whitespace-normalized prompt, width, height, model) and
+stored as raw bytes under IMAGE_CACHE_DIR/<key[:2]>/<key>. The cache survives restarts
+and is shared by every session; identical requests within one batch are sent once.
+Total size is bounded by IMAGE_CACHE_MAX_BYTES with LRU eviction (a hit refreshes the
+file's mtime, so the order also survives restarts).
+"""
+
+import asyncio
+import base64
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from loguru import logger
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join("cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def make_image_key(request: Dict[str, Any], variant: str = "") -> str:
+    """Cache key of one image request ({prompt, width, height, model}); `variant` names the
+    post-processing applied before caching (see core.image_sizing.output_variant)."""
+    normalized = {
+        "variant": variant,
+        "prompt": _WHITESPACE_RE.sub(" ", str(request.get("prompt") or "")).strip(),
+        "width": int(request.get("width") or 0),
+        "height": int(request.get("height") or 0),
+        "model": str(request.get("model") or ""),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """Content-addressed image files with an in-memory LRU index (key -> size)."""
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU index from disk (oldest mtime first); called lazily once."""
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        if entries:
+            logger.info(f"Image cache loaded: {len(entries)} images, {self._bytes} bytes in {self.directory}")
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_sync(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self._bytes -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set_sync(self, key: str, data: bytes) -> None:
+        if not data or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Cached images for the given keys (misses are absent)."""
+        def _lookup() -> Dict[str, bytes]:
+            found = {}
+            for key in keys:
+                data = self.get_sync(key)
+                if data is not None:
+                    found[key] = data
+            return found
+        return await asyncio.to_thread(_lookup)
+
+    async def set_many(self, items: Dict[str, Union[bytes, str]]) -> None:
+        """Store images given as raw bytes or base64 text (decoded off the event loop)."""
+        def _store() -> None:
+            for key, data in items.items():
+                try:
+                    self.set_sync(key, data if isinstance(data, (bytes, bytearray)) else base64.b64decode(data))
+                except OSError as e:
+                    logger.warning(f"Failed to write image cache entry {key}: {e}")
+        await asyncio.to_thread(_store)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": IMAGE_CACHE_ENABLED,
+            "directory": self.directory,
+            "entries": len(self._index),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "deduplicated": self.deduplicated,
+            "evictions": self.evictions,
+        }
+
+
+image_cache = ImageCache()
@@ -0,0 +1,171 @@
+"""
+Streaming client for the image generation service.
+
+Requests are split into chunks of IMAGE_CHUNK_SIZE that run concurrently over one pooled
+httpx.AsyncClient. Each chunk is a POST {"requests": [...]} that asks for a streamed reply:
+  - NDJSON (application/x-ndjson): one {"index", "image_data"} object per line
+  - SSE (text/event-stream):       one `data: {"index", "image_data"}` event per image
+  - JSON (anything else):          the original {"images": [{"image_data"}, ...]} body
+`index` is the position within the chunk (arrival order when omitted); an object with
+"error" instead of "image_data" marks a failed image. Every image must arrive within
+IMAGE_TIMEOUT of the previous one; missing or failed images are retried with exponential
+backoff, so one slow or failed image no longer loses the whole batch.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from .tracing import tracer
+
+IMAGE_CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", "2"))
+IMAGE_CHUNK_CONCURRENCY = int(os.getenv("IMAGE_CHUNK_CONCURRENCY", "4"))
+# Seconds to wait for each next image of a chunk
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "30"))
+IMAGE_RETRIES = int(os.getenv("IMAGE_RETRIES", "2"))
+IMAGE_RETRY_BACKOFF = float(os.getenv("IMAGE_RETRY_BACKOFF", "0.5"))
+
+_ACCEPT = "application/x-ndjson, text/event-stream;q=0.9, application/json;q=0.5"
+
+OnImage = Callable[[int, str], Awaitable[None]]
+
+
+class ImageServiceClient:
+    """Pooled, chunked, streaming image generation client (one per process)."""
+
+    def __init__(self,
+                 chunk_size: int = IMAGE_CHUNK_SIZE,
+                 concurrency: int = IMAGE_CHUNK_CONCURRENCY,
+                 timeout: float = IMAGE_TIMEOUT,
+                 retries: int = IMAGE_RETRIES,
+                 backoff: float = IMAGE_RETRY_BACKOFF):
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        self.images = 0
+        self.failures = 0
+        self.retried = 0
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(10.0, self.timeout)),
+                limits=httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    # ----- response parsing -----
+
+    @staticmethod
+    async def _events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+        content_type = response.headers.get("content-type", "").lower()
+        if "ndjson" in content_type or "jsonl" in content_type:
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+        elif "event-stream" in content_type:
+            data_lines: List[str] = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+                elif not line.strip() and data_lines:
+                    payload = "\n".join(data_lines)
+                    data_lines = []
+                    if payload != "[DONE]":
+                        yield json.loads(payload)
+            if data_lines and "\n".join(data_lines) != "[DONE]":
+                yield json.loads("\n".join(data_lines))
+        else:
+            body = json.loads(await response.aread())
+            for index, item in enumerate(body.get("images") or []):
+                yield {"index": index, **(item if isinstance(item, dict) else {})}
+
+    async def _run_chunk(self, url: str, chunk: List[Tuple[int, Dict[str, Any]]],
+                         on_result: Callable[[int, str], Awaitable[None]]) -> List[Tuple[int, Dict[str, Any]]]:
+        """POST one chunk and report images as they arrive; returns the entries still missing."""
+        pending = dict(enumerate(chunk))
+        failed: List[Tuple[int, Dict[str, Any]]] = []
+        arrival = 0
+        try:
+            async with self.http_client().stream(
+                "POST", url, json={"requests": [req for _, req in chunk]}, headers={"Accept": _ACCEPT}
+            ) as response:
+                response.raise_for_status()
+                events = self._events(response).__aiter__()
+                while pending:
+                    try:
+                        event = await asyncio.wait_for(events.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    index = event.get("index", arrival)
+                    arrival += 1
+                    entry = pending.pop(index, None) if isinstance(index, int) else None
+                    if entry is None:
+                        continue
+                    image = event.get("image_data")
+                    if not isinstance(image, str) or not image:
+                        logger.warning(f"Image {entry[0]} failed: {event.get('error') or 'no image_data'}")
+                        failed.append(entry)
+                        continue
+                    try:
+                        await on_result(entry[0], image)
+                    except Exception as e:
+                        # Not a transport error: keep reading the stream and retry this image
+                        logger.warning(f"Handling image {entry[0]} failed: {e}")
+                        failed.append(entry)
+        except asyncio.TimeoutError:
+            logger.warning(f"Image chunk timed out after {self.timeout:.0f}s; {len(pending)} image(s) missing")
+        except Exception as e:
+            logger.warning(f"Image chunk request failed ({len(pending)} image(s) missing): {e}")
+        return failed + list(pending.values())
+
+    async def generate(self, url: str, requests: List[Dict[str, Any]], on_image: Optional[OnImage] = None) -> List[Optional[str]]:
+        """Generate images; returns base64 image data per request (None when it finally failed).
+
+        on_image(index, image_data) is awaited for every image as soon as it arrives.
+        """
+        results: List[Optional[str]] = [None] * len(requests)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _on_result(index: int, image: str) -> None:
+            if on_image is not None:
+                await on_image(index, image)
+            results[index] = image
+            self.images += 1
+
+        async def _chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> None:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.retried += len(chunk)
+                    await asyncio.sleep(self.backoff * (2 ** (attempt - 1)))
+                async with semaphore:
+                    with tracer.span("images.chunk", {"images.count": len(chunk), "images.attempt": attempt + 1}) as span:
+                        chunk = await self._run_chunk(url, chunk, _on_result)
+                        span.set_attribute("images.missing", len(chunk))
+                if not chunk:
+                    return
+            self.failures += len(chunk)
+            logger.error(f"Image generation failed after {self.retries + 1} attempt(s) for {len(chunk)} image(s)")
+
+        entries = list(enumerate(requests))
+        chunks = [entries[i:i + self.chunk_size] for i in range(0, len(entries), self.chunk_size)]
+        await asyncio.gather(*[_chunk(c) for c in chunks])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {"images": self.images, "failures": self.failures, "retried": self.retried}
+
+
+image_client = ImageServiceClient()
@@ -0,0 +1,93 @@
+"""
+Right-sizing of generated images.
+
+Layouts declare a `render_size` (CSS pixels) next to `tool_type: image_search`. Images are
+requested at that size times the device pixel ratio, rounded up to IMAGE_SIZE_STEP and capped
+at the default size (aspect ratio kept); targets without a hint use the default size.
+
+Generated images can also be downscaled to the requested size (for generators that ignore it)
+and re-encoded as WebP/JPEG before delivery. This needs Pillow, which is optional: without
+it images are delivered as generated.
+"""
+
+import io
+import math
+import os
+from typing import Optional, Tuple
+
+from loguru import logger
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+IMAGE_DEVICE_PIXEL_RATIO = float(os.getenv("IMAGE_DEVICE_PIXEL_RATIO", "2"))
+# Requested sizes are rounded up to a multiple of this (and never below it)
+IMAGE_SIZE_STEP = int(os.getenv("IMAGE_SIZE_STEP", "64"))
+# Downscale generated images that are larger than requested (needs Pillow)
+IMAGE_DOWNSCALE = os.getenv("IMAGE_DOWNSCALE", "true").lower() in ("1", "true", "yes")
+# Re-encode generated images: "" keeps the original format, or webp | jpeg (needs Pillow)
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "").strip().lower()
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "80"))
+
+_PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "jpg": "JPEG", "png": "PNG"}
+
+if IMAGE_OUTPUT_FORMAT and IMAGE_OUTPUT_FORMAT not in _PIL_FORMATS:
+    logger.warning(f"Unknown IMAGE_OUTPUT_FORMAT={IMAGE_OUTPUT_FORMAT!r}; keeping generated images as-is")
+    IMAGE_OUTPUT_FORMAT = ""
+if IMAGE_OUTPUT_FORMAT and Image is None:
+    logger.warning("IMAGE_OUTPUT_FORMAT is set but Pillow is not installed; images are delivered as generated")
+
+
+def request_size(render_size: Optional[Tuple[int, int]],
+                 default_width: int,
+                 default_height: int,
+                 device_pixel_ratio: float = IMAGE_DEVICE_PIXEL_RATIO) -> Tuple[int, int]:
+    """Pixel size to request for a target with the given CSS render size hint."""
+    if not render_size:
+        return int(default_width), int(default_height)
+    dpr = device_pixel_ratio if device_pixel_ratio and device_pixel_ratio > 0 else 1.0
+    width, height = render_size[0] * dpr, render_size[1] * dpr
+    scale = min(1.0, default_width / width, default_height / height)
+    step = max(1, IMAGE_SIZE_STEP)
+
+    def _round(px: float, cap: int) -> int:
+        return max(step, min(int(cap), int(math.ceil(px * scale / step)) * step))
+
+    return _round(width, default_width), _round(height, default_height)
+
+
+def postprocess_enabled() -> bool:
+    return Image is not None and (IMAGE_DOWNSCALE or bool(IMAGE_OUTPUT_FORMAT))
+
+
+def output_variant() -> str:
+    """Identifies the post-processing settings (part of the image cache key)."""
+    if not postprocess_enabled():
+        return ""
+    return f"downscale={IMAGE_DOWNSCALE};format={IMAGE_OUTPUT_FORMAT};quality={IMAGE_OUTPUT_QUALITY}"
+
+
+def postprocess_image(data: bytes, width: int, height: int) -> bytes:
+    """Downscale to fit (width, height) and/or re-encode; returns the input when nothing applies.
+    CPU-bound: call from a worker thread."""
+    if not postprocess_enabled():
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            resize = IMAGE_DOWNSCALE and (img.width > width or img.height > height)
+            if not resize and not IMAGE_OUTPUT_FORMAT:
+                return data
+            fmt = _PIL_FORMATS.get(IMAGE_OUTPUT_FORMAT) or img.format or "PNG"
+            out_img = img.copy()
+            if resize:
+                out_img.thumbnail((width, height), Image.LANCZOS)
+            if fmt == "JPEG" and out_img.mode not in ("RGB", "L"):
+                out_img = out_img.convert("RGB")
+            buf = io.BytesIO()
+            out_img.save(buf, format=fmt, quality=IMAGE_OUTPUT_QUALITY)
+            return buf.getvalue()
+    except Exception as e:
+        logger.warning(f"Image post-processing failed, delivering original: {e}")
+        return data
@@ -1,121 +1,123 @@
 import os
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
 from loguru import logger
 from .llm import call_llm
+from .tracing import tracer
+from .layout_ranker import (
+    LAYOUT_RANKER_ENABLED,
+    LAYOUT_RANKER_SKIP_SIMILARITY,
+    LAYOUT_RANKER_TOP_K,
+    LayoutRanker,
+)
+from .layout_registry import LAYOUT_WATCH_INTERVAL, LayoutRegistry, LayoutSnapshot
+from .layout_schema import extract_parameters_schema, render_schema, trim_examples
+
+# Classifier prompt catalog: schema render mode (json | minified | signature), examples per layout (-1: all).
+# The defaults reproduce the original prompt; the compact modes are opt-in.
+LAYOUT_PROMPT_SCHEMA_MODE = os.getenv("LAYOUT_PROMPT_SCHEMA_MODE", "json")
+LAYOUT_PROMPT_MAX_EXAMPLES = int(os.getenv("LAYOUT_PROMPT_MAX_EXAMPLES", "-1"))
+LAYOUT_PROMPT_DESCRIPTION_CHARS = int(os.getenv("LAYOUT_PROMPT_DESCRIPTION_CHARS", "160"))
 
 class LayoutClassifier:
     """
     Classifier that selects the most appropriate layout based on Intent, Context, and Data.
     """
     
-    def __init__(self, layouts_dir: str = "layouts_json", extra_layout_dirs: Optional[List[str]] = None):
+    def __init__(self,
+                 layouts_dir: str = "layouts_json",
+                 extra_layout_dirs: Optional[List[str]] = None,
+                 schema_mode: str = LAYOUT_PROMPT_SCHEMA_MODE,
+                 max_examples: int = LAYOUT_PROMPT_MAX_EXAMPLES):
         self.layouts_dir = layouts_dir
+        self.schema_mode = schema_mode
+        self.max_examples = max_examples
         # Additional directories to search for custom layouts (e.g., "layout_json_custom")
         self.extra_layout_dirs = extra_layout_dirs or ["layout_json_custom"]
-        self.demo_layouts = {}
-        self.fixed_layouts = {}
-        self.layouts_by_type = {}
+        # Layouts live in immutable snapshots owned by the registry (hot-reloaded, see start_watching)
+        self.registry = LayoutRegistry(
+            self.layouts_dir,
+            self.extra_layout_dirs,
+            render_block=self._render_prompt_block,
+            build_catalog_text=self._build_catalog_text,
+        )
         # Cached prompt resources
-        self._middle_layouts_prompt_text: str = ""
         self._middle_prompt_template: Optional[str] = None
         self._load_demo_layouts()
         self._load_middle_prompt_template()
-    
-    def _load_demo_layouts(self):
-        """Load layouts generically into a unified map by contents_type."""
-        try:
-            index_path = os.path.join(self.layouts_dir, "0_index.json")
-            by_type: Dict[str, List[Dict]] = {}
 
-            if not os.path.exists(index_path):
-                logger.error(f"Index file not found: {index_path}")
-            else:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    index_data = json.load(f)
-
-                for item in index_data:
-                    if item.get("demo", False):
-                        layout_file = item["file"].replace(".html", ".json")
-                        layout_path = os.path.join(self.layouts_dir, layout_file)
-
-                        if os.path.exists(layout_path):
-                            try:
-                                with open(layout_path, 'r', encoding='utf-8') as f_json:
-                                    layout_data = json.load(f_json)
-                                contents_type = (item.get("contents_type", "") or layout_data.get("contents_type", "") or "").strip() or "unknown"
-                                by_type.setdefault(contents_type, []).append({
-                                    "id": layout_file.replace(".json", ""),
-                                    "name": item.get("name") or layout_data.get("name") or layout_file.replace(".json", ""),
-                                    "description": layout_data.get("description", ""),
-                                    "examples": layout_data.get("examples", []),
-                                    "layout_data": layout_data
-                                })
-                            except Exception as e:
-                                logger.warning(f"Failed to load layout file {layout_path}: {e}")
-                        else:
-                            logger.warning(f"Layout file not found: {layout_path}")
-
-            # 2) Load from extra/custom directories
-            for extra_dir in self.extra_layout_dirs:
-                try:
-                    if not os.path.exists(extra_dir):
-                        logger.warning(f"Custom layouts directory not found: {extra_dir}")
-                        continue
-                    self._collect_layouts_from_directory(extra_dir, by_type)
-                except Exception as e:
-                    logger.error(f"Error while loading custom layouts from {extra_dir}: {e}")
+    @property
+    def snapshot(self) -> LayoutSnapshot:
+        """Current layouts; take it once per request for a consistent view across reloads."""
+        return self.registry.snapshot
 
-            # Assign to instance: unified map
-            self.layouts_by_type = by_type
-            # Backward-compat mirrors
-            self.demo_layouts["middle"] = by_type.get("middle", [])
-            self.fixed_layouts = {k: v for k, v in by_type.items() if k != "middle"}
+    @property
+    def layouts_by_type(self) -> Mapping[str, Tuple[Dict, ...]]:
+        return self.snapshot.layouts_by_type
 
-            # Cache prompt text for middle (for legacy prompt path)
-            self._middle_layouts_prompt_text = self._build_middle_layouts_text(by_type.get("middle", []))
+    @property
+    def demo_layouts(self) -> Mapping[str, Tuple[Dict, ...]]:
+        return self.snapshot.demo_layouts
 
+    @property
+    def fixed_layouts(self) -> Mapping[str, Tuple[Dict, ...]]:
+        return self.snapshot.fixed_layouts
+
+    @property
+    def rankers(self) -> Mapping[str, LayoutRanker]:
+        return self.snapshot.rankers
+
+    def _load_demo_layouts(self):
+        """Load layouts generically into a unified map by contents_type."""
+        try:
+            self.registry.scan(force=True)
+            by_type = self.snapshot.layouts_by_type
             logger.info("Layouts loaded (unified by contents_type)")
             logger.info(f"- Types: {list(by_type.keys())}")
             logger.info(f"- Counts: { {k: len(v or []) for k, v in by_type.items()} }")
-
         except Exception as e:
             logger.error(f"Error while loading layouts: {e}")
 
+    def start_watching(self, interval: float = LAYOUT_WATCH_INTERVAL) -> None:
+        """Poll the layout directories and hot-swap changed layouts (needs a running loop)."""
+        self.registry.start_watching(interval)
+
+    async def stop_watching(self) -> None:
+        await self.registry.stop_watching()
+
     def _extract_parameters_for_prompt(self, layout_data: Dict) -> Dict:
         """Extract parameters section for prompt display with fallbacks."""
+        return extract_parameters_schema(layout_data) or {}
+
+    def _render_prompt_block(self, layout: Dict) -> str:
+        """Render one layout's catalog entry (without its index) in the configured schema mode."""
         try:
-            if isinstance(layout_data, dict):
-                params = layout_data.get("parameters")
-                if isinstance(params, dict):
-                    return params
-                props = layout_data.get("properties")
-                if isinstance(props, dict):
-                    params = props.get("parameters")
-                    if isinstance(params, dict):
-                        return params
-        except Exception:
-            pass
-        return {}
+            params_obj = self._extract_parameters_for_prompt(layout.get('layout_data', {}))
+            params = render_schema(params_obj, self.schema_mode, max_description_chars=LAYOUT_PROMPT_DESCRIPTION_CHARS or None)
+            examples = trim_examples(layout.get('examples', []), self.max_examples)
+            return "\n".join([
+                f"{layout.get('name', '')}:",
+                f"Description: {layout.get('description', '')}",
+                f"Examples: {examples}",
+                f"Parameters: {params}",
+            ])
+        except Exception as e:
+            logger.warning(f"Failed to build prompt text for layout {layout.get('id')}: {e}")
+            return f"{layout.get('name', '')}:"
+
+    def _build_catalog_text(self, layouts: List[Dict]) -> str:
+        """Join cached per-layout blocks, numbered in the order given."""
+        blocks = []
+        for i, layout in enumerate(layouts):
+            block = layout.get("prompt_block")
+            if block is None:
+                block = layout["prompt_block"] = self._render_prompt_block(layout)
+            blocks.append(f"\n[{i}] {block}")
+        return "\n".join(blocks)
 
     def _build_middle_layouts_text(self, middle_layouts: List[Dict]) -> str:
         """Prebuild the layouts listing text for prompts and cache it."""
-        import json as _json
-        lines: List[str] = []
-        for i, layout in enumerate(middle_layouts):
-            try:
-                name = layout.get('name', '')
-                desc = layout.get('description', '')
-                examples = layout.get('examples', [])
-                params_obj = self._extract_parameters_for_prompt(layout.get('layout_data', {}))
-                params = _json.dumps(params_obj, ensure_ascii=False, indent=2)
-                lines.append(f"\n[{i}] {name}:")
-                lines.append(f"Description: {desc}")
-                lines.append(f"Examples: {examples}")
-                lines.append(f"Parameters: {params}")
-            except Exception as e:
-                logger.warning(f"Failed to build prompt text for layout index {i}: {e}")
-        return "\n".join(lines)
+        return self._build_catalog_text(middle_layouts)
 
     def _load_middle_prompt_template(self) -> None:
         """Load and cache the middle layout classification prompt template."""
@@ -143,48 +145,11 @@ class LayoutClassifier:
         )
 
     def refresh_layouts(self) -> Dict:
-        """Reload layouts from disk and rebuild caches. Returns summary."""
+        """Reload all layouts from disk (full rescan) and rebuild caches. Returns summary."""
         self._load_demo_layouts()
         self._load_middle_prompt_template()
         return self.get_demo_layouts_summary()
 
-    def _collect_layouts_from_directory(self, target_dir: str, by_type: Dict[str, List[Dict]]) -> None:
-        """Scan a directory for JSON layout files and merge them into the provided by_type map.
-        Custom layouts do not rely on 0_index.json. Every *.json will be considered."""
-        if not os.path.isdir(target_dir):
-            logger.warning(f"Target layout directory is not a directory: {target_dir}")
-            return
-
-        for filename in os.listdir(target_dir):
-            if not filename.lower().endswith('.json'):
-                continue
-            if filename == '0_index.json':
-                # Skip any index files in custom directories
-                continue
-
-            file_path = os.path.join(target_dir, filename)
-
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    layout_data = json.load(f)
-            except Exception as e:
-                logger.warning(f"Failed to read custom layout file {file_path}: {e}")
-                continue
-
-            contents_type = (layout_data.get("contents_type", "") or "").strip() or "unknown"
-            layout_id = filename.replace('.json', '')
-            layout_name = layout_data.get("name", layout_id)
-            layout_description = layout_data.get("description", "")
-            layout_examples = layout_data.get("examples", [])
-
-            by_type.setdefault(contents_type, []).append({
-                "id": layout_id,
-                "name": layout_name,
-                "description": layout_description,
-                "examples": layout_examples,
-                "layout_data": layout_data
-            })
-    
     async def classify_layouts(self, intent: str, context: Dict, user_data: str, slots: List[str], model_name: str = "gpt-4o") -> List[Dict]:
         """
         Select layouts for a list of requested layout types.
@@ -200,6 +165,7 @@ class LayoutClassifier:
         """
         if not isinstance(slots, list) or not slots:
             return []
+        snapshot = self.snapshot
 
         # Build mapping from layout type to needed count and positions
         type_to_positions: Dict[str, List[int]] = {}
@@ -213,7 +179,7 @@ class LayoutClassifier:
             required_count = max(1, len(positions))
 
             # Candidate pool by type (generic lookup without special-casing)
-            candidates = self.layouts_by_type.get(layout_type, [])
+            candidates = list(snapshot.layouts_by_type.get(layout_type, ()))
 
             if not candidates:
                 logger.warning(f"No candidates available for layout_type='{layout_type}'")
@@ -225,6 +191,23 @@ class LayoutClassifier:
                 selected_by_type[layout_type] = [candidates[0]] * required_count
                 continue
 
+            # Local pre-ranking: decide without the LLM for near-verbatim examples,
+            # otherwise only send the top-k candidates
+            ranker = snapshot.rankers.get(layout_type) if LAYOUT_RANKER_ENABLED else None
+            if ranker is not None and len(ranker) == len(candidates):
+                if required_count == 1:
+                    match_index, similarity, runner_up = ranker.example_match(intent)
+                    if match_index is not None and similarity >= LAYOUT_RANKER_SKIP_SIMILARITY > runner_up:
+                        picked = candidates[match_index]
+                        logger.info(f"Pre-ranker selected {layout_type} layout {picked['id']} without LLM (similarity={similarity:.2f})")
+                        selected_by_type[layout_type] = [picked]
+                        continue
+                top_k = max(LAYOUT_RANKER_TOP_K, required_count)
+                ranked = ranker.rank(intent, user_data)
+                if top_k < len(candidates) and ranked and ranked[0][1] > 0:
+                    candidates = [candidates[i] for i, _ in ranked[:top_k]]
+                    logger.info(f"Pre-ranker narrowed {layout_type} candidates to {len(candidates)}: {[c['id'] for c in candidates]}")
+
             selected_list = await self._select_layouts_generic(
                 intent=intent,
                 context=context,
@@ -255,28 +238,64 @@ class LayoutClassifier:
                     results[pos] = None
 
         return results
+
+    def confirms_selection(self, intent: str, user_data: str, layout_type: str, selected: Optional[Dict]) -> bool:
+        """
+        Check whether a layout picked without user data still holds once the data is known.
+
+        Confirmed when there is no user data, when the type has a single candidate, when the
+        pick came from the example match (which ignores user data), or when the data-aware
+        pre-ranker ranks the pick first. Otherwise the caller should classify again.
+        """
+        if not selected:
+            return False
+        if not str(user_data or "").strip():
+            return True
+        snapshot = self.snapshot
+        candidates = list(snapshot.layouts_by_type.get(layout_type, ()))
+        if len(candidates) == 1:
+            return candidates[0].get("id") == selected.get("id")
+        ranker = snapshot.rankers.get(layout_type) if LAYOUT_RANKER_ENABLED else None
+        if ranker is None or len(ranker) != len(candidates):
+            return False
+        match_index, similarity, runner_up = ranker.example_match(intent)
+        if match_index is not None and similarity >= LAYOUT_RANKER_SKIP_SIMILARITY > runner_up:
+            return candidates[match_index].get("id") == selected.get("id")
+        ranked = ranker.rank(intent, user_data)
+        return bool(ranked) and ranked[0][1] > 0 and candidates[ranked[0][0]].get("id") == selected.get("id")
     
     async def _select_middle_layout(self, intent: str, context: Dict, user_data: str, model_name: str) -> Optional[Dict]:
         """Select the most suitable middle-type layout"""
-        if not self.demo_layouts.get("middle"):
+        snapshot = self.snapshot
+        if not snapshot.middle_layouts:
             logger.warning("No available middle layouts")
             return None
         
-        middle_layouts = self.demo_layouts["middle"]
+        middle_layouts = snapshot.middle_layouts
         
         # Use LLM to classify layouts (load from prompt template file)
-        prompt = self._create_middle_classification_prompt(intent, context, user_data, middle_layouts)
+        prompt = self._create_middle_classification_prompt(intent, context, user_data, middle_layouts, snapshot.middle_prompt_text)
         
+        with tracer.span("classify.middle", {"gen_ai.request.model": model_name, "classify.candidates": len(middle_layouts)}) as span:
+            return await self._classify_middle_with_retries(prompt, middle_layouts, model_name, span)
+
+    async def _classify_middle_with_retries(self, prompt: str, middle_layouts, model_name: str, span) -> Dict:
+        """Ask the LLM for a middle layout index (up to 3 attempts), else the first middle layout"""
         # Retry up to 3 iterations on parsing failure or exceptions
+        def _valid(response: str) -> bool:
+            index = self._parse_classification_response(response)
+            return index is not None and 0 <= index < len(middle_layouts)
+
         last_error: Optional[Exception] = None
         for attempt in range(1, 4):
             try:
-                response = await call_llm(prompt, model_name=model_name)
+                response = await call_llm(prompt, model_name=model_name, priority="critical", site="classify", validate=_valid)
                 selected_index = self._parse_classification_response(response)
                 
                 if selected_index is not None and 0 <= selected_index < len(middle_layouts):
                     selected_layout = middle_layouts[selected_index]
                     logger.info(f"Selected middle layout: {selected_layout['id']} ({selected_layout['name']}) on attempt {attempt}")
+                    span.set_attributes({"classify.attempts": attempt, "classify.layout_id": selected_layout['id']})
                     return selected_layout
                 else:
                     logger.warning(f"Invalid layout index: {selected_index}; attempt {attempt} of 3")
@@ -289,13 +308,14 @@ class LayoutClassifier:
             logger.error(f"Falling back to first middle layout due to errors. Last error: {last_error}")
         else:
             logger.warning("Falling back to first middle layout due to repeated invalid indices")
+        span.set_attributes({"classify.attempts": 3, "classify.fallback": True, "classify.layout_id": middle_layouts[0]['id']})
         return middle_layouts[0]
     
-    def _create_middle_classification_prompt(self, intent: str, context: Dict, user_data: str, middle_layouts: List[Dict]) -> str:
+    def _create_middle_classification_prompt(self, intent: str, context: Dict, user_data: str, middle_layouts: List[Dict], layouts_text: str = "") -> str:
         """Create a prompt for classifying middle layouts using cached template and layouts text."""
         # Ensure caches are ready
-        if not self._middle_layouts_prompt_text:
-            self._middle_layouts_prompt_text = self._build_middle_layouts_text(self.demo_layouts.get("middle", []))
+        if not layouts_text:
+            layouts_text = self._build_middle_layouts_text(list(middle_layouts))
         if not self._middle_prompt_template:
             self._load_middle_prompt_template()
 
@@ -303,7 +323,7 @@ class LayoutClassifier:
         prompt = prompt.replace("{{INTENT}}", str(intent))
         prompt = prompt.replace("{{CONTEXT}}", json.dumps(context, ensure_ascii=False, indent=2))
         prompt = prompt.replace("{{USER_DATA}}", str(user_data))
-        prompt = prompt.replace("{{LAYOUTS}}", self._middle_layouts_prompt_text)
+        prompt = prompt.replace("{{LAYOUTS}}", layouts_text)
         return prompt
     
     def _parse_classification_response(self, response: str) -> Optional[int]:
@@ -328,22 +348,7 @@ class LayoutClassifier:
         return None
 
     def _build_candidates_text(self, candidates: List[Dict]) -> str:
-        import json as _json
-        lines: List[str] = []
-        for i, layout in enumerate(candidates):
-            try:
-                name = layout.get('name', '')
-                desc = layout.get('description', '')
-                examples = layout.get('examples', [])
-                params_obj = self._extract_parameters_for_prompt(layout.get('layout_data', {}))
-                params = _json.dumps(params_obj, ensure_ascii=False, indent=2)
-                lines.append(f"\n[{i}] {name}:")
-                lines.append(f"Description: {desc}")
-                lines.append(f"Examples: {examples}")
-                lines.append(f"Parameters: {params}")
-            except Exception as e:
-                logger.warning(f"Failed to build text for candidate index {i}: {e}")
-        return "\n".join(lines)
+        return self._build_catalog_text(candidates)
 
     def _create_generic_prompt(self, intent: str, context: Dict, user_data: str, candidates_text: str, layout_type: str, count: int) -> str:
         return (
@@ -398,7 +403,8 @@ class LayoutClassifier:
         last_error: Optional[Exception] = None
         for attempt in range(1, 4):
             try:
-                response = await call_llm(prompt, model_name=model_name)
+                response = await call_llm(prompt, model_name=model_name, priority="critical", site="classify",
+                                          validate=lambda r: bool(self._parse_multi_indices(r, len(candidates), count)))
                 idxs = self._parse_multi_indices(response, max_index=len(candidates), max_count=count)
                 if idxs:
                     picked = [candidates[i] for i in idxs[:count]]
@@ -424,28 +430,10 @@ class LayoutClassifier:
             logger.error(f"Falling back to first {count} {layout_type} layouts. Last error: {last_error}")
         return candidates[:count]
     
-    def get_demo_layouts_summary(self) -> Dict:
-        """Return summary information of demo layouts"""
-        return {
-            "middle_layouts_count": len(self.demo_layouts.get("middle", [])),
-            "fixed_layouts": list(self.fixed_layouts.keys()),
-            "middle_layouts": [
-                {"id": layout["id"], "name": layout["name"], "examples": layout["examples"]} 
-                for layout in self.demo_layouts.get("middle", [])
-            ]
-        }
+    def get_demo_layouts_summary(self) -> Mapping:
+        """Return summary information of demo layouts (precomputed, read-only)"""
+        return self.snapshot.summary
     
     def get_layout_by_id(self, layout_id: str) -> Optional[Dict]:
         """Return specific layout information by ID"""
-        # Search in middle layouts
-        for layout in self.demo_layouts.get("middle", []):
-            if layout["id"] == layout_id:
-                return layout
-        
-        # Search in fixed layouts
-        for layout_type, layout_list in self.fixed_layouts.items():
-            for layout_data in layout_list:
-                if layout_data["id"] == layout_id:
-                    return layout_data
-        
-        return None
+        return self.snapshot.get(layout_id)
@@ -0,0 +1,129 @@
+"""
+Local BM25 pre-ranker for layout candidates.
+
+Each layout is indexed once (name, description, examples and the field names and
+descriptions of its parameters schema). At request time the intent and a short
+user-data summary are scored against the index so the LLM only sees the top-k
+candidates. The LLM is skipped entirely when the intent nearly repeats an example
+of exactly one layout.
+"""
+
+from collections import Counter
+import math
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LAYOUT_RANKER_ENABLED = os.getenv("LAYOUT_RANKER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Number of candidates passed to the LLM after pre-ranking
+LAYOUT_RANKER_TOP_K = int(os.getenv("LAYOUT_RANKER_TOP_K", "12"))
+# Skip the LLM when the intent matches an example of exactly one layout at least this closely
+# (token-set Jaccard similarity; values > 1 never skip)
+LAYOUT_RANKER_SKIP_SIMILARITY = float(os.getenv("LAYOUT_RANKER_SKIP_SIMILARITY", "0.8"))
+# Weight of user-data terms relative to intent terms, and how much user data is scored
+LAYOUT_RANKER_DATA_WEIGHT = float(os.getenv("LAYOUT_RANKER_DATA_WEIGHT", "0.3"))
+LAYOUT_RANKER_DATA_CHARS = int(os.getenv("LAYOUT_RANKER_DATA_CHARS", "2000"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[가-힣]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i if in into is it me my of on or our show so "
+    "such that the their them there these this to use used via was what when where which while "
+    "who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall(str(text or "").lower()):
+        if tok in _STOPWORDS:
+            continue
+        # Cheap plural folding so "photos" matches "photo"
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def _schema_text(node, out: List[str]) -> None:
+    """Collect field names and descriptions from a parameters schema (sample values are skipped)."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("example", "examples", "sample", "type", "tool_type", "render_size"):
+                continue
+            if key == "description" and isinstance(value, str):
+                out.append(value)
+                continue
+            if isinstance(value, (dict, list)):
+                out.append(str(key))
+                _schema_text(value, out)
+    elif isinstance(node, list):
+        for item in node:
+            _schema_text(item, out)
+
+
+class LayoutRanker:
+    """BM25 index over a fixed list of layouts (same order as the candidate list)."""
+
+    def __init__(self, layouts: Sequence[Dict], parameters: Sequence[Dict] = (), k1: float = 1.5, b: float = 0.75):
+        """`parameters[i]` is the parameters schema of `layouts[i]` (optional)."""
+        self.k1 = k1
+        self.b = b
+        self._tfs: List[Counter] = []
+        self._lengths: List[int] = []
+        self._examples: List[List[frozenset]] = []
+        df: Counter = Counter()
+        for i, layout in enumerate(layouts):
+            examples = [str(e) for e in (layout.get("examples") or [])]
+            parts = [str(layout.get("name", "")), str(layout.get("description", ""))] + examples
+            if i < len(parameters):
+                _schema_text(parameters[i], parts)
+            tf = Counter(tokenize(" ".join(parts)))
+            self._tfs.append(tf)
+            self._lengths.append(sum(tf.values()))
+            df.update(tf.keys())
+            self._examples.append([frozenset(tokenize(e)) for e in examples if e.strip()])
+        n = len(self._tfs)
+        self._avg_len = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {term: math.log(1 + (n - d + 0.5) / (d + 0.5)) for term, d in df.items()}
+
+    def __len__(self) -> int:
+        return len(self._tfs)
+
+    def _score_terms(self, weights: Dict[str, float]) -> List[float]:
+        scores = [0.0] * len(self._tfs)
+        for term, weight in weights.items():
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in enumerate(self._tfs):
+                f = tf.get(term)
+                if not f:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_len or 1.0))
+                scores[i] += weight * idf * f * (self.k1 + 1) / (f + norm)
+        return scores
+
+    def rank(self, intent: str, user_data: str = "") -> List[Tuple[int, float]]:
+        """Return (candidate index, score) pairs, best first; ties keep the original order."""
+        weights: Dict[str, float] = {}
+        for term in set(tokenize(intent)):
+            weights[term] = 1.0
+        if user_data and LAYOUT_RANKER_DATA_WEIGHT > 0:
+            for term in set(tokenize(str(user_data)[:LAYOUT_RANKER_DATA_CHARS])):
+                weights[term] = weights.get(term, 0.0) + LAYOUT_RANKER_DATA_WEIGHT
+        scores = self._score_terms(weights)
+        return sorted(enumerate(scores), key=lambda item: (-item[1], item[0]))
+
+    def example_match(self, intent: str) -> Tuple[Optional[int], float, float]:
+        """Return (candidate index, similarity, runner-up similarity) for the layout whose
+        examples best match the intent (token-set Jaccard). The runner-up is the best score
+        among the other layouts, so callers can refuse ambiguous matches."""
+        query = frozenset(tokenize(intent))
+        sims = []
+        for examples in self._examples:
+            sims.append(max((len(query & ex) / len(query | ex) for ex in examples), default=0.0) if query else 0.0)
+        if not sims:
+            return None, 0.0, 0.0
+        best_index = max(range(len(sims)), key=lambda i: sims[i])
+        runner_up = max((sim for i, sim in enumerate(sims) if i != best_index), default=0.0)
+        return best_index, sims[best_index], runner_up
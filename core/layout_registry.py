@@ -0,0 +1,285 @@
+"""
+Incremental, hot-reloading layout registry.
+
+Layouts come from `<layouts_dir>/0_index.json` (entries with `demo: true`) and from
+every `*.json` in the extra (custom) directories. The registry remembers each file's
+mtime/size and, on every scan, reparses only files that changed. Layout records that
+did not change are reused as-is, so their prompt blocks are not re-rendered, and
+per-type derived data (prompt text, ranker) is rebuilt only for types whose members
+changed.
+
+Readers always get a complete LayoutSnapshot; a scan builds a new snapshot and
+swaps it in with a single assignment, so in-flight requests keep a consistent view.
+Changes are picked up by a polling task (no extra dependencies needed for inotify).
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from loguru import logger
+
+from .layout_ranker import LayoutRanker
+from .layout_schema import extract_parameters_schema, image_path_plans
+
+# Seconds between change scans of the layout directories (0 disables watching)
+LAYOUT_WATCH_INTERVAL = float(os.getenv("LAYOUT_WATCH_INTERVAL", "2"))
+
+_FileSignature = Tuple[int, int]  # (mtime_ns, size)
+
+
+class LayoutSnapshot:
+    """Immutable view of all layouts at one point in time.
+
+    Lookup indexes and the summary are built once here, so reads never scan or allocate:
+    `by_id` maps layout id -> record, `layouts_by_type` maps type -> candidate tuple.
+    """
+
+    __slots__ = (
+        "version", "loaded_at", "layouts_by_type", "middle_layouts", "fixed_layouts",
+        "demo_layouts", "by_id", "summary", "middle_prompt_text", "rankers",
+    )
+
+    def __init__(self,
+                 version: int,
+                 layouts_by_type: Mapping[str, Tuple[Dict, ...]],
+                 middle_prompt_text: str,
+                 rankers: Mapping[str, LayoutRanker]):
+        self.version = version
+        self.loaded_at = time.time()
+        self.layouts_by_type = MappingProxyType({t: tuple(items) for t, items in layouts_by_type.items()})
+        self.middle_layouts: Tuple[Dict, ...] = self.layouts_by_type.get("middle", ())
+        self.fixed_layouts = MappingProxyType({t: v for t, v in self.layouts_by_type.items() if t != "middle"})
+        self.demo_layouts = MappingProxyType({"middle": self.middle_layouts})
+        # Middle layouts win on duplicate ids, then fixed types in load order (same as the old linear search)
+        by_id: Dict[str, Dict] = {}
+        for layout in self.middle_layouts:
+            by_id.setdefault(layout["id"], layout)
+        for items in self.fixed_layouts.values():
+            for layout in items:
+                by_id.setdefault(layout["id"], layout)
+        self.by_id = MappingProxyType(by_id)
+        self.summary = MappingProxyType({
+            "middle_layouts_count": len(self.middle_layouts),
+            "fixed_layouts": tuple(self.fixed_layouts.keys()),
+            "middle_layouts": tuple(
+                MappingProxyType({"id": x["id"], "name": x["name"], "examples": tuple(x.get("examples") or ())})
+                for x in self.middle_layouts
+            ),
+        })
+        self.middle_prompt_text = middle_prompt_text
+        self.rankers = MappingProxyType(dict(rankers))
+
+    def get(self, layout_id: str) -> Optional[Dict]:
+        return self.by_id.get(layout_id)
+
+
+class LayoutRegistry:
+    """Owns the current LayoutSnapshot and rebuilds it incrementally from disk.
+
+    render_block(record) renders a layout's prompt block; build_catalog_text(records)
+    joins blocks into the numbered catalog used for the middle prompt.
+    """
+
+    def __init__(self,
+                 layouts_dir: str,
+                 extra_layout_dirs: List[str],
+                 render_block: Callable[[Dict], str],
+                 build_catalog_text: Callable[[List[Dict]], str]):
+        self.layouts_dir = layouts_dir
+        self.extra_layout_dirs = list(extra_layout_dirs)
+        self._render_block = render_block
+        self._build_catalog_text = build_catalog_text
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[_FileSignature, Any]] = {}  # path -> (signature, parsed JSON or None)
+        self._records: Dict[Tuple, Dict] = {}  # (path, signature, name, contents_type) -> layout record
+        self._snapshot = LayoutSnapshot(0, {}, "", {})
+        self._warned: set = set()  # missing paths already reported (avoid a warning every poll)
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> LayoutSnapshot:
+        return self._snapshot
+
+    # ----- file cache -----
+
+    def _warn_missing(self, path: str, message: str) -> None:
+        if path not in self._warned:
+            self._warned.add(path)
+            logger.warning(message)
+
+    @staticmethod
+    def _signature(path: str) -> Optional[_FileSignature]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_json(self, path: str, changed: List[str], touched: set) -> Tuple[Optional[_FileSignature], Any]:
+        """Return (signature, parsed JSON) using the cache when the file is unchanged."""
+        touched.add(path)
+        sig = self._signature(path)
+        if sig is not None:
+            self._warned.discard(path)
+        if sig is None:
+            if path in self._files:
+                self._files.pop(path, None)
+                changed.append(path)
+            return None, None
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == sig:
+            return sig, cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to read layout file {path}: {e}")
+            data = None
+        self._files[path] = (sig, data)
+        changed.append(path)
+        return sig, data
+
+    def _record(self, path: str, sig: _FileSignature, layout_data: Dict, name: str, contents_type: str) -> Dict:
+        key = (path, sig, name, contents_type)
+        record = self._records.get(key)
+        if record is None:
+            layout_id = os.path.basename(path).replace(".json", "")
+            record = {
+                "id": layout_id,
+                "name": name or layout_id,
+                "description": layout_data.get("description", ""),
+                "examples": layout_data.get("examples", []),
+                "layout_data": layout_data,
+            }
+            record["prompt_block"] = self._render_block(record)
+            # Compile the image path plan at load time (memoized per schema); requests only resolve it
+            image_path_plans.get(extract_parameters_schema(layout_data))
+            self._records[key] = record
+        return record
+
+    # ----- scanning -----
+
+    def _collect(self, changed: List[str], touched: set) -> Dict[str, List[Dict]]:
+        by_type: Dict[str, List[Dict]] = {}
+        index_path = os.path.join(self.layouts_dir, "0_index.json")
+        _, index_data = self._read_json(index_path, changed, touched)
+        if index_data is None:
+            self._warn_missing(index_path, f"Index file not found or invalid: {index_path}")
+        for item in index_data or []:
+            if not isinstance(item, dict) or not item.get("demo", False):
+                continue
+            layout_file = item["file"].replace(".html", ".json")
+            layout_path = os.path.join(self.layouts_dir, layout_file)
+            sig, layout_data = self._read_json(layout_path, changed, touched)
+            if sig is None:
+                self._warn_missing(layout_path, f"Layout file not found: {layout_path}")
+                continue
+            if not isinstance(layout_data, dict):
+                continue
+            contents_type = (item.get("contents_type", "") or layout_data.get("contents_type", "") or "").strip() or "unknown"
+            name = item.get("name") or layout_data.get("name") or ""
+            by_type.setdefault(contents_type, []).append(self._record(layout_path, sig, layout_data, name, contents_type))
+
+        # Custom layouts do not rely on 0_index.json; every *.json is considered
+        for extra_dir in self.extra_layout_dirs:
+            if not os.path.isdir(extra_dir):
+                self._warn_missing(extra_dir, f"Custom layouts directory not found: {extra_dir}")
+                continue
+            self._warned.discard(extra_dir)
+            for filename in sorted(os.listdir(extra_dir)):
+                if not filename.lower().endswith(".json") or filename == "0_index.json":
+                    continue
+                file_path = os.path.join(extra_dir, filename)
+                sig, layout_data = self._read_json(file_path, changed, touched)
+                if sig is None or not isinstance(layout_data, dict):
+                    continue
+                contents_type = (layout_data.get("contents_type", "") or "").strip() or "unknown"
+                by_type.setdefault(contents_type, []).append(
+                    self._record(file_path, sig, layout_data, layout_data.get("name", ""), contents_type)
+                )
+        return by_type
+
+    def scan(self, force: bool = False) -> bool:
+        """Reparse changed files and swap in a new snapshot if anything changed.
+
+        force=True drops the file cache and rebuilds everything from disk.
+        Returns True when a new snapshot was published.
+        """
+        with self._lock:
+            if force:
+                self._files.clear()
+                self._records.clear()
+            changed: List[str] = []
+            touched: set = set()
+            by_type = self._collect(changed, touched)
+            # Forget files that are no longer referenced (deleted, or dropped from the index)
+            for path in set(self._files) - touched:
+                self._files.pop(path, None)
+                changed.append(path)
+            live_records = {id(r) for items in by_type.values() for r in items}
+            self._records = {k: r for k, r in self._records.items() if id(r) in live_records}
+
+            previous = self._snapshot
+            new_by_type = {t: tuple(items) for t, items in by_type.items()}
+            type_changed = {
+                t for t in set(new_by_type) | set(previous.layouts_by_type)
+                if not _same_records(new_by_type.get(t, ()), previous.layouts_by_type.get(t, ()))
+            }
+            if previous.version and not force and not type_changed:
+                return False
+
+            rankers = {}
+            for t, items in new_by_type.items():
+                if t in type_changed or t not in previous.rankers:
+                    rankers[t] = LayoutRanker(items, [extract_parameters_schema(x.get("layout_data", {})) or {} for x in items])
+                else:
+                    rankers[t] = previous.rankers[t]
+            middle = new_by_type.get("middle", ())
+            if "middle" in type_changed or not previous.version:
+                middle_prompt_text = self._build_catalog_text(list(middle))
+            else:
+                middle_prompt_text = previous.middle_prompt_text
+
+            self._snapshot = LayoutSnapshot(previous.version + 1, new_by_type, middle_prompt_text, rankers)
+            if previous.version:
+                logger.info(
+                    f"Layout registry updated to v{self._snapshot.version}: "
+                    f"{len(changed)} file(s) changed, types rebuilt: {sorted(type_changed)}"
+                )
+            return True
+
+    # ----- watching -----
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.scan)
+            except Exception as e:
+                logger.error(f"Layout registry scan failed: {e}")
+
+    def start_watching(self, interval: float = LAYOUT_WATCH_INTERVAL) -> None:
+        """Start the background polling task (call from a running event loop)."""
+        if interval <= 0 or (self._watch_task and not self._watch_task.done()):
+            return
+        self._watch_task = asyncio.create_task(self._watch(interval), name="layout-registry-watch")
+        logger.info(f"Watching layout directories every {interval:.1f}s")
+
+    async def stop_watching(self) -> None:
+        task, self._watch_task = self._watch_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def _same_records(a: Tuple[Dict, ...], b: Tuple[Dict, ...]) -> bool:
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
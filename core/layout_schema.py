@@ -0,0 +1,337 @@
+"""
+Shared helpers for layout `parameters` schemas.
+
+Layouts keep their schema either at the top level (`parameters`) or under
+`properties.parameters`. Schemas are rendered into LLM prompts in one of three modes:
+  - "json":      indented JSON (the original prompt format)
+  - "minified":  compact JSON with metadata keys removed
+  - "signature": TypeScript-like field signatures with short comments
+Renderings are memoized per schema object, so each layout is rendered once.
+
+Image targets (`tool_type: image_search`) are compiled once per schema into an
+ImagePathPlan of path templates with array wildcards; per request the plan is only
+resolved against the mapped data.
+"""
+
+from collections import OrderedDict
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA_RENDER_MODES = ("json", "minified", "signature")
+
+# Keys of a field spec that only drive server-side processing or repeat sample content
+DEFAULT_STRIP_KEYS = frozenset({"tool_type", "render_size", "example", "examples", "default"})
+# Field-spec keys shown as constraints in signature mode
+_CONSTRAINT_KEYS = ("max", "min", "max_words", "max_letters", "maxItems", "minItems", "format")
+# Keys that hold the element/field specs of arrays and objects
+_CHILD_KEYS = ("data", "items", "properties")
+
+
+def extract_parameters_schema(layout_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the layout's parameters schema (`parameters` or `properties.parameters`), or None."""
+    if not isinstance(layout_data, dict):
+        return None
+    if isinstance(layout_data.get("parameters"), dict):
+        return layout_data["parameters"]
+    props = layout_data.get("properties")
+    if isinstance(props, dict) and isinstance(props.get("parameters"), dict):
+        return props["parameters"]
+    return None
+
+
+def _is_field_spec(node: Any) -> bool:
+    """A field spec carries its own `type` (or a oneOf/anyOf union); anything else is a field map."""
+    return isinstance(node, dict) and (isinstance(node.get("type"), (str, list)) or "oneOf" in node or "anyOf" in node)
+
+
+def strip_schema(node: Any, strip_keys: Iterable[str] = DEFAULT_STRIP_KEYS) -> Any:
+    """Copy of the schema without the given keys on field specs (field names are never removed)."""
+    keys = frozenset(strip_keys)
+    if isinstance(node, dict):
+        is_spec = _is_field_spec(node)
+        return {k: strip_schema(v, keys) for k, v in node.items() if not (is_spec and k in keys)}
+    if isinstance(node, list):
+        return [strip_schema(item, keys) for item in node]
+    return node
+
+
+def _truncate(text: str, limit: Optional[int]) -> str:
+    text = " ".join(str(text).split())
+    if limit and len(text) > limit:
+        return text[: max(0, limit - 1)].rstrip() + "…"
+    return text
+
+
+def _signature_type(spec: Dict[str, Any], indent: int, max_description_chars: Optional[int]) -> str:
+    union = spec.get("oneOf") or spec.get("anyOf")
+    if isinstance(union, list) and union:
+        return " | ".join(
+            _signature_type(s, indent, max_description_chars) if isinstance(s, dict) else "any" for s in union
+        )
+    if isinstance(spec.get("enum"), list) and spec["enum"]:
+        return " | ".join(json.dumps(v, ensure_ascii=False) for v in spec["enum"])
+    raw_type = spec.get("type", "any")
+    type_names = [t.strip() for t in raw_type.split("|")] if isinstance(raw_type, str) else [str(t) for t in raw_type]
+    rendered = []
+    for type_name in type_names:
+        if type_name in ("array", "object"):
+            child = next((spec[k] for k in _CHILD_KEYS if isinstance(spec.get(k), dict)), None)
+            if child is None:
+                inner = "any"
+            elif _is_field_spec(child):
+                inner = _signature_type(child, indent, max_description_chars)
+            else:
+                inner = _signature_fields(child, indent, max_description_chars)
+            rendered.append(f"Array<{inner}>" if type_name == "array" else inner)
+        else:
+            rendered.append(type_name)
+    return " | ".join(rendered)
+
+
+def _signature_fields(fields: Dict[str, Any], indent: int, max_description_chars: Optional[int]) -> str:
+    pad = "  " * (indent + 1)
+    lines = ["{"]
+    for name, spec in fields.items():
+        if not isinstance(spec, dict):
+            lines.append(f"{pad}{name}: {json.dumps(spec, ensure_ascii=False)}")
+            continue
+        line = f"{pad}{name}: {_signature_type(spec, indent + 1, max_description_chars)}"
+        notes = []
+        if spec.get("description"):
+            notes.append(_truncate(spec["description"], max_description_chars))
+        constraints = [f"{k}={spec[k]}" for k in _CONSTRAINT_KEYS if k in spec]
+        if constraints:
+            notes.append("(" + ", ".join(constraints) + ")")
+        if notes:
+            line += "  // " + " ".join(notes)
+        lines.append(line)
+    lines.append("  " * indent + "}")
+    return "\n".join(lines)
+
+
+def render_schema(schema: Optional[Dict[str, Any]],
+                  mode: str = "json",
+                  strip_keys: Iterable[str] = DEFAULT_STRIP_KEYS,
+                  max_description_chars: Optional[int] = None) -> str:
+    """Render a parameters schema for a prompt.
+
+    `strip_keys` applies to "minified" only; `max_description_chars` to "signature" only.
+    """
+    schema = schema or {}
+    if mode == "json":
+        return json.dumps(schema, ensure_ascii=False, indent=2)
+    if mode == "minified":
+        return json.dumps(strip_schema(schema, strip_keys), ensure_ascii=False, separators=(",", ":"))
+    if mode == "signature":
+        if _is_field_spec(schema):
+            return _signature_type(schema, 0, max_description_chars)
+        return _signature_fields(schema, 0, max_description_chars)
+    raise ValueError(f"Unknown schema render mode: {mode} (expected one of {SCHEMA_RENDER_MODES})")
+
+
+def trim_examples(examples: Any, max_examples: Optional[int]) -> List[Any]:
+    examples = list(examples or []) if isinstance(examples, (list, tuple)) else ([examples] if examples else [])
+    return examples if max_examples is None or max_examples < 0 else examples[:max_examples]
+
+
+class SchemaRenderCache:
+    """Memoizes render_schema per (schema object, options); bounded LRU.
+
+    The schema object itself is kept alongside the text so its id() cannot be reused
+    while the entry is alive.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Any, str]]" = OrderedDict()
+
+    def render(self, schema: Optional[Dict[str, Any]], mode: str, **options: Any) -> str:
+        key = (id(schema), mode, tuple(sorted((k, str(v)) for k, v in options.items())))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is schema:
+            self._entries.move_to_end(key)
+            return entry[1]
+        text = render_schema(schema, mode, **options)
+        self._entries[key] = (schema, text)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return text
+
+
+schema_render_cache = SchemaRenderCache()
+
+
+# ----- image path plans -----
+
+class _Wildcard:
+    """Array step of an image path template."""
+
+    __slots__ = ("symbol",)
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+
+    def __repr__(self) -> str:
+        return self.symbol
+
+
+# Every index of a list value
+EACH_INDEX = _Wildcard("[*]")
+# Every index of a list value, or index 0 when the list is empty/missing (image arrays get at least one image)
+EACH_INDEX_OR_FIRST = _Wildcard("[*+]")
+
+# Keys of a parameters-style field map that are schema metadata, not fields
+IMAGE_PATH_META_KEYS = frozenset({
+    "description", "type", "example", "examples", "max", "max_words", "file",
+    "html", "layout", "name", "contents_type", "oneOf", "items", "data",
+    "default", "tool_type",
+})
+
+_PathStep = Any  # str (dict key) | EACH_INDEX | EACH_INDEX_OR_FIRST
+ImagePath = List[Any]  # e.g. ["thumbnail_list", 0, "thumbnail_img"]
+RenderSize = Tuple[int, int]  # (width, height) in CSS pixels
+
+
+def is_image_tool(node: Any) -> bool:
+    """True for schema nodes marked `tool_type: image_search` (or `img_search`)."""
+    return isinstance(node, dict) and str(node.get("tool_type", "")).strip().lower() in ("image_search", "img_search")
+
+
+def parse_render_size(node: Any) -> Optional[RenderSize]:
+    """Render size hint of an image node: `render_size` as {"width", "height"}, [w, h] or a square side."""
+    hint = node.get("render_size") if isinstance(node, dict) else None
+    try:
+        if isinstance(hint, dict):
+            width, height = int(hint.get("width") or hint.get("height")), int(hint.get("height") or hint.get("width"))
+        elif isinstance(hint, (list, tuple)) and len(hint) == 2:
+            width, height = int(hint[0]), int(hint[1])
+        elif isinstance(hint, (int, float)) and not isinstance(hint, bool):
+            width = height = int(hint)
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return (width, height) if width > 0 and height > 0 else None
+
+
+class ImagePathPlan:
+    """Image target paths of one parameters schema, compiled once.
+
+    Each template is a tuple of steps: a str key descends into a dict value, EACH_INDEX
+    expands every element of a list value, EACH_INDEX_OR_FIRST (last step only) expands a
+    list of images or falls back to index 0. A step whose value has the wrong type yields
+    nothing, which reproduces the data-driven branching of the old recursive walk
+    (non-standard `data`, standard `items`/`properties`, and parameters-style field maps).
+    Resolved paths come out in schema (depth-first) order. Each template also carries the
+    image node's `render_size` hint (None when the schema has none).
+    """
+
+    __slots__ = ("templates", "render_sizes", "_orders")
+
+    def __init__(self, templates: List[Tuple[Tuple[_PathStep, ...], Tuple[Optional[int], ...], Optional[RenderSize]]]):
+        self.templates: Tuple[Tuple[_PathStep, ...], ...] = tuple(steps for steps, _, _ in templates)
+        self.render_sizes: Tuple[Optional[RenderSize], ...] = tuple(size for _, _, size in templates)
+        # Position of each key step among its siblings, used to restore depth-first order
+        self._orders: Tuple[Tuple[Optional[int], ...], ...] = tuple(order for _, order, _ in templates)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def describe(self) -> List[str]:
+        """Templates as strings, e.g. "thumbnail_list[*].thumbnail_img"."""
+        out = []
+        for steps in self.templates:
+            text = ""
+            for step in steps:
+                text += repr(step) if isinstance(step, _Wildcard) else (f".{step}" if text else str(step))
+            out.append(text)
+        return out
+
+    def resolve(self, data: Any) -> List[ImagePath]:
+        """Concrete paths of the image targets in the mapped data."""
+        return [path for path, _ in self.resolve_targets(data)]
+
+    def resolve_targets(self, data: Any) -> List[Tuple[ImagePath, Optional[RenderSize]]]:
+        """Like resolve(), paired with each target's render size hint."""
+        found = []
+        for steps, order, size in zip(self.templates, self._orders, self.render_sizes):
+            frontier = [((), (), data)]  # (path, sort key, value)
+            for step, position in zip(steps, order):
+                advanced = []
+                if step is EACH_INDEX or step is EACH_INDEX_OR_FIRST:
+                    for path, key, value in frontier:
+                        if isinstance(value, list) and value:
+                            advanced.extend((path + (i,), key + (i,), item) for i, item in enumerate(value))
+                        elif step is EACH_INDEX_OR_FIRST:
+                            advanced.append((path + (0,), key + (0,), None))
+                else:
+                    for path, key, value in frontier:
+                        if isinstance(value, dict):
+                            advanced.append((path + (step,), key + (position,), value.get(step)))
+                frontier = advanced
+                if not frontier:
+                    break
+            found.extend((key, list(path), size) for path, key, _ in frontier)
+        found.sort(key=lambda item: item[0])
+        return [(path, size) for _, path, size in found]
+
+
+def _compile_image_paths(node: Any, steps: Tuple, order: Tuple, out: List) -> None:
+    if not isinstance(node, dict):
+        return
+    node_type = node.get("type")
+    if node_type == "array" and is_image_tool(node):
+        out.append((steps + (EACH_INDEX_OR_FIRST,), order + (None,), parse_render_size(node)))
+        return
+    if is_image_tool(node):
+        out.append((steps, order, parse_render_size(node)))
+        return
+
+    # List values: non-standard `data` first, then standard `items`
+    if node_type == "array":
+        if isinstance(node.get("data"), dict):
+            _compile_image_paths(node["data"], steps + (EACH_INDEX,), order + (None,), out)
+        elif isinstance(node.get("items"), dict):
+            items = node["items"]
+            if is_image_tool(items):
+                out.append((steps + (EACH_INDEX,), order + (None,), parse_render_size(items)))
+            elif items.get("type") == "object" and isinstance(items.get("properties"), dict):
+                for position, (key, sub) in enumerate(items["properties"].items()):
+                    _compile_image_paths(sub, steps + (EACH_INDEX, key), order + (None, position), out)
+
+    # Dict values: standard `properties`, otherwise a parameters-style field map
+    fields = node.get("properties")
+    if not (fields and isinstance(fields, dict)):
+        fields = {k: v for k, v in node.items() if k not in IMAGE_PATH_META_KEYS}
+    for position, (key, sub) in enumerate(fields.items()):
+        _compile_image_paths(sub, steps + (key,), order + (position,), out)
+
+
+def compile_image_paths(schema: Optional[Dict[str, Any]]) -> ImagePathPlan:
+    """Compile a parameters schema into its ImagePathPlan."""
+    templates: List = []
+    _compile_image_paths(schema or {}, (), (), templates)
+    return ImagePathPlan(templates)
+
+
+class ImagePathPlanCache:
+    """Memoizes compile_image_paths per schema object; bounded LRU (same keying as SchemaRenderCache)."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[Any, ImagePathPlan]]" = OrderedDict()
+
+    def get(self, schema: Optional[Dict[str, Any]]) -> ImagePathPlan:
+        key = id(schema)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is schema:
+            self._entries.move_to_end(key)
+            return entry[1]
+        plan = compile_image_paths(schema)
+        self._entries[key] = (schema, plan)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return plan
+
+
+image_path_plans = ImagePathPlanCache()
@@ -1,16 +1,124 @@
 import os
+import time
 from openai import AsyncOpenAI
 import google.generativeai as genai
 import httpx
-from typing import Optional, Literal
+from typing import Callable, Dict, Optional, Literal
 from loguru import logger
 
+from .llm_cache import LLMCache, create_llm_cache, make_cache_key
+from .llm_replay import get_replay_store
+from .llm_scheduler import llm_scheduler
+from .metrics import LLM_CALL_SECONDS, LLM_CALLS, record_llm_usage
+from .tracing import tracer
+
 # Set API keys (get from environment variables)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Optional OpenAI-compatible endpoint (e.g. a local stub server for benchmarks)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Shared HTTP connection pool for provider clients
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+
+
+class LLMClientRegistry:
+    """Long-lived provider clients, created on first use and reused by every call.
+
+    The OpenAI client shares one httpx connection pool (keep-alive, bounded size), so
+    calls after the first skip the TCP/TLS handshake. Gemini is configured once and
+    GenerativeModel instances are kept per model name.
+    """
+
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._openai_client: Optional[AsyncOpenAI] = None
+        self._gemini_configured = False
+        self._gemini_models: Dict[str, "genai.GenerativeModel"] = {}
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT),
+            )
+        return self._http_client
+
+    def openai(self) -> AsyncOpenAI:
+        if self._openai_client is None:
+            self._openai_client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                http_client=self.http_client(),
+            )
+        return self._openai_client
+
+    def gemini_model(self, model_name: str) -> "genai.GenerativeModel":
+        if not self._gemini_configured:
+            genai.configure(api_key=GEMINI_API_KEY)
+            self._gemini_configured = True
+        model = self._gemini_models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self._gemini_models[model_name] = model
+        return model
+
+    async def aclose(self) -> None:
+        if self._openai_client is not None:
+            try:
+                await self._openai_client.close()
+            except Exception as e:
+                logger.warning(f"Error closing OpenAI client: {e}")
+            self._openai_client = None
+        if self._http_client is not None:
+            try:
+                await self._http_client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing LLM HTTP client: {e}")
+            self._http_client = None
+        self._gemini_models.clear()
+
+
+llm_clients = LLMClientRegistry()
 
-def _get_provider(model_name: str) -> Literal["gemini", "gpt"]:
-    """Parses the model name string to return either 'gemini' or 'gpt' provider."""
+# Response cache shared by all call_llm call sites (created lazily, see get_llm_cache)
+_llm_cache: Optional[LLMCache] = None
+
+def get_llm_cache() -> LLMCache:
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = create_llm_cache()
+        logger.info(f"LLM response cache backend: {_llm_cache.name}")
+    return _llm_cache
+
+def set_llm_cache(cache: Optional[LLMCache]) -> None:
+    """Replace the response cache (pass None to fall back to the env-configured default)."""
+    global _llm_cache
+    _llm_cache = cache
+
+async def close_llm_clients() -> None:
+    """Release pooled provider connections, the response cache and the fixture file (called on app shutdown)."""
+    global _llm_cache
+    await llm_clients.aclose()
+    get_replay_store().close()
+    if _llm_cache is not None:
+        _llm_cache.close()
+        _llm_cache = None
+
+def _get_provider(model_name: str) -> Literal["gemini", "gpt", "replay"]:
+    """Parses the model name string to return either 'gemini' or 'gpt' provider.
+
+    With LLM_REPLAY_MODE=replay every model is served by the recorded fixtures ('replay').
+    """
+    if get_replay_store().mode == "replay":
+        return "replay"
     model_name_lower = model_name.lower()
     if "gemini" in model_name_lower:
         return "gemini"
@@ -24,10 +132,22 @@ def read_prompt(file_path: str):
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
-async def call_gemini(prompt: str, model_name: str):
+def _record_usage(model_name: str, site: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    record_llm_usage(model_name, site, input_tokens, output_tokens)
+    tracer.current_span().set_attributes({"gen_ai.usage.input_tokens": input_tokens, "gen_ai.usage.output_tokens": output_tokens})
+
+def _is_valid(validate: Optional[Callable[[str], bool]], response: str) -> bool:
+    if validate is None:
+        return True
+    try:
+        return bool(validate(response))
+    except Exception:
+        return False
+
+
+async def call_gemini(prompt: str, model_name: str, site: str = "other"):
     logger.info(f"Calling Gemini model: {model_name}")
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel(model_name)
+    model = llm_clients.gemini_model(model_name)
     
     generation_config = genai.types.GenerationConfig(
         temperature=0.1
@@ -38,11 +158,14 @@ async def call_gemini(prompt: str, model_name: str):
         generation_config=generation_config
     )
     logger.info("Gemini call successful.")
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        _record_usage(model_name, site, getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
     return response.text
 
-async def call_gpt(prompt: str, model_name: str):
+async def call_gpt(prompt: str, model_name: str, site: str = "other"):
     logger.info(f"Calling GPT model: {model_name}")
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    client = llm_clients.openai()
     
     response = await client.chat.completions.create(
         model=model_name,
@@ -52,21 +175,83 @@ async def call_gpt(prompt: str, model_name: str):
         # temperature=0.2
     )
     logger.info(f"GPT call successful. {response.choices[0].message.content}")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        _record_usage(model_name, site, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
     return response.choices[0].message.content
 
-async def call_llm(prompt: str, model_name: Optional[str] = None):
+async def call_replay(prompt: str, model_name: str, site: str = "other"):
+    logger.info(f"Replaying recorded response for model: {model_name}")
+    return await get_replay_store().replay_text(prompt, model_name, site)
+
+async def call_llm(prompt: str,
+                   model_name: Optional[str] = None,
+                   use_cache: bool = True,
+                   priority: Literal["critical", "normal", "background"] = "normal",
+                   site: str = "other",
+                   validate: Optional[Callable[[str], bool]] = None):
     """
     Calls the LLM with the specified prompt and model name.
+
+    Responses are cached by model + normalized prompt hash (see core.llm_cache);
+    call sites whose output must not be reused can pass use_cache=False.
+    Call sites that parse the response can pass `validate`: only responses it accepts
+    are cached or served from the cache, so a retry after a parse failure asks the model again.
+    Cache misses go through core.llm_scheduler: `priority` decides who goes first
+    when the model's concurrency cap or rate limit is reached.
+    LLM_REPLAY_MODE=record|replay stores/serves provider responses as fixtures (core.llm_replay).
+    `site` names the calling feature in metrics (e.g. "classify", "map").
     """
     if not model_name:
         logger.error("model_name argument not provided.")
         raise ValueError("The model_name argument must be provided.")
 
-    logger.info(f"Determining provider for model: {model_name}")
-    provider = _get_provider(model_name)
-    logger.info(f"Provider determined: {provider}")
+    with tracer.span("llm.call", {
+        "gen_ai.request.model": model_name,
+        "llm.site": site,
+        "llm.priority": priority,
+        "llm.prompt_chars": len(prompt),
+    }) as span:
+        cache = get_llm_cache() if use_cache else None
+        cache_key = make_cache_key(model_name, prompt) if cache else None
+        if cache:
+            cached = await cache.get(cache_key)
+            if cached is not None and not _is_valid(validate, cached):
+                logger.warning(f"Ignoring cached LLM response rejected by its call site: {model_name} ({site})")
+                cached = None
+            span.set_attribute("llm.cache_hit", cached is not None)
+            if cached is not None:
+                logger.info(f"LLM cache hit for model: {model_name}")
+                LLM_CALLS.labels(model_name, site, "cache_hit").inc()
+                return cached
+
+        logger.info(f"Determining provider for model: {model_name}")
+        provider = _get_provider(model_name)
+        logger.info(f"Provider determined: {provider}")
+        span.set_attribute("gen_ai.system", {"gemini": "gemini", "gpt": "openai"}.get(provider, provider))
+
+        replay_store = get_replay_store()
+        queued = time.perf_counter()
+        try:
+            async with llm_scheduler.slot(model_name, priority):
+                span.set_attribute("llm.queue_ms", round((time.perf_counter() - queued) * 1000, 1))
+                started = time.perf_counter()
+                if provider == "gemini":
+                    response = await call_gemini(prompt, model_name, site)
+                elif provider == "gpt":
+                    response = await call_gpt(prompt, model_name, site)
+                elif provider == "replay":
+                    response = await call_replay(prompt, model_name, site)
+                if replay_store.mode == "record":
+                    replay_store.record(replay_store.make_key(model_name, prompt), model_name, site, response,
+                                        time.perf_counter() - started)
+        except Exception:
+            LLM_CALLS.labels(model_name, site, "error").inc()
+            raise
+        LLM_CALL_SECONDS.labels(model_name, site).observe(time.perf_counter() - queued)
+        LLM_CALLS.labels(model_name, site, "ok").inc()
+        span.set_attribute("llm.response_chars", len(response or ""))
 
-    if provider == "gemini":
-        return await call_gemini(prompt, model_name)
-    elif provider == "gpt":
-        return await call_gpt(prompt, model_name) 
\ No newline at end of file
+        if cache and _is_valid(validate, response):
+            await cache.set(cache_key, response)
+        return response
@@ -0,0 +1,186 @@
+"""
+LLM response cache used by core.llm.call_llm.
+
+Responses are keyed by model name + a hash of the whitespace-normalized prompt.
+Backends:
+  - "memory": in-process LRU (default)
+  - "sqlite": on-disk cache shared across restarts/processes
+  - "off":    no caching
+"""
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from loguru import logger
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite3"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def make_cache_key(model_name: str, prompt: str) -> str:
+    """Return the cache key for a (model, prompt) pair; whitespace differences are ignored."""
+    normalized = _WHITESPACE_RE.sub(" ", str(prompt or "")).strip()
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class LLMCache:
+    """Base cache interface (no-op). Subclasses override _get/_set."""
+
+    name = "off"
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or not isinstance(value, str) or not value:
+            return
+        await self._set(key, value, ttl)
+
+    async def _get(self, key: str) -> Optional[str]:
+        return None
+
+    async def _set(self, key: str, value: str, ttl: float) -> None:
+        return None
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class MemoryLLMCache(LLMCache):
+    """In-process LRU with per-entry expiry."""
+
+    name = "memory"
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class SqliteLLMCache(LLMCache):
+    """On-disk cache in a single sqlite file; LRU by last access time."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed_at)")
+            self._conn.commit()
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def _set_sync(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    async def _get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def _set(self, key: str, value: str, ttl: float) -> None:
+        await asyncio.to_thread(self._set_sync, key, value, ttl)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_llm_cache(backend: str = LLM_CACHE_BACKEND) -> LLMCache:
+    """Build a cache for the given backend name ("memory", "sqlite" or "off")."""
+    try:
+        if backend == "memory":
+            return MemoryLLMCache()
+        if backend == "sqlite":
+            return SqliteLLMCache()
+    except Exception as e:
+        logger.warning(f"Failed to create LLM cache backend '{backend}', caching disabled: {e}")
+        return LLMCache()
+    if backend not in ("off", "none", ""):
+        logger.warning(f"Unknown LLM cache backend '{backend}', caching disabled")
+    return LLMCache()
@@ -0,0 +1,359 @@
+"""
+Recorded-fixture LLM provider for load tests without network access.
+
+LLM_REPLAY_MODE:
+  - "off":    the real providers only (default)
+  - "record": call the real providers and append every response to LLM_REPLAY_FILE
+  - "replay": answer every call from LLM_REPLAY_FILE; no provider is contacted
+core.llm.call_llm uses it as provider "replay" (see _get_provider), and the MCP planning loop
+gets it through create_anthropic_client(), so one fixture file covers a whole request.
+
+Fixtures are JSON lines {"key", "model", "site", "latency_ms", "response"}. The key is the
+model plus a hash of the whitespace-normalized prompt in which volatile values
+(LLM_REPLAY_KEY_IGNORE: dates/times and current_unix by default) are masked, so a prompt
+recorded yesterday still matches. A key recorded several times replays its responses in turn.
+Planning calls are keyed by the system prompt, the first user message and the tool calls made
+so far (tool results are left out since mock tool data may vary), i.e. by the position in the
+recorded conversation.
+
+A replayed call waits its recorded latency x LLM_REPLAY_LATENCY_SCALE, or LLM_REPLAY_LATENCY_MS
+when set. Streamed planning responses release their content blocks spread over that time
+(LLM_REPLAY_STREAM=false delivers them all at the end). A missing fixture raises LLMReplayMiss,
+or with LLM_REPLAY_ON_MISS=site is answered by fixtures recorded for the same model and call
+site in turn: prompts can still differ between runs (tool results are joined in completion
+order, some choices are random), and this keeps the load shape without exact matches.
+"""
+
+import asyncio
+from collections import Counter
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from .llm_cache import make_cache_key
+
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "off").lower()
+LLM_REPLAY_FILE = os.getenv("LLM_REPLAY_FILE", os.path.join("cache", "llm_replay.jsonl"))
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+# Fixed latency for every replayed call; empty = use the recorded latency
+LLM_REPLAY_LATENCY_MS = os.getenv("LLM_REPLAY_LATENCY_MS", "")
+LLM_REPLAY_STREAM = os.getenv("LLM_REPLAY_STREAM", "true").lower() in ("1", "true", "yes")
+# error | site (any fixture of the same model + call site)
+LLM_REPLAY_ON_MISS = os.getenv("LLM_REPLAY_ON_MISS", "error").lower()
+LLM_REPLAY_KEY_IGNORE = os.getenv(
+    "LLM_REPLAY_KEY_IGNORE",
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?|current_unix['\"]?:\s*\d+",
+)
+
+REPLAY_MODES = ("off", "record", "replay")
+
+
+class LLMReplayMiss(Exception):
+    """No fixture was recorded for this call."""
+
+
+class LLMReplayStore:
+    """Fixture file (JSON lines) loaded on first lookup; recording appends to it."""
+
+    def __init__(self,
+                 path: str = LLM_REPLAY_FILE,
+                 mode: str = LLM_REPLAY_MODE,
+                 latency_scale: float = LLM_REPLAY_LATENCY_SCALE,
+                 latency_ms: Optional[float] = float(LLM_REPLAY_LATENCY_MS) if LLM_REPLAY_LATENCY_MS else None,
+                 stream: bool = LLM_REPLAY_STREAM,
+                 on_miss: str = LLM_REPLAY_ON_MISS,
+                 key_ignore: str = LLM_REPLAY_KEY_IGNORE):
+        if mode not in REPLAY_MODES:
+            logger.warning(f"Unknown LLM_REPLAY_MODE '{mode}', replay disabled")
+            mode = "off"
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.latency_ms = latency_ms
+        self.stream = stream
+        self.on_miss = on_miss
+        self._ignore = re.compile(key_ignore) if key_ignore else None
+        self._fixtures: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._by_site: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._cursor: Counter = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.recorded = 0
+
+    def make_key(self, model: str, prompt: str) -> str:
+        text = self._ignore.sub("<volatile>", str(prompt or "")) if self._ignore else prompt
+        return make_cache_key(model, text)
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._fixtures is None:
+            fixtures: Dict[str, List[Dict[str, Any]]] = {}
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            fixture = json.loads(line)
+                            fixtures.setdefault(fixture["key"], []).append(fixture)
+                            self._by_site.setdefault((fixture.get("model"), fixture.get("site")), []).append(fixture)
+            except FileNotFoundError:
+                if self.mode == "replay":
+                    logger.warning(f"LLM replay fixture file not found: {self.path}")
+            self._fixtures = fixtures
+            logger.info(f"LLM replay fixtures loaded: {sum(len(v) for v in fixtures.values())} from {self.path}")
+        return self._fixtures
+
+    def lookup(self, key: str, model: str, site: str) -> Dict[str, Any]:
+        with self._lock:
+            candidates = self._load().get(key)
+            cursor: Any = key
+            if candidates:
+                self.hits[site] += 1
+            else:
+                self.misses[site] += 1
+                candidates = self._by_site.get((model, site)) if self.on_miss == "site" else None
+                if not candidates:
+                    raise LLMReplayMiss(f"No recorded response for {site} call ({key})")
+                cursor = (model, site)
+            fixture = candidates[self._cursor[cursor] % len(candidates)]
+            self._cursor[cursor] += 1
+            return fixture
+
+    def record(self, key: str, model: str, site: str, response: Any, latency: float) -> None:
+        fixture = {"key": key, "model": model, "site": site, "latency_ms": round(latency * 1000, 1), "response": response}
+        with self._lock:
+            self._load().setdefault(key, []).append(fixture)
+            self._by_site.setdefault((model, site), []).append(fixture)
+            try:
+                if self._file is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(fixture, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+                self.recorded += 1
+            except OSError as e:
+                logger.warning(f"Failed to record LLM fixture to {self.path}: {e}")
+
+    def delay(self, fixture: Dict[str, Any]) -> float:
+        latency_ms = self.latency_ms if self.latency_ms is not None else float(fixture.get("latency_ms") or 0)
+        return max(0.0, latency_ms * self.latency_scale / 1000)
+
+    async def replay_text(self, prompt: str, model: str, site: str) -> str:
+        fixture = self.lookup(self.make_key(model, prompt), model, site)
+        await asyncio.sleep(self.delay(fixture))
+        return fixture["response"]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "on_miss": self.on_miss,
+            "fixtures": sum(len(v) for v in (self._fixtures or {}).values()),
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "recorded": self.recorded,
+        }
+
+
+_replay_store: Optional[LLMReplayStore] = None
+
+
+def get_replay_store() -> LLMReplayStore:
+    global _replay_store
+    if _replay_store is None:
+        _replay_store = LLMReplayStore()
+        if _replay_store.mode != "off":
+            logger.info(f"LLM replay mode: {_replay_store.mode} ({_replay_store.path})")
+    return _replay_store
+
+
+def set_replay_store(store: Optional[LLMReplayStore]) -> None:
+    """Replace the fixture store (pass None to fall back to the env-configured default)."""
+    global _replay_store
+    _replay_store = store
+
+
+# ----- Anthropic Messages API (MCP planning loop) -----
+
+def _field(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n".join(str(_field(block, "text") or "") for block in content or [])
+
+
+def planning_prompt(kwargs: Dict[str, Any]) -> str:
+    """Key text of one planning call: system prompt, first user message and the tool calls so far."""
+    messages = kwargs.get("messages") or []
+    parts = [str(kwargs.get("system") or "")]
+    if messages:
+        parts.append(_text_of(messages[0].get("content")))
+    for message in messages[1:]:
+        if message.get("role") != "assistant" or isinstance(message.get("content"), str):
+            continue
+        for block in message.get("content") or []:
+            if _field(block, "type") == "tool_use":
+                parts.append(f"{_field(block, 'name')} {json.dumps(_field(block, 'input'), sort_keys=True, default=str)}")
+    return "\n".join(parts)
+
+
+def _message_to_fixture(message: Any) -> Dict[str, Any]:
+    blocks = []
+    for block in _field(message, "content") or []:
+        kind = _field(block, "type")
+        if kind == "tool_use":
+            blocks.append({"type": kind, "id": _field(block, "id"), "name": _field(block, "name"), "input": _field(block, "input")})
+        elif kind == "text":
+            blocks.append({"type": kind, "text": _field(block, "text")})
+    usage = _field(message, "usage")
+    return {
+        "content": blocks,
+        "stop_reason": _field(message, "stop_reason"),
+        "usage": {"input_tokens": _field(usage, "input_tokens"), "output_tokens": _field(usage, "output_tokens")} if usage else None,
+    }
+
+
+def _fixture_to_message(response: Dict[str, Any]) -> SimpleNamespace:
+    usage = response.get("usage")
+    return SimpleNamespace(
+        content=[SimpleNamespace(**block) for block in response.get("content") or []],
+        stop_reason=response.get("stop_reason"),
+        usage=SimpleNamespace(**usage) if usage else None,
+    )
+
+
+class _ReplayStream:
+    """messages.stream() context that emits the recorded blocks as content_block_stop events."""
+
+    def __init__(self, message: SimpleNamespace, delay: float, spread: bool):
+        self._message = message
+        self._delay = delay
+        self._spread = spread
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> bool:
+        return False
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        blocks = self._message.content
+        if not self._spread or not blocks:
+            await asyncio.sleep(self._delay)
+        for block in blocks:
+            if self._spread:
+                await asyncio.sleep(self._delay / len(blocks))
+            yield SimpleNamespace(type="content_block_stop", content_block=block)
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return self._message
+
+
+class _RecordingStream:
+    """Wraps the upstream messages.stream() context and records its final message."""
+
+    def __init__(self, upstream, on_final):
+        self._upstream = upstream
+        self._on_final = on_final
+        self._stream = None
+        self._started = 0.0
+
+    async def __aenter__(self):
+        self._started = time.perf_counter()
+        self._stream = await self._upstream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._upstream.__aexit__(*exc)
+
+    def __aiter__(self):
+        return self._stream.__aiter__()
+
+    async def get_final_message(self):
+        message = await self._stream.get_final_message()
+        self._on_final(message, time.perf_counter() - self._started)
+        return message
+
+
+class _ReplayMessages:
+    def __init__(self, client: "ReplayAnthropic"):
+        self._client = client
+
+    async def create(self, **kwargs):
+        return await self._client._create(kwargs)
+
+    def stream(self, **kwargs):
+        return self._client._stream(kwargs)
+
+
+class ReplayAnthropic:
+    """AsyncAnthropic stand-in: replays fixtures, or records `upstream`'s responses (record mode)."""
+
+    def __init__(self, upstream: Any = None, store: Optional[LLMReplayStore] = None):
+        self.upstream = upstream
+        self._store = store
+        self.messages = _ReplayMessages(self)
+
+    @property
+    def store(self) -> LLMReplayStore:
+        return self._store or get_replay_store()
+
+    def _key(self, kwargs: Dict[str, Any]) -> str:
+        return self.store.make_key(kwargs.get("model", "anthropic"), planning_prompt(kwargs))
+
+    def _lookup(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return self.store.lookup(self._key(kwargs), kwargs.get("model", "anthropic"), "plan")
+
+    def _record(self, kwargs: Dict[str, Any], message: Any, latency: float) -> None:
+        self.store.record(self._key(kwargs), kwargs.get("model", "anthropic"), "plan", _message_to_fixture(message), latency)
+
+    async def _create(self, kwargs: Dict[str, Any]):
+        if self.upstream is not None:
+            started = time.perf_counter()
+            message = await self.upstream.messages.create(**kwargs)
+            self._record(kwargs, message, time.perf_counter() - started)
+            return message
+        fixture = self._lookup(kwargs)
+        await asyncio.sleep(self.store.delay(fixture))
+        return _fixture_to_message(fixture["response"])
+
+    def _stream(self, kwargs: Dict[str, Any]):
+        if self.upstream is not None:
+            return _RecordingStream(self.upstream.messages.stream(**kwargs),
+                                    lambda message, latency: self._record(kwargs, message, latency))
+        fixture = self._lookup(kwargs)
+        return _ReplayStream(_fixture_to_message(fixture["response"]), self.store.delay(fixture), self.store.stream)
+
+    async def close(self) -> None:
+        if self.upstream is not None:
+            await self.upstream.close()
+
+
+def create_anthropic_client() -> Any:
+    """Anthropic client for the planning loop, wrapped for record/replay per LLM_REPLAY_MODE."""
+    mode = get_replay_store().mode
+    if mode == "replay":
+        return ReplayAnthropic()
+    from anthropic import AsyncAnthropic
+    client = AsyncAnthropic()
+    return ReplayAnthropic(client) if mode == "record" else client
@@ -0,0 +1,231 @@
+"""
+Central scheduler for outbound LLM calls.
+
+Every model gets its own lane with a concurrency cap and a token bucket
+(requests per minute). Waiting calls are released strictly by priority class,
+FIFO inside a class, so critical-path calls (classification, data mapping)
+go ahead of cosmetic ones (progress messages) when a lane is saturated.
+
+Limits:
+  - LLM_MAX_CONCURRENCY:  default in-flight cap per model
+  - LLM_RATE_PER_MINUTE:  default requests/minute per model (0 = unlimited)
+  - LLM_RATE_BURST:       token bucket size (defaults to the concurrency cap)
+  - LLM_MODEL_LIMITS:     per-model JSON overrides, e.g.
+                          {"gpt-4.1-mini": {"concurrency": 32, "rpm": 3000}}
+
+Callers with their own defaults (the MCP planning loop registers its Anthropic
+model with ANTHROPIC_MAX_CONCURRENCY) use set_default_limits(); LLM_MODEL_LIMITS
+entries still take precedence over those.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "0"))
+LLM_MODEL_LIMITS = os.getenv("LLM_MODEL_LIMITS", "")
+
+PRIORITIES = {"critical": 0, "normal": 1, "background": 2}
+_WAIT_SAMPLES = 512
+
+
+def _load_model_limits(raw: str) -> Dict[str, Dict[str, Any]]:
+    if not raw:
+        return {}
+    try:
+        limits = json.loads(raw)
+        if isinstance(limits, dict):
+            return {str(k): v for k, v in limits.items() if isinstance(v, dict)}
+    except Exception as e:
+        logger.warning(f"Invalid LLM_MODEL_LIMITS, ignoring: {e}")
+    return {}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _ModelLane:
+    """Concurrency cap + token bucket + priority wait queue for one model."""
+
+    def __init__(self, model_name: str, concurrency: int, rate_per_minute: float, burst: int):
+        self.model_name = model_name
+        self.concurrency = max(1, concurrency)
+        self.rate_per_sec = max(0.0, rate_per_minute) / 60.0
+        self.burst = max(1, burst or self.concurrency)
+        self.tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.completed = 0
+        self.wait_count = {p: 0 for p in PRIORITIES}
+        self.wait_total = {p: 0.0 for p in PRIORITIES}
+        self.wait_max = {p: 0.0 for p in PRIORITIES}
+        self.wait_samples: Dict[str, Deque[float]] = {p: deque(maxlen=_WAIT_SAMPLES) for p in PRIORITIES}
+
+    def _refill(self) -> None:
+        if self.rate_per_sec <= 0:
+            self.tokens = float(self.burst)
+            return
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        if self.in_flight >= self.concurrency:
+            return False
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.in_flight += 1
+        return True
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters in priority order; re-arm a timer when rate limited."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                if self.in_flight < self.concurrency and self.rate_per_sec > 0:
+                    delay = (1 - self.tokens) / self.rate_per_sec
+                    self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    async def acquire(self, priority: str) -> None:
+        started = time.monotonic()
+        if not self._waiters and self._try_take():
+            self._record_wait(priority, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right before cancellation; give it back
+                self.release()
+            raise
+        self._record_wait(priority, time.monotonic() - started)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        self._dispatch()
+
+    def _record_wait(self, priority: str, waited: float) -> None:
+        self.wait_count[priority] += 1
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+        self.wait_samples[priority].append(waited)
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {p: 0 for p in PRIORITIES}
+        names = {v: k for k, v in PRIORITIES.items()}
+        for prio, _, future in self._waiters:
+            if not future.done():
+                depth[names[prio]] += 1
+        return depth
+
+    def stats(self) -> Dict[str, Any]:
+        waits = {}
+        for p in PRIORITIES:
+            count = self.wait_count[p]
+            samples = list(self.wait_samples[p])
+            waits[p] = {
+                "count": count,
+                "avg": (self.wait_total[p] / count) if count else 0.0,
+                "p95": _percentile(samples, 0.95),
+                "max": self.wait_max[p],
+            }
+        return {
+            "concurrency": self.concurrency,
+            "rate_per_minute": self.rate_per_sec * 60.0,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "queue_depth": self.queue_depth(),
+            "wait_seconds": waits,
+        }
+
+
+class LLMScheduler:
+    """Per-model lanes created on first use. Use `async with scheduler.slot(model, priority)`."""
+
+    def __init__(self,
+                 enabled: bool = LLM_SCHEDULER_ENABLED,
+                 default_concurrency: int = LLM_MAX_CONCURRENCY,
+                 default_rate_per_minute: float = LLM_RATE_PER_MINUTE,
+                 default_burst: int = LLM_RATE_BURST,
+                 model_limits: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.enabled = enabled
+        self.default_concurrency = default_concurrency
+        self.default_rate_per_minute = default_rate_per_minute
+        self.default_burst = default_burst
+        self.model_limits = model_limits if model_limits is not None else _load_model_limits(LLM_MODEL_LIMITS)
+        self._lanes: Dict[str, _ModelLane] = {}
+
+    def _lane(self, model_name: str) -> _ModelLane:
+        lane = self._lanes.get(model_name)
+        if lane is None:
+            limits = self.model_limits.get(model_name, {})
+            lane = _ModelLane(
+                model_name,
+                concurrency=int(limits.get("concurrency", self.default_concurrency)),
+                rate_per_minute=float(limits.get("rpm", self.default_rate_per_minute)),
+                burst=int(limits.get("burst", self.default_burst)),
+            )
+            self._lanes[model_name] = lane
+        return lane
+
+    def set_default_limits(self, model_name: str, **limits: Any) -> None:
+        """Default limits for one model (concurrency / rpm / burst) instead of the global ones.
+        Keys set in LLM_MODEL_LIMITS win; a lane that already exists keeps its limits."""
+        if model_name in self._lanes:
+            return
+        merged = dict(limits)
+        merged.update(self.model_limits.get(model_name, {}))
+        self.model_limits[model_name] = merged
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, priority: str = "normal"):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM call priority: {priority}")
+        if not self.enabled:
+            yield
+            return
+        lane = self._lane(model_name)
+        await lane.acquire(priority)
+        try:
+            yield
+        finally:
+            lane.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: lane.stats() for model, lane in self._lanes.items()}
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,278 @@
+"""
+Prometheus-style metrics, rendered in the text exposition format (GET /metrics).
+
+No client library is needed. Metrics are declared once at import time, and label children
+are created on first use and then cached by their label-value tuple. An update in the hot
+path is therefore a dict lookup plus a numeric add. Histograms also do a bisect over fixed
+bucket bounds. Values that existing components already count (caches, LLM scheduler, image
+client, active sessions) are read by collectors at scrape time, not updated per event.
+
+Usage:
+    LLM_CALL_SECONDS.labels(model, site).observe(elapsed)
+    registry.add_collector(lambda: [gauge_family("genui_active_sessions", "...", len(active_sessions))])
+"""
+
+from bisect import bisect_left
+import math
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers fast cache hits up to slow planning loops and image batches
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (labels, value) pairs of one metric family produced by a collector
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_text(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket (not cumulative); last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    type = ""
+    _child_class: Callable[..., Any] = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._default = None if self.labelnames else self._new_child()
+
+    def _new_child(self):
+        return self._child_class()
+
+    def labels(self, *values: Any):
+        """Child for the given label values (in labelnames order); cached after first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _items(self) -> Iterable[Tuple[Tuple[str, ...], Any]]:
+        if self._default is not None:
+            yield (), self._default
+        yield from list(self._children.items())
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} {self.type}")
+        for values, child in self._items():
+            out.append(f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}")
+
+
+class Counter(_Metric):
+    type = "counter"
+    _child_class = _CounterChild
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+    _child_class = _GaugeChild
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} histogram")
+        for values, child in self._items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                out.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            out.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            out.append(f"{self.name}_count{labels} {child.count}")
+
+
+class MetricFamily:
+    """Scrape-time metric produced by a collector."""
+
+    def __init__(self, name: str, metric_type: str, documentation: str, samples: Iterable[Sample]):
+        self.name = name
+        self.type = metric_type
+        self.documentation = documentation
+        self.samples = list(samples)
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} {self.type}")
+        for labels, value in self.samples:
+            out.append(f"{self.name}{_label_text(list(labels), list(labels.values()))} {_format_value(value)}")
+
+
+def gauge_family(name: str, documentation: str, value: Any = None, samples: Optional[Iterable[Sample]] = None) -> MetricFamily:
+    return MetricFamily(name, "gauge", documentation, samples if samples is not None else [({}, value or 0)])
+
+
+def counter_family(name: str, documentation: str, value: Any = None, samples: Optional[Iterable[Sample]] = None) -> MetricFamily:
+    return MetricFamily(name, "counter", documentation, samples if samples is not None else [({}, value or 0)])
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics.values():
+            metric.render(out)
+        for collector in self._collectors:
+            try:
+                for family in collector():
+                    family.render(out)
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        return "\n".join(out) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# ----- application metrics -----
+
+REQUEST_SECONDS = histogram(
+    "genui_request_duration_seconds", "End-to-end process() latency by outcome (ok|error|cancelled|demo)", ("outcome",))
+STAGE_SECONDS = histogram(
+    "genui_stage_duration_seconds", "Pipeline stage latency", ("stage",))
+STAGE_ERRORS = counter(
+    "genui_stage_errors_total", "Pipeline stages that raised", ("stage",))
+
+LLM_CALL_SECONDS = histogram(
+    "genui_llm_call_duration_seconds", "LLM call latency including scheduler queueing (cache hits excluded)",
+    ("model", "site"))
+LLM_CALLS = counter(
+    "genui_llm_calls_total", "LLM calls by outcome (ok|error|cache_hit)", ("model", "site", "outcome"))
+LLM_TOKENS = counter(
+    "genui_llm_tokens_total", "LLM tokens reported by the provider (direction: input|output)", ("model", "site", "direction"))
+
+MCP_TOOL_SECONDS = histogram(
+    "genui_mcp_tool_duration_seconds", "MCP tool call latency", ("server",))
+MCP_TOOL_CALLS = counter(
+    "genui_mcp_tool_calls_total", "MCP tool calls by outcome (ok|error|cache_hit)", ("server", "outcome"))
+
+SESSION_CANCELLATIONS = counter(
+    "genui_session_cancellations_total", "Running requests cancelled by a client disconnect", ("reason",))
+
+IMAGES_EMITTED = counter(
+    "genui_images_emitted_total", "Images injected into results (source: cache|generated)", ("delivery", "source"))
+IMAGE_BYTES_EMITTED = counter(
+    "genui_image_bytes_emitted_total", "Size of the image values injected into results", ("delivery",))
+
+
+def record_llm_usage(model: str, site: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    if input_tokens:
+        LLM_TOKENS.labels(model, site, "input").inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels(model, site, "output").inc(output_tokens)
+
+
+def render() -> str:
+    return registry.render()
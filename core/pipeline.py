@@ -0,0 +1,147 @@
+"""
+Small DAG executor for the request pipeline in main.process.
+
+Stages are zero-argument coroutine functions with named dependencies. Every stage
+starts as soon as its dependencies have finished, so independent work (MCP data
+collection, speculative layout classification, expression picks) overlaps.
+Each stage's start/end offsets are recorded so the critical path can be logged
+per request, and each stage runs in a `stage.<name>` span (core.tracing) and is
+observed in the genui_stage_duration_seconds histogram (core.metrics).
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .metrics import STAGE_ERRORS, STAGE_SECONDS
+from .tracing import tracer
+
+
+class PipelineStageSkipped(Exception):
+    """Recorded for a stage whose required dependency failed."""
+
+
+class _Stage:
+    def __init__(self, name: str, fn: Callable[[], Awaitable[Any]], deps: Tuple[str, ...], optional_deps: Tuple[str, ...]):
+        self.name = name
+        self.fn = fn
+        self.deps = deps + tuple(d for d in optional_deps if d not in deps)
+        self.required_deps = deps
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+
+class PipelineRun:
+    """One execution of a stage graph.
+
+    Usage:
+        run = PipelineRun("process")
+        run.add("collect", collect)
+        run.add("classify", classify, deps=("collect",))
+        await run.run()
+        run.results["classify"]
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self._stages: Dict[str, _Stage] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._origin: float = 0.0
+
+    def add(self, name: str,
+            fn: Callable[[], Awaitable[Any]],
+            deps: Tuple[str, ...] = (),
+            optional_deps: Tuple[str, ...] = ()) -> None:
+        """Register a stage. It waits for `deps` and `optional_deps`, but is skipped only
+        when one of `deps` failed; results of optional deps may be missing."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        self._stages[name] = _Stage(name, fn, tuple(deps), tuple(optional_deps))
+
+    def succeeded(self, name: str) -> bool:
+        return name in self.results and name not in self.errors
+
+    async def _run_stage(self, stage: _Stage) -> None:
+        for dep in stage.deps:
+            await asyncio.wait([self._tasks[dep]])
+        failed = [dep for dep in stage.required_deps if dep in self.errors]
+        if failed:
+            self.errors[stage.name] = PipelineStageSkipped(f"{stage.name} skipped: failed dependencies {failed}")
+            return
+        stage.started = time.perf_counter()
+        with tracer.span(f"stage.{stage.name}", {"pipeline.stage": stage.name}) as span:
+            try:
+                self.results[stage.name] = await stage.fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PIPELINE] Stage '{stage.name}' failed: {e}")
+                self.errors[stage.name] = e
+                span.set_error(str(e))
+                STAGE_ERRORS.labels(stage.name).inc()
+            finally:
+                stage.finished = time.perf_counter()
+                STAGE_SECONDS.labels(stage.name).observe(stage.finished - stage.started)
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages; cancelling the caller cancels every stage still in flight."""
+        for stage in self._stages.values():
+            unknown = [dep for dep in stage.deps if dep not in self._stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {unknown}")
+        self._origin = time.perf_counter()
+        for name, stage in self._stages.items():
+            self._tasks[name] = asyncio.create_task(self._run_stage(stage), name=f"{self.name}:{name}")
+        try:
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            pending = [t for t in self._tasks.values() if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return self.results
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage offsets (seconds from pipeline start) and durations for stages that ran."""
+        out: Dict[str, Dict[str, float]] = {}
+        for name, stage in self._stages.items():
+            if stage.started is None or stage.finished is None:
+                continue
+            out[name] = {
+                "start": stage.started - self._origin,
+                "end": stage.finished - self._origin,
+                "duration": stage.finished - stage.started,
+            }
+        return out
+
+    def critical_path(self) -> List[str]:
+        """Walk back from the last stage to finish through the dependency that finished last."""
+        timings = self.timings()
+        if not timings:
+            return []
+        current = max(timings, key=lambda n: timings[n]["end"])
+        path = [current]
+        while True:
+            deps = [d for d in self._stages[current].deps if d in timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda n: timings[n]["end"])
+            path.append(current)
+        return list(reversed(path))
+
+    def log_timings(self) -> None:
+        timings = self.timings()
+        if not timings:
+            return
+        rows = sorted(timings.items(), key=lambda kv: kv[1]["start"])
+        total = max(t["end"] for t in timings.values())
+        logger.info(
+            f"[PIPELINE] {self.name} finished in {total:.2f}s; stages: "
+            + ", ".join(f"{n} {t['duration']:.2f}s ({t['start']:.2f}→{t['end']:.2f})" for n, t in rows)
+        )
+        logger.info(f"[PIPELINE] {self.name} critical path: {' → '.join(self.critical_path())}")
@@ -0,0 +1,91 @@
+"""
+Result delivery to the Socket.IO client, per result protocol version.
+
+Protocol 1 (default, existing clients):
+    'standby' -> 'result' {slot: {data, html}, ...}   (one event, images already injected)
+
+Protocol 2 (progressive, the client sends `protocolVersion: 2` with the query):
+    'standby'
+    'result_slot'  {"slot", "data", "html"}                 once per slot, as soon as mapping is ready
+    'image_patch'  {"slot", "path", "path_str", "url"}      once per image, as it arrives
+                   (path is relative to the slot's data, e.g. ["items", 0, "img"]; with
+                   IMAGE_DELIVERY=binary the image bytes are sent as "image" instead of "url")
+    'result'       {"complete": true, "protocolVersion": 2, "slots": [...]}
+
+Errors are reported the same way in both versions ('result' with an "error: ..." string).
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List
+
+from loguru import logger
+
+RESULT_PROTOCOL_V1 = 1
+RESULT_PROTOCOL_PROGRESSIVE = 2
+SUPPORTED_RESULT_PROTOCOLS = (RESULT_PROTOCOL_V1, RESULT_PROTOCOL_PROGRESSIVE)
+
+
+def parse_protocol_version(value: Any) -> int:
+    """Client-sent protocol version; anything missing or unsupported means protocol 1."""
+    if value is None or value == "":
+        return RESULT_PROTOCOL_V1
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        version = None
+    if version not in SUPPORTED_RESULT_PROTOCOLS:
+        logger.warning(f"Unsupported result protocol version {value!r}; using {RESULT_PROTOCOL_V1}")
+        return RESULT_PROTOCOL_V1
+    return version
+
+
+class ResultStream:
+    """Sends one request's result to one client.
+
+    emit(event, payload) sends a Socket.IO event to the requesting client.
+    """
+
+    def __init__(self, emit: Callable[[str, Any], Awaitable[None]], protocol_version: int = RESULT_PROTOCOL_V1):
+        self._emit = emit
+        self.protocol_version = protocol_version
+        self._standby_sent = False
+        self._sent_slots: List[str] = []
+
+    @property
+    def progressive(self) -> bool:
+        return self.protocol_version == RESULT_PROTOCOL_PROGRESSIVE
+
+    async def _standby(self) -> None:
+        if not self._standby_sent:
+            self._standby_sent = True
+            await self._emit('standby', 'standby')
+
+    async def slot(self, slot: str, payload: Dict[str, Any]) -> None:
+        """Send a slot's {data, html} (protocol 2 only; each slot is sent once)."""
+        if not self.progressive or slot in self._sent_slots:
+            return
+        await self._standby()
+        self._sent_slots.append(slot)
+        await self._emit('result_slot', {"slot": slot, "data": payload.get("data"), "html": payload.get("html")})
+
+    async def image(self, slot: str, path: List[Any], path_str: str, image: Any) -> None:
+        """Send one generated image (URL string or bytes) for a slot that was already sent (protocol 2 only)."""
+        if not self.progressive or slot not in self._sent_slots:
+            return
+        key = "image" if isinstance(image, (bytes, bytearray)) else "url"
+        await self._emit('image_patch', {"slot": slot, "path": list(path), "path_str": path_str, key: image})
+
+    async def finish(self, final_result: Dict[str, Any]) -> None:
+        """Complete the response: the whole result (protocol 1), or any slots not sent yet
+        followed by the completion marker (protocol 2)."""
+        await self._standby()
+        if not self.progressive:
+            await self._emit('result', final_result)
+            return
+        for slot, payload in (final_result or {}).items():
+            if isinstance(payload, dict):
+                await self.slot(slot, payload)
+        await self._emit('result', {
+            "complete": True,
+            "protocolVersion": self.protocol_version,
+            "slots": list(self._sent_slots),
+        })
@@ -0,0 +1,279 @@
+"""
+Lightweight span tracer for the request pipeline.
+
+Spans nest through a contextvar, so a span opened in a coroutine becomes the parent of
+spans opened in tasks created inside it (asyncio copies the context on task creation).
+Span ids and fields follow the OpenTelemetry data model (32-hex trace id, 16-hex span id,
+unix-nano timestamps, OK/ERROR status); attribute names use the OTel semantic conventions
+where one exists (gen_ai.*). No exporter is required:
+  - every finished span goes to an in-process ring buffer (TRACE_BUFFER_SIZE spans),
+    queryable per trace / sid / clientId (GET /debug/traces)
+  - with TRACE_FILE set, spans are also appended to that file as JSON lines
+
+The sampling decision (TRACE_SAMPLE_RATE) is made once per root span; children of an
+unsampled root are no-ops. Correlation attributes of the root (session.sid, client.id)
+are copied onto every span of the trace.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Fraction of root spans (requests) that are recorded
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+# JSONL export path; empty disables the file exporter
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Attributes inherited from the parent span
+CORRELATION_KEYS = ("session.sid", "client.id")
+
+STATUS_UNSET = "STATUS_CODE_UNSET"
+STATUS_OK = "STATUS_CODE_OK"
+STATUS_ERROR = "STATUS_CODE_ERROR"
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "attributes",
+                 "start_ns", "end_ns", "status", "status_message", "_started")
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def set_error(self, message: str) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": self.duration_ms,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled traces (and when tracing is disabled)."""
+
+    sampled = False
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans and keeps the most recent finished ones (one per process)."""
+
+    def __init__(self,
+                 enabled: bool = TRACE_ENABLED,
+                 sample_rate: float = TRACE_SAMPLE_RATE,
+                 buffer_size: int = TRACE_BUFFER_SIZE,
+                 file_path: str = TRACE_FILE):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        # Own generator: in-process MCP servers reseed the global random module
+        self._rng = random.Random()
+        self.file_path = file_path
+        self._buffer: "deque[Span]" = deque(maxlen=max(1, buffer_size))
+        self._lock = threading.Lock()
+        self._file = None
+        self.started = 0
+        self.finished = 0
+        self.dropped = 0
+
+    # ----- span lifecycle -----
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Open a child of the current span (or a new sampled/unsampled root).
+
+        Usage:
+            with tracer.span("llm.call", {"gen_ai.request.model": model}) as span:
+                ...
+                span.set_attribute("llm.cache_hit", True)
+        An exception leaving the block marks the span as an error and is re-raised.
+        """
+        parent = _current_span.get()
+        if not self.enabled or (parent is not None and not parent.sampled):
+            yield NOOP_SPAN
+            return
+        if parent is None:
+            if self.sample_rate < 1.0 and self._rng.random() >= self.sample_rate:
+                self.dropped += 1
+                token = _current_span.set(NOOP_SPAN)
+                try:
+                    yield NOOP_SPAN
+                finally:
+                    _current_span.reset(token)
+                return
+            trace_id, parent_id, inherited = os.urandom(16).hex(), None, {}
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+            inherited = {k: parent.attributes[k] for k in CORRELATION_KEYS if k in parent.attributes}
+        if attributes:
+            inherited.update(attributes)
+        span = Span(name, trace_id, parent_id, inherited)
+        self.started += 1
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(type(e).__name__ if not str(e) else f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def current_span(self) -> Any:
+        return _current_span.get() or NOOP_SPAN
+
+    def _finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if span.status == STATUS_UNSET:
+            span.status = STATUS_OK
+        self.finished += 1
+        with self._lock:
+            self._buffer.append(span)
+            if self.file_path:
+                self._export(span, flush=span.parent_span_id is None)
+
+    def _export(self, span: Span, flush: bool) -> None:
+        try:
+            if self._file is None:
+                directory = os.path.dirname(self.file_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.file_path, "a", encoding="utf-8")
+            self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            if flush:
+                self._file.flush()
+        except OSError as e:
+            logger.warning(f"Trace export to {self.file_path} failed, disabling file export: {e}")
+            self.file_path = ""
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ----- queries -----
+
+    def spans(self, trace_id: Optional[str] = None, sid: Optional[str] = None,
+              client_id: Optional[str] = None, name: Optional[str] = None) -> List[Span]:
+        """Buffered spans (oldest first) matching every given filter."""
+        with self._lock:
+            spans = list(self._buffer)
+        return [
+            s for s in spans
+            if (trace_id is None or s.trace_id == trace_id)
+            and (sid is None or s.attributes.get("session.sid") == sid)
+            and (client_id is None or s.attributes.get("client.id") == client_id)
+            and (name is None or s.name == name)
+        ]
+
+    def traces(self, limit: int = 20, sid: Optional[str] = None, client_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent traces first, each with its spans ordered by start time."""
+        by_trace: Dict[str, List[Span]] = {}
+        for span in self.spans(sid=sid, client_id=client_id):
+            by_trace.setdefault(span.trace_id, []).append(span)
+        out = []
+        for trace_id, spans in by_trace.items():
+            spans.sort(key=lambda s: s.start_ns)
+            root = next((s for s in spans if s.parent_span_id is None), None)
+            out.append({
+                "traceId": trace_id,
+                "root": root.name if root else None,
+                "startTimeUnixNano": spans[0].start_ns,
+                "durationMs": root.duration_ms if root else None,
+                "attributes": {k: spans[0].attributes[k] for k in CORRELATION_KEYS if k in spans[0].attributes},
+                "spans": [s.to_dict() for s in spans],
+            })
+        out.sort(key=lambda t: t["startTimeUnixNano"], reverse=True)
+        return out[:max(0, limit)]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per span name over the buffer: count, errors and duration percentiles (ms)."""
+        durations: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        for span in self.spans():
+            durations.setdefault(span.name, []).append(span.duration_ms or 0.0)
+            if span.status == STATUS_ERROR:
+                errors[span.name] = errors.get(span.name, 0) + 1
+        out = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            out[name] = {
+                "count": len(values),
+                "errors": errors.get(name, 0),
+                "p50_ms": values[(len(values) - 1) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1],
+            }
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "file": self.file_path or None,
+            "buffered": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "started": self.started,
+            "finished": self.finished,
+            "unsampled_roots": self.dropped,
+        }
+
+
+tracer = Tracer()
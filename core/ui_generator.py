@@ -164,7 +164,7 @@ async def generate_ui_code_step(intent: str, context: dict, user_data: str, ui_r
     # prompt = prompt.replace("||UI_Requirement||", ui_requirements)
     
     logger.info(f"Calling LLM for UI code generation with model: {model_name}")
-    raw_code = await call_llm(prompt, model_name=model_name)
+    raw_code = await call_llm(prompt, model_name=model_name, site="ui_generation")
     logger.info("LLM call for UI code generation finished.")
     
     cleaned_code = _clean_llm_output(raw_code)
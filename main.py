@@ -1,27 +1,46 @@
 import asyncio
+import base64
 from contextlib import asynccontextmanager
 from datetime import datetime
 import hashlib
 import json
 import logging
+import os
 import random
 import signal
 import sys
 import time
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-import httpx
 from loguru import logger
 from pydantic import BaseModel, Field
 import socketio
 
 from core.data_mapper import DataMapper
+from core.image_blobs import BLOB_ROUTE_PREFIX, IMAGE_DELIVERY, deliver_image, image_blobs, is_delivered_image
+from core.image_cache import IMAGE_CACHE_ENABLED, image_cache, make_image_key
+from core.image_client import image_client
+from core.image_sizing import IMAGE_DEVICE_PIXEL_RATIO, output_variant, postprocess_enabled, postprocess_image, request_size
 from core.layout_classifier import LayoutClassifier
-from core.llm import call_llm
+from core.llm import call_llm, close_llm_clients, get_llm_cache
+from core.llm_scheduler import llm_scheduler
+from core.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, IMAGE_BYTES_EMITTED, IMAGES_EMITTED, METRICS_ENABLED, REQUEST_SECONDS,
+    SESSION_CANCELLATIONS, counter_family, gauge_family, registry as metrics_registry
+)
+from core.pipeline import PipelineRun
+from core.result_stream import RESULT_PROTOCOL_V1, ResultStream, parse_protocol_version
+from core.tracing import tracer
 from mcp_clients import MCPGenUIService, MCPUserService
 
 
+# Start middle-layout classification from intent/context while MCP data is still being collected
+PIPELINE_SPECULATIVE_CLASSIFY = os.getenv("PIPELINE_SPECULATIVE_CLASSIFY", "true").lower() in ("1", "true", "yes")
+IMAGE_SERVICE_URL = os.getenv("IMAGE_SERVICE_URL", "http://0.0.0.0:8000/generate")
+# Own generator for p1 / fixed-layout picks: in-process MCP servers reseed the global random module
+_rng = random.Random()
+
 # Preload agent expression texts
 AGENT_EXPRESSIONS: dict[str, list[str]] = {}
 
@@ -81,6 +100,10 @@ class UserRequest(BaseModel):
         description="User's intent or query"
     )
     context: dict = {}
+    protocol_version: int = Field(
+        default=RESULT_PROTOCOL_V1,
+        description="Result protocol: 1 = single result event, 2 = progressive slots and image patches"
+    )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -104,6 +127,8 @@ async def lifespan(app: FastAPI):
                 logger.info(f"  - sample middle ids: {mids}")
         except Exception as e:
             logger.warning(f"Failed to log layout preload summary: {e}")
+        # Hot-reload edited layouts without a restart
+        layout_classifier.start_watching()
 
         # Initialize MCP User Service
         await mcp_user_service.initialize()
@@ -122,6 +147,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Socket.IO MCP Host application...")
+    await layout_classifier.stop_watching()
     try:
         await mcp_user_service.cleanup()
         logger.info("MCP User Service cleanup completed successfully")
@@ -135,6 +161,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during MCP GenUI Service cleanup: {str(e)}")
     
+    # Release pooled LLM provider clients
+    try:
+        await close_llm_clients()
+        logger.info("LLM clients closed successfully")
+    except Exception as e:
+        logger.error(f"Error closing LLM clients: {str(e)}")
+
+    # Release the pooled image service client
+    try:
+        await image_client.aclose()
+    except Exception as e:
+        logger.error(f"Error closing image client: {str(e)}")
+    tracer.close()
+    
     logger.info("Application shutdown completed")
 
 # FastAPI app with lifespan management
@@ -182,6 +222,9 @@ def _register_client_mapping(sid: str, client_id: str | None):
         session["client_id"] = client_id
         active_sessions[sid] = session
 
+# Cancellation reasons used as metric labels (client-reported reasons are free text)
+_CANCEL_REASONS = ("socketio_disconnect", "client_disconnected")
+
 async def cancel_session_by_sid(sid: str, reason: str = "", duration_ms: int | None = None):
     session = active_sessions.pop(sid, None)
     if not session:
@@ -195,6 +238,7 @@ async def cancel_session_by_sid(sid: str, reason: str = "", duration_ms: int | N
             client_to_sid_map.pop(client_id, None)
     try:
         if task and not task.done():
+            SESSION_CANCELLATIONS.labels(reason if reason in _CANCEL_REASONS else "other").inc()
             task.cancel()
             try:
                 await task
@@ -221,97 +265,6 @@ def _parse_chunk_data(chunk: str):
         return None
 
 
-def _is_image_tool(schema_node: dict) -> bool:
-    try:
-        val = str((schema_node or {}).get("tool_type", "")).strip().lower()
-        return val in ("image_search", "img_search")
-    except Exception:
-        return False
-
-
-def find_image_tool_paths_by_schema_and_data(schema: dict, data):
-    """스키마의 tool_type: image_search(or img_search) 표기를 기준으로 실제 데이터에서 경로를 수집한다.
-
-    - 스키마의 비표준 구조(parameters에서 object/array를 혼용)와 표준 스타일(properties/items)을 모두 지원한다.
-    - 배열은 실제 매핑된 데이터의 인덱스로 확장한다.
-    반환: path 리스트 (예: [["thumbnail_list", 0, "thumbnail_img"], ...])
-    """
-    paths = []
-
-    META_KEYS = {
-        "description", "type", "example", "examples", "max", "max_words", "file",
-        "html", "layout", "name", "contents_type", "oneOf", "items", "data",
-        "default", "tool_type"
-    }
-
-    def _walk(sch, dat, cur_path):
-        if not isinstance(sch, dict):
-            return
-
-        sch_type = sch.get("type")
-
-        # 배열 노드 자체가 이미지 툴이면 실제 데이터의 인덱스로 확장하여 경로를 수집한다.
-        if sch_type == "array" and _is_image_tool(sch):
-            if isinstance(dat, list) and len(dat) > 0:
-                for idx in range(len(dat)):
-                    paths.append(cur_path + [idx])
-            else:
-                # 데이터가 비어있으면 최소 1개를 대상으로 가정
-                paths.append(cur_path + [0])
-            return
-
-        # 비-배열 노드가 이미지 툴이면 현재 경로를 그대로 추가
-        if _is_image_tool(sch):
-            paths.append(list(cur_path))
-            return
-
-        # 배열: 비표준(data) 우선 지원, 표준(items)도 지원
-        if sch_type == "array":
-            # 우선 data 필드 (비표준) 처리
-            if isinstance(sch.get("data"), dict) and isinstance(dat, list):
-                item_schema = sch["data"]
-                for idx, item in enumerate(dat):
-                    _walk(item_schema, item, cur_path + [idx])
-                return
-
-            # 표준 items 처리
-            items = sch.get("items")
-            if isinstance(items, dict) and isinstance(dat, list):
-                # items 자체가 이미지 툴일 수 있음 (배열 원소가 바로 string 이미지 등)
-                if _is_image_tool(items):
-                    for idx in range(len(dat)):
-                        paths.append(cur_path + [idx])
-                    return
-
-                item_type = items.get("type")
-                if item_type == "object" and isinstance(items.get("properties"), dict):
-                    props = items["properties"]
-                    for idx, item in enumerate(dat):
-                        if isinstance(item, dict):
-                            for k, prop_sch in props.items():
-                                _walk(prop_sch, item.get(k), cur_path + [idx, k])
-                    return
-
-                # 기타 단순 타입(string 등)에는 별도 처리 없음
-                return
-
-        # 객체: 표준(properties) 우선, 없으면 parameters 스타일(비표준)로 필드 키 순회
-        if sch.get("properties") and isinstance(sch.get("properties"), dict) and isinstance(dat, dict):
-            for k, sub_sch in sch["properties"].items():
-                _walk(sub_sch, (dat or {}).get(k), cur_path + [k])
-            return
-
-        # parameters 스타일: 데이터의 키와 교집합으로 탐색 (메타키 제외)
-        if isinstance(dat, dict):
-            for k, sub_sch in sch.items():
-                if k in META_KEYS:
-                    continue
-                _walk(sub_sch, dat.get(k), cur_path + [k])
-
-    _walk(schema or {}, data, [])
-    return paths
-
-
 def _path_to_str(path):
     parts = []
     for p in path:
@@ -350,8 +303,14 @@ def build_image_generation_requests_for_paths(img_paths_by_slot: dict,
                                               default_width: int = 128,
                                               default_height: int = 128,
                                               model: str = "dalle",
-                                              prompts_by_key: dict | None = None):
-    """경로 기준으로 이미지 요청 배열과 인덱스 매핑을 생성한다."""
+                                              prompts_by_key: dict | None = None,
+                                              render_sizes: dict | None = None,
+                                              device_pixel_ratio: float = IMAGE_DEVICE_PIXEL_RATIO):
+    """경로 기준으로 이미지 요청 배열과 인덱스 매핑을 생성한다.
+
+    render_sizes: {"slot|path_str": (width, height)} 레이아웃 스키마의 render_size 힌트(CSS px).
+    힌트가 있으면 device_pixel_ratio 배수로 요청하고(기본 크기 상한), 없으면 기본 크기로 요청한다.
+    """
     requests = []
     index_map = []  # (slot, path)
     prompt_base = str((context or {}).get("image_prompt") or intent or "image")
@@ -362,16 +321,27 @@ def build_image_generation_requests_for_paths(img_paths_by_slot: dict,
             path_str = _path_to_str(path)
             key = f"{slot}|{path_str}"
             prompt = (prompts_by_key or {}).get(key) or prompt_base
+            width, height = request_size((render_sizes or {}).get(key), default_width, default_height, device_pixel_ratio)
             requests.append({
                 "prompt": f"{prompt}, {intent}",
-                "width": int(default_width),
-                "height": int(default_height),
+                "width": width,
+                "height": height,
                 "model": model
             })
             index_map.append((slot, path))
     return requests, index_map
 
 
+def _device_pixel_ratio(context: dict) -> float:
+    """클라이언트가 context에 device_pixel_ratio(또는 devicePixelRatio)를 보내면 사용, 없으면 IMAGE_DEVICE_PIXEL_RATIO."""
+    value = (context or {}).get("device_pixel_ratio", (context or {}).get("devicePixelRatio"))
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return IMAGE_DEVICE_PIXEL_RATIO
+    return min(value, 4.0) if value > 0 else IMAGE_DEVICE_PIXEL_RATIO
+
+
 def _json(v):
     import json as _json
     return _json.dumps(v, ensure_ascii=False, indent=2)
@@ -410,6 +380,14 @@ async def choose_expression(data: str,
       1) LLM에 선택을 요청하여 index를 받는다.
       2) 실패 시 intent+context의 해시를 이용한 안정적(deteministic) 선택.
     """
+    with tracer.span("expression.pick", {
+        "gen_ai.request.model": model_name,
+        "expression.candidates": len(candidates) if isinstance(candidates, list) else 0,
+    }) as span:
+        return await _choose_expression(data, candidates, model_name, span)
+
+
+async def _choose_expression(data: str, candidates: list[str], model_name: str, span) -> str:
     try:
         if not isinstance(candidates, list) or len(candidates) == 0:
             return "Okay, I'm now working on your request."
@@ -424,20 +402,23 @@ async def choose_expression(data: str,
                 "Return strictly JSON with the shape: {\"index\": number}. No extra text.\n\n"
                 f"Reference data:\n{data}\n\nCandidates (array of objects [index, text]):\n{json.dumps(items, ensure_ascii=False)}\n"
             )
-            resp = await call_llm(prompt, model_name=model_name)
+            resp = await call_llm(prompt, model_name=model_name, site="expression")
             parsed = _parse_json_loose(resp or "{}")
             if isinstance(parsed, dict):
                 idx = parsed.get("index")
                 if isinstance(idx, int) and 0 <= idx < len(candidates):
+                    span.set_attribute("expression.source", "llm")
                     return candidates[idx]
         except Exception as e:
             logger.debug(f"LLM-based p1 selection failed, will fallback: {e}")
-            return random.choice(candidates)
+            span.set_attribute("expression.source", "random")
+            return _rng.choice(candidates)
 
         # 2) 해시 기반 안정적 선택 (파이썬 내장 hash는 세션마다 달라질 수 있어 md5 사용)
         digest = hashlib.md5(data.encode("utf-8")).hexdigest()
         # 첫 8자리 16진수를 정수로 변환하여 모듈러
         idx = int(digest[:8], 16) % len(candidates)
+        span.set_attribute("expression.source", "hash")
         return candidates[idx]
     except Exception as e:
         logger.warning(f"choose_expression unexpected error: {e}")
@@ -494,19 +475,22 @@ async def suggest_image_prompts_by_path(intent: str,
         f"Intent:\n{intent}\n\nContext:\n{_json(context)}\n\nTargets:\n{_json(targets)}\n"
     )
 
-    try:
-        response_text = await call_llm(prompt, model_name=model_name)
-        parsed = _parse_json_loose(response_text or "{}")
-        if not isinstance(parsed, dict):
-            parsed = {}
-        # 키 형식 정규화 확인 및 로그
-        bad_keys = [k for k in parsed.keys() if not isinstance(k, str) or "|" not in k]
-        if bad_keys:
-            logger.warning(f"LLM prompt map has unexpected keys: {bad_keys}")
-        return parsed
-    except Exception as e:
-        logger.warning(f"suggest_image_prompts_by_path failed: {e}")
-        return {}
+    with tracer.span("images.prompts", {"gen_ai.request.model": model_name, "images.targets": len(targets)}) as span:
+        try:
+            response_text = await call_llm(prompt, model_name=model_name, priority="critical", site="image_prompts")
+            parsed = _parse_json_loose(response_text or "{}")
+            if not isinstance(parsed, dict):
+                parsed = {}
+            # 키 형식 정규화 확인 및 로그
+            bad_keys = [k for k in parsed.keys() if not isinstance(k, str) or "|" not in k]
+            if bad_keys:
+                logger.warning(f"LLM prompt map has unexpected keys: {bad_keys}")
+            span.set_attributes({"images.prompts": len(parsed), "images.bad_keys": len(bad_keys)})
+            return parsed
+        except Exception as e:
+            logger.warning(f"suggest_image_prompts_by_path failed: {e}")
+            span.set_error(str(e))
+            return {}
 
 
 def validate_and_fix_bottom_structure(final_result: dict) -> dict:
@@ -643,7 +627,7 @@ if __name__ == "__main__" and False:  # False로 설정하여 실제 서버 실
 
 
 def validate_image_injection(final_result: dict, paths_by_slot: dict, prefix: str = ""):
-    """치환 검증: 각 경로 위치에 data:image/png;base64, 형태가 제대로 들어갔는지 로그 출력."""
+    """치환 검증: 각 경로 위치에 이미지(IMAGE_DELIVERY 형식: data URI, blob URL 또는 bytes)가 제대로 들어갔는지 로그 출력."""
     total_targets = 0
     total_filled = 0
     for slot, paths in (paths_by_slot or {}).items():
@@ -658,10 +642,10 @@ def validate_image_injection(final_result: dict, paths_by_slot: dict, prefix: st
                 if is_last:
                     if isinstance(cur, dict) and isinstance(p, str):
                         val = cur.get(p)
-                        ok = isinstance(val, str) and val.startswith("data:image/")
+                        ok = is_delivered_image(val)
                     elif isinstance(cur, list) and isinstance(p, int) and 0 <= p < len(cur):
                         val = cur[p]
-                        ok = isinstance(val, str) and val.startswith("data:image/")
+                        ok = is_delivered_image(val)
                 else:
                     if isinstance(cur, dict) and isinstance(p, str):
                         cur = cur.get(p)
@@ -677,36 +661,107 @@ def validate_image_injection(final_result: dict, paths_by_slot: dict, prefix: st
     logger.info(f"Image injection total summary: {total_filled}/{total_targets} filled")
 
 
-async def call_image_service(service_url: str, requests_payload: list) -> list:
+async def call_image_service(service_url: str, requests_payload: list, on_image=None) -> list:
     """
-        이미지 생성 서버를 호출하여 결과 리스트를 반환한다.
+        이미지 생성 서버를 호출하여 결과 리스트를 반환한다. (IMAGE_DELIVERY 형식: data URI, blob URL 또는 bytes)
+        같은 (prompt, width, height, model) 요청은 배치 내에서 한 번만 보내고, 디스크 이미지 캐시에 있는
+        이미지는 요청하지 않는다. 나머지는 core.image_client로 청크 단위 스트리밍 생성(이미지별 재시도)하며,
+        on_image(index, url)가 있으면 이미지가 준비되는 즉시 호출한다. 끝내 실패한 이미지 자리는 None.
     """
     if not requests_payload:
         return []
 
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(service_url, json={"requests": requests_payload})
-            resp.raise_for_status()
-            data = resp.json()
-            return [f'data:image/png;base64,{d["image_data"]}' for d in data.get("images")]
-    except Exception as e:
-        logger.error(f"Image generation service call failed: {e}")
-        return []
+    with tracer.span("images.generate", {"images.requests": len(requests_payload)}) as span:
+        return await _call_image_service(service_url, requests_payload, on_image, span)
+
+
+async def _call_image_service(service_url: str, requests_payload: list, on_image, span) -> list:
+    variant = output_variant()
+    keys = [make_image_key(req, variant) for req in requests_payload]
+    indices_by_key = {}
+    for idx, key in enumerate(keys):
+        indices_by_key.setdefault(key, []).append(idx)
+    image_cache.deduplicated += len(keys) - len(indices_by_key)
+    delivered = [None] * len(keys)
+
+    async def _deliver(key: str, image, source: str):
+        value = deliver_image(image)
+        images_emitted, bytes_emitted = IMAGES_EMITTED.labels(IMAGE_DELIVERY, source), IMAGE_BYTES_EMITTED.labels(IMAGE_DELIVERY)
+        for idx in indices_by_key[key]:
+            delivered[idx] = value
+            images_emitted.inc()
+            bytes_emitted.inc(len(value))
+            if on_image is not None:
+                await on_image(idx, value)
+
+    cached = await image_cache.get_many(list(indices_by_key)) if IMAGE_CACHE_ENABLED else {}
+    for key, image in cached.items():
+        await _deliver(key, image, "cache")
+    missing = [key for key in indices_by_key if key not in cached]
+
+    if missing:
+        missing_requests = [requests_payload[indices_by_key[key][0]] for key in missing]
+
+        async def _on_generated(i: int, image_b64: str):
+            key, req = missing[i], missing_requests[i]
+            image = image_b64
+            if postprocess_enabled():
+                # 요청 크기로 축소 / WebP·JPEG 재인코딩 (Pillow 설치 시)
+                image = await asyncio.to_thread(postprocess_image, base64.b64decode(image_b64), req["width"], req["height"])
+            if IMAGE_CACHE_ENABLED:
+                await image_cache.set_many({key: image})
+            await _deliver(key, image, "generated")
+
+        await image_client.generate(service_url, missing_requests, on_image=_on_generated)
+
+    failed = sum(v is None for v in delivered)
+    logger.info(
+        f"Image requests: {len(keys)} total, {len(keys) - len(indices_by_key)} duplicate, "
+        f"{len(cached)} cached, {len(missing)} generated, {failed} failed"
+    )
+    span.set_attributes({
+        "images.duplicate": len(keys) - len(indices_by_key),
+        "images.cached": len(cached),
+        "images.generated": len(missing),
+        "images.failed": failed,
+    })
+    return delivered
 
 
 async def process(user_request: UserRequest, sid: str):
-    """Process user request through new 3-step workflow with Socket.IO updates"""
-    
+    """Process user request through new 3-step workflow with Socket.IO updates (traced as one `process` span)"""
+    client_id = (active_sessions.get(sid) or {}).get("client_id")
+    started = time.perf_counter()
+    outcome = "cancelled"
+    try:
+        with tracer.span("process", {
+            "session.sid": sid,
+            "client.id": client_id,
+            "request.intent_chars": len(user_request.intent),
+            "result.protocol_version": user_request.protocol_version,
+        }):
+            outcome = await _process(user_request, sid)
+    finally:
+        REQUEST_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+
+async def _process(user_request: UserRequest, sid: str) -> str:
+    """process() 본문. 결과 구분(ok | error | demo)을 반환한다."""
     try:
         async def on_update(msg: str):
             try:
                 await sio.emit('update', msg, room=sid)
             except Exception as _:
                 pass
+
+        async def emit_result(event: str, payload):
+            await sio.emit(event, payload, room=sid)
+
+        stream = ResultStream(emit_result, user_request.protocol_version)
             
             
-        request = user_request.model_dump()
+        # The result protocol only shapes delivery; keep it out of prompts and LLM cache keys
+        request = user_request.model_dump(exclude={"protocol_version"})
         logger.info(f"User Request: {request}")
         
         test1_intent = [
@@ -727,9 +782,8 @@ async def process(user_request: UserRequest, sid: str):
             
             await on_update("I’m finding<br>what you need<br>for shopping")
             await on_update("Searching notes<br>for market list<br>in Notes")
-            await sio.emit('standby', 'standby', room=sid)
-            await sio.emit('result', demo1, room=sid)
-            return
+            await stream.finish(demo1)
+            return "demo"
         
         list_of_intent = [
             'recommend a snack for the movie night',
@@ -754,122 +808,176 @@ async def process(user_request: UserRequest, sid: str):
                 
             await on_update("Checking<br>today’s steps<br>in Samsung Health")
             await on_update("I'm reviewing<br>your past snack<br>purchase history")
-            await sio.emit('standby', 'standby', room=sid)
-            await sio.emit('result', demo1, room=sid)
-            return
-        
-        if 1 == random.randint(1,5):
-            await on_update("Thinking about<br>how I can<br>help best.")
-        else:
-            selected_p1 = await choose_expression(
-                    data=user_request.model_dump_json(),
-                    candidates=AGENT_EXPRESSIONS.get("p1") or [],
-                    model_name='gpt-4.1-nano'
-                )
-            await on_update(selected_p1)
+            await stream.finish(demo1)
+            return "demo"
         
+        pipeline = PipelineRun(f"process:{sid}")
+        p1_announced = asyncio.Event()
+
+        async def on_collect_update(msg: str):
+            # Keep the p1 greeting ahead of tool progress messages
+            await p1_announced.wait()
+            await on_update(msg)
+
+        async def announce_p1():
+            try:
+                if 1 == _rng.randint(1,5):
+                    await on_update("Thinking about<br>how I can<br>help best.")
+                else:
+                    selected_p1 = await choose_expression(
+                            data=user_request.model_dump_json(exclude={"protocol_version"}),
+                            candidates=AGENT_EXPRESSIONS.get("p1") or [],
+                            model_name='gpt-4.1-nano'
+                        )
+                    await on_update(selected_p1)
+            finally:
+                p1_announced.set()
+
         # Step 1: MCP Data Collection
-        user_data = await mcp_user_service.process_request(
-                request,
-                # model='claude-opus-4-20250514',
-                model='claude-3-5-haiku-20241022',
-                on_update=on_update,    
-                multi_agent_expression=AGENT_EXPRESSIONS
-        )
-        
-        
-        # Before UI Code Generation
-        candidates = (AGENT_EXPRESSIONS.get("p4") or []) + (AGENT_EXPRESSIONS.get("p5") or [])
-        selected_p45 = await choose_expression(
-                data=user_request.intent,
-                candidates=candidates,
-                model_name='gpt-4.1-mini'
+        async def collect_user_data():
+            return await mcp_user_service.process_request(
+                    request,
+                    # model='claude-opus-4-20250514',
+                    model='claude-3-5-haiku-20241022',
+                    on_update=on_collect_update,
+                    multi_agent_expression=AGENT_EXPRESSIONS
             )
-        await on_update(selected_p45)
-        
-        # Add fixed layouts first (top, button) - bottom is now classified via LLM
-        layout_result = {}
-        for layout_type in ["top", "button", "bottom"]:
-            fixed_layout_list = layout_classifier.fixed_layouts.get(layout_type)
-            if fixed_layout_list:
-                fixed_layout = random.choice(fixed_layout_list)
-                layout_result[layout_type] = {
-                    "id": fixed_layout["id"],
-                    "name": fixed_layout["name"],
-                    "layout_data": fixed_layout["layout_data"]
-                }
-        try:
-            # Step 2: Layout Classification
+
+        # Before UI Code Generation: pick while collecting, announce once data is in
+        async def pick_p45():
+            candidates = (AGENT_EXPRESSIONS.get("p4") or []) + (AGENT_EXPRESSIONS.get("p5") or [])
+            return await choose_expression(
+                    data=user_request.intent,
+                    candidates=candidates,
+                    model_name='gpt-4.1-mini'
+                )
+
+        async def announce_p45():
+            await on_update(pipeline.results["p45"])
+
+        # Step 2: Layout Classification
+        async def classify_middle(user_data_text: str):
             # Classify by content types order
-            selected_list = await layout_classifier.classify_layouts(
+            return await layout_classifier.classify_layouts(
                 intent=user_request.intent,
                 context=user_request.context,
-                user_data='\n'.join([str(data) for data in user_data]),
+                user_data=user_data_text,
                 slots=["middle"],
                 model_name='gpt-5-nano'
             )
-            # Assign using generic keys: first occurrence of each type uses its type name
-            # If list contains duplicates of a type in future, you may adapt naming here
-            keys_in_order = ["middle"]
-            for idx, sel in enumerate(selected_list or []):
-                if not sel:
-                    continue
-                key = keys_in_order[idx] if idx < len(keys_in_order) else f"slot_{idx}"
-                layout_result[key] = {
-                    "id": sel["id"],
-                    "name": sel["name"],
-                    "layout_data": sel["layout_data"]
-                }
-        except Exception as e:
-            logger.error(f"Layout classification error: {e}")
-            await sio.emit('update', f"step2_error: Layout classification failed: {str(e)} (fallback to default) ({datetime.now().isoformat()})", room=sid)
-            # Fallback to default (first middle layout + fixed layouts)
-            demo_summary = layout_classifier.get_demo_layouts_summary()
-            
-            # Default middle layout
-            if demo_summary["middle_layouts"]:
-                first_middle = layout_classifier.get_layout_by_id(demo_summary["middle_layouts"][0]["id"])
-                if first_middle:
-                    layout_result["middle"] = {
-                        "id": first_middle["id"],
-                        "name": first_middle["name"],
-                        "layout_data": first_middle["layout_data"]
+
+        async def classify_speculative():
+            # Middle layout mostly depends on intent/context; start before tool data arrives
+            return await classify_middle("")
+
+        async def classify():
+            # One layout snapshot for the whole stage, even if layouts are hot-reloaded meanwhile
+            layouts = layout_classifier.snapshot
+            # Add fixed layouts first (top, button) - bottom is now classified via LLM
+            layout_result = {}
+            for layout_type in ["top", "button", "bottom"]:
+                fixed_layout_list = layouts.fixed_layouts.get(layout_type)
+                if fixed_layout_list:
+                    fixed_layout = _rng.choice(fixed_layout_list)
+                    layout_result[layout_type] = {
+                        "id": fixed_layout["id"],
+                        "name": fixed_layout["name"],
+                        "layout_data": fixed_layout["layout_data"]
                     }
-            # Default bottom from fixed bottom pool if available
-            bottom_pool = (layout_classifier.fixed_layouts or {}).get("bottom", [])
-            if bottom_pool and "bottom" not in layout_result:
-                b = bottom_pool[0]
-                layout_result["bottom"] = {"id": b["id"], "name": b["name"], "layout_data": b["layout_data"]}
-                    
-        logger.info("Selected Layouts: {}", [f"{t}:{info['id']}" for t, info in layout_result.items()])
-        
+            try:
+                # Reconcile: keep the speculative pick only if the collected data confirms it,
+                # otherwise classify again with the data
+                user_data_text = '\n'.join([str(data) for data in pipeline.results["collect"]])
+                speculative = pipeline.results.get("classify_speculative") if pipeline.succeeded("classify_speculative") else None
+                if speculative and all(
+                        layout_classifier.confirms_selection(user_request.intent, user_data_text, slot, sel)
+                        for slot, sel in zip(["middle"], speculative)):
+                    logger.info("Using speculative middle layout classification (confirmed by collected data)")
+                    selected_list = speculative
+                else:
+                    if speculative:
+                        logger.info("Speculative middle layout not confirmed by collected data; classifying again")
+                    selected_list = await classify_middle(user_data_text)
+                # Assign using generic keys: first occurrence of each type uses its type name
+                # If list contains duplicates of a type in future, you may adapt naming here
+                keys_in_order = ["middle"]
+                for idx, sel in enumerate(selected_list or []):
+                    if not sel:
+                        continue
+                    key = keys_in_order[idx] if idx < len(keys_in_order) else f"slot_{idx}"
+                    layout_result[key] = {
+                        "id": sel["id"],
+                        "name": sel["name"],
+                        "layout_data": sel["layout_data"]
+                    }
+            except Exception as e:
+                logger.error(f"Layout classification error: {e}")
+                await sio.emit('update', f"step2_error: Layout classification failed: {str(e)} (fallback to default) ({datetime.now().isoformat()})", room=sid)
+                # Fallback to default (first middle layout + fixed layouts)
+                # Default middle layout
+                if layouts.middle_layouts:
+                    first_middle = layouts.middle_layouts[0]
+                    if first_middle:
+                        layout_result["middle"] = {
+                            "id": first_middle["id"],
+                            "name": first_middle["name"],
+                            "layout_data": first_middle["layout_data"]
+                        }
+                # Default bottom from fixed bottom pool if available
+                bottom_pool = layouts.fixed_layouts.get("bottom", ())
+                if bottom_pool and "bottom" not in layout_result:
+                    b = bottom_pool[0]
+                    layout_result["bottom"] = {"id": b["id"], "name": b["name"], "layout_data": b["layout_data"]}
+                        
+            logger.info("Selected Layouts: {}", [f"{t}:{info['id']}" for t, info in layout_result.items()])
+            return layout_result
+
         # Step 3: Data Mapping (then image search based on mapped data)
-        try:
+        async def map_parameters():
             # 1) 항상 매핑을 먼저 수행
-            mapped_params_all = await data_mapper.map_all_layouts_to_parameters(
-                layouts=layout_result,
+            user_data = pipeline.results["collect"]
+            return await data_mapper.map_all_layouts_to_parameters(
+                layouts=pipeline.results["classify"],
                 intent=user_request.intent,
                 context=user_request.context,
                 user_data_text='\n'.join([str(data) for data in user_data]),
                 model_name='gpt-4.1-mini'
             )
 
-            # 2) 매핑된 데이터와 스키마를 활용해 이미지 검색 대상 경로를 수집
+        async def generate_images():
+            layout_result = pipeline.results["classify"]
+            mapped_params_all = pipeline.results["map"]
+            # 2) 최종 결과 조립: {slot: {data, html}} (이미지는 이후 경로에 주입)
+            final_result = {}
+            for key, info in layout_result.items():
+                layout_data = info["layout_data"]
+                final_result[key] = {
+                    "data": mapped_params_all.get(key, layout_data.get("sample", {})),
+                    "html": layout_data.get("html", "<div>No HTML available</div>")
+                }
+            if stream.progressive:
+                # 프로토콜 2: 이미지 생성 전에 슬롯별 카드 셸을 먼저 전송 (이미지 경로가 전송된 구조와 일치하도록 bottom 보정 선적용)
+                validate_and_fix_bottom_structure(final_result)
+                for key, payload in final_result.items():
+                    await stream.slot(key, payload)
+
+            # 3) 레이아웃별로 미리 컴파일된 이미지 경로 plan을 매핑된 데이터에 적용해 대상 경로를 수집
             img_paths_by_slot = {}
+            render_sizes = {}  # "slot|path_str" -> 스키마의 render_size 힌트
             for slot, info in layout_result.items():
                 try:
                     layout_data = (info or {}).get("layout_data", {})
-                    schema = data_mapper.extract_parameters_schema(layout_data) or {}
                     data_obj = (mapped_params_all or {}).get(slot) or {}
-                    paths = find_image_tool_paths_by_schema_and_data(schema, data_obj)
-                    if paths:
-                        img_paths_by_slot[slot] = paths
+                    targets = data_mapper.image_path_plan(layout_data).resolve_targets(data_obj)
+                    if targets:
+                        img_paths_by_slot[slot] = [path for path, _ in targets]
+                        render_sizes.update({f"{slot}|{_path_to_str(path)}": size for path, size in targets if size})
                 except Exception as e:
                     logger.warning(f"Failed to collect image tool paths for slot {slot}: {e}")
 
             has_img_paths = any(isinstance(v, list) and v for v in img_paths_by_slot.values())
 
-            # 3) 경로가 있으면 프롬프트 생성 후 이미지 생성 서버 호출 (완전 순차)
+            # 4) 경로가 있으면 프롬프트 생성 후 이미지 생성 서버 호출 (청크 스트리밍, 도착한 이미지부터 주입/전송)
             prompts_by_key = {}
             img_requests, img_index_map = [], []
             if has_img_paths:
@@ -889,35 +997,35 @@ async def process(user_request: UserRequest, sid: str):
                     default_width=1024,
                     default_height=1024,
                     model="dalle",
-                    prompts_by_key=prompts_by_key
+                    prompts_by_key=prompts_by_key,
+                    render_sizes=render_sizes,
+                    device_pixel_ratio=_device_pixel_ratio(user_request.context)
                 )
 
                 logger.info(f"Running image generation ({len(img_requests)} image requests) after mapping")
+                async def on_image(idx: int, url):
+                    # 이미지가 도착하는 즉시 주입 (프로토콜 2는 image_patch로 바로 전송)
+                    slot, path = img_index_map[idx]
+                    set_value_at_path(final_result[slot].setdefault("data", {}), path, url)
+                    await stream.image(slot, path, _path_to_str(path), url)
+
                 image_urls = await call_image_service(
-                    service_url="http://0.0.0.0:8000/generate",
-                    requests_payload=img_requests
+                    service_url=IMAGE_SERVICE_URL,
+                    requests_payload=img_requests,
+                    on_image=on_image
                 )
             else:
                 logger.info("No image generation needed")
                 image_urls = []
 
-            # 4) 최종 결과 조립: {slot: {data, html}}
-            final_result = {}
-            for key, info in layout_result.items():
-                layout_data = info["layout_data"]
-                final_result[key] = {
-                    "data": mapped_params_all.get(key, layout_data.get("sample", {})),
-                    "html": layout_data.get("html", "<div>No HTML available</div>")
-                }
-
-            # 5) 생성된 이미지를 해당 경로에 주입
+            # 5) 생성된 이미지를 해당 경로에 주입 (on_image에서 이미 주입됨; 누락 방지용 재확인)
             if image_urls and img_index_map:
                 try:
                     for idx, (slot, path) in enumerate(img_index_map):
                         if idx >= len(image_urls):
                             break
                         url = image_urls[idx]
-                        if not isinstance(url, str) or not slot:
+                        if not isinstance(url, (str, bytes)) or not slot:
                             continue
                         slot_obj = final_result.setdefault(slot, {"data": {}, "html": ""})
                         data_obj = slot_obj.setdefault("data", {})
@@ -941,9 +1049,31 @@ async def process(user_request: UserRequest, sid: str):
                     validate_image_injection(final_result, paths_by_slot)
             except Exception as e:
                 logger.warning(f"Image injection validation failed: {e}")
-
-        except Exception as e:
-            logger.error(f"Data mapping error: {e}")
+            return final_result
+
+        pipeline.add("p1", announce_p1)
+        pipeline.add("collect", collect_user_data)
+        pipeline.add("p45", pick_p45)
+        pipeline.add("p45_announce", announce_p45, deps=("p45", "collect"))
+        if PIPELINE_SPECULATIVE_CLASSIFY:
+            pipeline.add("classify_speculative", classify_speculative)
+        pipeline.add("classify", classify, deps=("collect",),
+                     optional_deps=("classify_speculative",) if PIPELINE_SPECULATIVE_CLASSIFY else ())
+        pipeline.add("map", map_parameters, deps=("classify",))
+        pipeline.add("images", generate_images, deps=("map",))
+
+        await pipeline.run()
+        pipeline.log_timings()
+
+        for stage in ("collect", "classify"):
+            if stage in pipeline.errors:
+                raise pipeline.errors[stage]
+        layout_result = pipeline.results["classify"]
+
+        if pipeline.succeeded("images"):
+            final_result = pipeline.results["images"]
+        else:
+            logger.error(f"Data mapping error: {pipeline.errors.get('map') or pipeline.errors.get('images')}")
             # On error, use the selected layouts as-is, matching the required shape
             final_result = {}
             for layout_type, layout_info in layout_result.items():
@@ -955,11 +1085,10 @@ async def process(user_request: UserRequest, sid: str):
         # Bottom validation 및 구조 수정
         final_result = validate_and_fix_bottom_structure(final_result)
         
-        await sio.emit('standby', 'standby', room=sid)
-        
-        # Final result: send UI code as structured payload
-        await sio.emit('result', final_result, room=sid)
+        # Final result: send UI code as structured payload (protocol 2: remaining slots + completion marker)
+        await stream.finish(final_result)
         logger.info("Completed about intent: {}", user_request.intent)
+        return "ok"
         
     except asyncio.CancelledError:
         # Graceful cancellation: do not emit error, just log
@@ -967,7 +1096,9 @@ async def process(user_request: UserRequest, sid: str):
         raise
     except Exception as e:
         logger.error(f"Workflow error: {str(e)}")
+        tracer.current_span().set_error(str(e))
         await sio.emit('result', f"error: {str(e)} ({datetime.now().isoformat()})", room=sid)
+        return "error"
 
 @sio.event
 async def client_disconnected(sid, payload):
@@ -1039,7 +1170,12 @@ async def query(sid, data):
         safe_context['current_unix'] = int(time.time())
         safe_context['current_location'] = "Seocho-gu, Seoul, Republic of Korea"
 
-        user_request = UserRequest(intent=intent, context=safe_context)
+        # Optional: result protocol version (2 = progressive delivery; default 1 for existing clients)
+        protocol_version = parse_protocol_version(
+            data.get('protocolVersion', data.get('protocol_version')) if isinstance(data, dict) else None
+        )
+
+        user_request = UserRequest(intent=intent, context=safe_context, protocol_version=protocol_version)
         
         # Optional: map provided clientId for later cancellation
         client_id = None
@@ -1078,6 +1214,97 @@ async def health_check():
         "timestamp": time.time()
     }
 
+@app.get("/llm/scheduler")
+async def llm_scheduler_stats():
+    """LLM scheduler metrics per model: in-flight calls, queue depth and wait times by priority"""
+    return {
+        "enabled": llm_scheduler.enabled,
+        "models": llm_scheduler.stats(),
+        "timestamp": time.time()
+    }
+
+@app.get(BLOB_ROUTE_PREFIX + "{digest}")
+async def get_image_blob(digest: str):
+    """Content-addressed generated image (IMAGE_DELIVERY=blob); immutable, so clients may cache it forever"""
+    entry = image_blobs.get(digest)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Image not found or evicted")
+    data, media_type = entry
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}"'}
+    )
+
+@app.get("/images/cache")
+async def image_cache_stats():
+    """Generated image cache: entries, bytes, hit rate and batch deduplication"""
+    return {
+        "cache": image_cache.stats(),
+        "blobs": image_blobs.stats(),
+        "timestamp": time.time()
+    }
+
+@app.get("/debug/traces")
+async def list_traces(limit: int = 20, sid: str | None = None, client_id: str | None = None):
+    """Most recent traces in the in-process ring buffer, optionally for one sid / clientId"""
+    return {
+        "tracer": tracer.stats(),
+        "traces": tracer.traces(limit=limit, sid=sid, client_id=client_id),
+        "timestamp": time.time()
+    }
+
+@app.get("/debug/traces/summary")
+async def trace_summary():
+    """Per span name over the ring buffer: count, errors and p50/p95/max latency (ms)"""
+    return {"spans": tracer.summary(), "timestamp": time.time()}
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """All buffered spans of one trace, ordered by start time"""
+    spans = sorted(tracer.spans(trace_id=trace_id), key=lambda span: span.start_ns)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found or evicted")
+    return {"traceId": trace_id, "spans": [span.to_dict() for span in spans]}
+
+def _collect_component_metrics():
+    """Scrape-time metrics from components that already keep their own counters"""
+    llm_cache = get_llm_cache().stats()
+    cache = image_cache.stats()
+    blobs = image_blobs.stats()
+    images = image_client.stats()
+    scheduler = llm_scheduler.stats()
+    return [
+        gauge_family("genui_active_sessions", "Socket.IO sessions with a running request", len(active_sessions)),
+        counter_family("genui_llm_cache_hits_total", "LLM response cache hits", llm_cache["hits"]),
+        counter_family("genui_llm_cache_misses_total", "LLM response cache misses", llm_cache["misses"]),
+        counter_family("genui_image_cache_hits_total", "Generated image disk cache hits", cache["hits"]),
+        counter_family("genui_image_cache_misses_total", "Generated image disk cache misses", cache["misses"]),
+        counter_family("genui_image_cache_deduplicated_total", "Image requests deduplicated within a batch", cache["deduplicated"]),
+        counter_family("genui_image_cache_evictions_total", "Generated image disk cache evictions", cache["evictions"]),
+        gauge_family("genui_image_cache_bytes", "Generated image disk cache size", cache["bytes"]),
+        gauge_family("genui_image_blob_store_bytes", "In-memory image blob store size", blobs["bytes"]),
+        counter_family("genui_image_blob_hits_total", "Image blob fetches served", blobs["hits"]),
+        counter_family("genui_image_blob_misses_total", "Image blob fetches not found or evicted", blobs["misses"]),
+        counter_family("genui_image_service_images_total", "Images received from the image service", images["images"]),
+        counter_family("genui_image_service_failures_total", "Images that failed after all retries", images["failures"]),
+        counter_family("genui_image_service_retried_total", "Image retries sent to the image service", images["retried"]),
+        gauge_family("genui_llm_scheduler_in_flight", "LLM calls holding a scheduler slot",
+                     samples=[({"model": model}, lane["in_flight"]) for model, lane in scheduler.items()]),
+        gauge_family("genui_llm_scheduler_queue_depth", "LLM calls waiting for a scheduler slot",
+                     samples=[({"model": model, "priority": priority}, depth)
+                              for model, lane in scheduler.items() for priority, depth in lane["queue_depth"].items()]),
+    ]
+
+metrics_registry.add_collector(_collect_component_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: stage/LLM/MCP tool latency histograms, session, image and cache counters"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
     logger.info(f"Received signal {signum}, initiating graceful shutdown...")
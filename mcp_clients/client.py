@@ -1,24 +1,43 @@
 import asyncio
 from typing import Optional, Dict, Any, List, Union, Callable, Awaitable
 from contextlib import AsyncExitStack
+import importlib.util
 import os
 import base64
 import random
+import time
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+import mcp.types as mcp_types
 
-from anthropic import Anthropic
 from dotenv import load_dotenv
 from loguru import logger
 import json
 
+from .tool_cache import ToolResultCache
+from core.llm_replay import create_anthropic_client
+from core.llm_scheduler import llm_scheduler
+from core.metrics import LLM_CALL_SECONDS, LLM_CALLS, MCP_TOOL_CALLS, MCP_TOOL_SECONDS, record_llm_usage
+from core.tracing import tracer
+
 load_dotenv()  # load environment variables from .env
 
 # Check if ANTHROPIC_API_KEY is loaded
 if not os.getenv("ANTHROPIC_API_KEY"):
     logger.warning("ANTHROPIC_API_KEY not found in environment variables. Please check your .env file.")
 
+# Upper bound on in-flight Anthropic planning requests per model (shared by all sessions and clients).
+# Applied as the model's lane limit in core.llm_scheduler; LLM_MODEL_LIMITS overrides it per model.
+ANTHROPIC_MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "16"))
+# Stream planning responses and dispatch each tool_use block as soon as it is complete
+MCP_STREAM_TOOL_USE = os.getenv("MCP_STREAM_TOOL_USE", "true").lower() in ("1", "true", "yes")
+# Byte budget of the tool result cache (only tools with cache_ttl in tool_metadata.json are cached)
+MCP_TOOL_CACHE_MAX_BYTES = int(os.getenv("MCP_TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Run bundled FastMCP .py servers inside this process over memory streams instead of stdio subprocesses
+MCP_IN_PROCESS_CUSTOM_SERVERS = os.getenv("MCP_IN_PROCESS_CUSTOM_SERVERS", "false").lower() in ("1", "true", "yes")
 
 
 # Icon mapping cache
@@ -132,99 +151,239 @@ def get_tool_comment(tool_name: str, server_name: str = None) -> Optional[str]:
         logger.error(f"Error loading comment for tool {tool_name}: {e}")
         return "정보를 검색하고 있습니다."
 
+def get_tool_cache_ttl(tool_name: str, server_name: str = None) -> float:
+    """Get result cache TTL (seconds) for a tool; 0 means the tool is not cached.
+
+    A `cache_ttl` on the tool's own mapping entry overrides the one on its server's entry,
+    so a server can opt in as a whole while individual write tools opt out.
+    """
+    try:
+        mappings = load_icon_mapping().get("mappings", {})
+        for key in (tool_name, server_name):
+            tool_config = mappings.get(key) if key else None
+            if isinstance(tool_config, dict) and "cache_ttl" in tool_config:
+                return max(0.0, float(tool_config.get("cache_ttl") or 0))
+    except Exception as e:
+        logger.error(f"Error loading cache ttl for tool {tool_name}: {e}")
+    return 0.0
+
+def _model_call_attributes(kwargs: Dict[str, Any], streamed: bool) -> Dict[str, Any]:
+    """Span attributes of one Anthropic Messages call"""
+    return {
+        "gen_ai.system": "anthropic",
+        "gen_ai.request.model": kwargs.get("model"),
+        "llm.streamed": streamed,
+        "llm.messages": len(kwargs.get("messages") or []),
+    }
+
+def _record_usage(span, model: str, response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        input_tokens, output_tokens = getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None)
+        record_llm_usage(model, "plan", input_tokens, output_tokens)
+        span.set_attributes({"gen_ai.usage.input_tokens": input_tokens, "gen_ai.usage.output_tokens": output_tokens})
+    stop_reason = getattr(response, "stop_reason", None)
+    if stop_reason:
+        span.set_attribute("gen_ai.response.finish_reasons", [stop_reason])
+
 class BaseMCPClientError(Exception):
     """Base exception for MCP Client errors"""
     pass
 
+# FastMCP server modules imported for the in-process transport, keyed by absolute script path
+_in_process_servers: Dict[str, FastMCP] = {}
+
+def load_fastmcp_server(script_path: str) -> FastMCP:
+    """Import a FastMCP server script as a module (once) and return its FastMCP instance"""
+    abs_path = os.path.abspath(script_path)
+    if abs_path in _in_process_servers:
+        return _in_process_servers[abs_path]
+
+    module_name = "_mcp_in_process_" + os.path.splitext(os.path.basename(abs_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, abs_path)
+    if spec is None or spec.loader is None:
+        raise BaseMCPClientError(f"Cannot import MCP server script: {abs_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    server = getattr(module, "mcp", None)
+    if not isinstance(server, FastMCP):
+        server = next((v for v in vars(module).values() if isinstance(v, FastMCP)), None)
+    if server is None:
+        raise BaseMCPClientError(f"No FastMCP instance found in {abs_path}")
+
+    _in_process_servers[abs_path] = server
+    return server
+
 class BaseMCPServerConnection:
     """Base MCP server connection"""
-    def __init__(self, server_id: str, config: Union[str, Dict[str, Any]]):
+    def __init__(self, server_id: str, config: Union[str, Dict[str, Any]], in_process: bool = False):
         self.server_id = server_id
         self.config = config
+        # Only FastMCP .py scripts can be served in-process; everything else uses stdio
+        self.in_process = in_process and isinstance(config, str) and config.endswith('.py')
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.is_connected = False
         self.stdio = None
         self.write = None
+        self._owner_task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        # Tool list as reported by the server; None means it must be (re)fetched
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        # Called with server_id when the server sends notifications/tools/list_changed
+        self.on_tools_changed: Optional[Callable[[str], None]] = None
+
+    async def _handle_session_message(self, message) -> None:
+        """Session message handler: invalidate cached tools on tools/list_changed."""
+        if isinstance(message, mcp_types.ServerNotification) and isinstance(message.root, mcp_types.ToolListChangedNotification):
+            logger.info(f"Tool list changed on server {self.server_id}")
+            self._tools = None
+            if self.on_tools_changed:
+                self.on_tools_changed(self.server_id)
         
     async def connect(self):
-        """Connect to this specific server"""
+        """Connect to this specific server.
+
+        The transport and session contexts are owned by a dedicated task
+        (_run_connection) that enters and exits them, so connect()/cleanup() can be
+        awaited from any task, including concurrently from connect_to_servers.
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        self.exit_stack = AsyncExitStack()
+        self._stop_event = asyncio.Event()
+        self._owner_task = asyncio.create_task(self._run_connection(ready), name=f"mcp-connection-{self.server_id}")
         try:
-            command: str
-            args: List[str]
-            server_display_name: str
-            env: Optional[Dict[str, str]] = None
-
-            if isinstance(self.config, str):
-                # Handle local script path
-                server_script_path = self.config
-                is_python = server_script_path.endswith('.py')
-                is_js = server_script_path.endswith('.js')
-                if not (is_python or is_js):
-                    raise BaseMCPClientError("Server script must be a .py or .js file")
-
-                command = "python" if is_python else "node"
-                args = [server_script_path]
-                server_display_name = f"{self.server_id}: {server_script_path}"
-            
-            elif isinstance(self.config, dict):
-                # Handle external server config from JSON
-                command = self.config.get("command")
-                args = self.config.get("args", [])
-                env = self.config.get("env")
-                
-                server_display_name = f"{self.server_id}: {command} {' '.join(args)}"
-                if not command:
-                    raise BaseMCPClientError("Server configuration must include a 'command'")
-
-                # If it's a docker command, append the image name
-                if command == "docker":
-                    image = self.config.get("image")
-                    if not image:
-                        raise BaseMCPClientError("Docker server config must include an 'image' name")
-                    args.append(image)
-                    server_display_name += f" {image}"
+            await ready
+        except asyncio.CancelledError:
+            self.is_connected = False
+            self._owner_task.cancel()
+            raise
+        except Exception as e:
+            self.is_connected = False
+            logger.error(f"Failed to connect to MCP server {self.server_id}: {str(e)}")
+            raise BaseMCPClientError(f"Connection failed for {self.server_id}: {str(e)}") from e
 
+    async def _run_connection(self, ready: asyncio.Future):
+        """Owner task: open the session, signal `ready`, then hold it open until cleanup()."""
+        try:
+            async with self.exit_stack:
+                await self._open_session()
+                if not ready.done():
+                    ready.set_result(True)
+                await self._stop_event.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.cancel()
+            raise
+        except Exception as e:
+            self.is_connected = False
+            if not ready.done():
+                ready.set_exception(e)
             else:
-                raise BaseMCPClientError(f"Unsupported server configuration type: {type(self.config)}")
+                logger.debug(f"Connection task for {self.server_id} ended with error: {e}")
 
-            server_params = StdioServerParameters(
-                command=command,
-                args=args,
-                env=env
-            )
+    async def _open_session(self):
+        """Start the server transport and initialize the client session"""
+        if self.in_process:
+            await self._open_in_process_session()
+            return
 
-            logger.info(f"Connecting to MCP server: {server_display_name}")
-            stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-            self.stdio, self.write = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+        command: str
+        args: List[str]
+        server_display_name: str
+        env: Optional[Dict[str, str]] = None
 
-            await self.session.initialize()
-            self.is_connected = True
+        if isinstance(self.config, str):
+            # Handle local script path
+            server_script_path = self.config
+            is_python = server_script_path.endswith('.py')
+            is_js = server_script_path.endswith('.js')
+            if not (is_python or is_js):
+                raise BaseMCPClientError("Server script must be a .py or .js file")
 
-            # List available tools
-            response = await self.session.list_tools()
-            tools = response.tools
-            tool_names = [tool.name for tool in tools]
-            logger.info(f"Connected to {server_display_name} with {len(tool_names)} tools: {tool_names}")
+            command = "python" if is_python else "node"
+            args = [server_script_path]
+            server_display_name = f"{self.server_id}: {server_script_path}"
+        
+        elif isinstance(self.config, dict):
+            # Handle external server config from JSON
+            command = self.config.get("command")
+            args = list(self.config.get("args", []))
+            env = self.config.get("env")
             
-        except Exception as e:
-            self.is_connected = False
-            logger.error(f"Failed to connect to MCP server {self.server_id}: {str(e)}")
-            raise BaseMCPClientError(f"Connection failed for {self.server_id}: {str(e)}") from e
+            server_display_name = f"{self.server_id}: {command} {' '.join(args)}"
+            if not command:
+                raise BaseMCPClientError("Server configuration must include a 'command'")
+
+            # If it's a docker command, append the image name
+            if command == "docker":
+                image = self.config.get("image")
+                if not image:
+                    raise BaseMCPClientError("Docker server config must include an 'image' name")
+                args.append(image)
+                server_display_name += f" {image}"
+
+        else:
+            raise BaseMCPClientError(f"Unsupported server configuration type: {type(self.config)}")
+
+        server_params = StdioServerParameters(
+            command=command,
+            args=args,
+            env=env
+        )
+
+        logger.info(f"Connecting to MCP server: {server_display_name}")
+        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
+        self.stdio, self.write = stdio_transport
+        self.session = await self.exit_stack.enter_async_context(
+            ClientSession(self.stdio, self.write, message_handler=self._handle_session_message)
+        )
+
+        await self.session.initialize()
+        self.is_connected = True
+
+        # List available tools once; later lookups are served from the cache
+        tools = await self.get_tools(refresh=True)
+        tool_names = [tool["name"] for tool in tools]
+        logger.info(f"Connected to {server_display_name} with {len(tool_names)} tools: {tool_names}")
+
+    async def _open_in_process_session(self):
+        """Serve a bundled FastMCP script from this process over in-memory streams.
+
+        call_tool/list_tools go through the same ClientSession API as stdio, but without
+        a child interpreter or JSON-over-pipe framing.
+        """
+        server = load_fastmcp_server(self.config)
+        logger.info(f"Connecting to MCP server in-process: {self.server_id}: {self.config}")
+        self.session = await self.exit_stack.enter_async_context(
+            create_connected_server_and_client_session(
+                server._mcp_server,
+                message_handler=self._handle_session_message
+            )
+        )
+        self.is_connected = True
+
+        tools = await self.get_tools(refresh=True)
+        tool_names = [tool["name"] for tool in tools]
+        logger.info(f"Connected to {self.server_id} (in-process) with {len(tool_names)} tools: {tool_names}")
     
-    async def get_tools(self) -> List[Dict[str, Any]]:
-        """Get tools from this server"""
+    async def get_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Get tools from this server (cached after the first list_tools call)"""
         if not self.is_connected or not self.session:
             return []
+        if self._tools is not None and not refresh:
+            return self._tools
         
         try:
             response = await self.session.list_tools()
-            return [{
+            self._tools = [{
                 "name": tool.name,
                 "description": tool.description,
                 "input_schema": tool.inputSchema
             } for tool in response.tools]
+            return self._tools
         except Exception as e:
             logger.error(f"Error getting tools from {self.server_id}: {str(e)}")
             return []
@@ -245,6 +404,7 @@ class BaseMCPServerConnection:
         
         try:
             self.is_connected = False
+            self._tools = None
             
             if self.session:
                 self.session = None
@@ -252,9 +412,13 @@ class BaseMCPServerConnection:
             self.stdio = None
             self.write = None
             
-            if self.exit_stack:
+            if self._stop_event:
+                self._stop_event.set()
+            if self._owner_task:
                 try:
-                    await asyncio.wait_for(self.exit_stack.aclose(), timeout=5.0)
+                    # The owner task exits the transport/session contexts itself;
+                    # wait_for cancels it if it does not finish in time.
+                    await asyncio.wait_for(self._owner_task, timeout=5.0)
                 except asyncio.TimeoutError:
                     logger.warning(f"Timeout during exit_stack cleanup for {self.server_id}")
                 except Exception as e:
@@ -271,10 +435,9 @@ class BaseMCPServerConnection:
                         logger.error(f"Unexpected cleanup error for {self.server_id}: {e}")
                         raise
                 finally:
-                    try:
-                        self.exit_stack = AsyncExitStack()
-                    except Exception:
-                        self.exit_stack = None
+                    self._owner_task = None
+                    self._stop_event = None
+                    self.exit_stack = AsyncExitStack()
                         
             logger.debug(f"Cleanup completed for server {self.server_id}")
                     
@@ -286,12 +449,19 @@ class BaseMCPClient:
     """Base MCP Client with common functionality"""
     def __init__(self, system_prompt_filename: str, model: str = "claude-sonnet-4-20250514"):
         self.server_connections: Dict[str, BaseMCPServerConnection] = {}
-        self.anthropic = Anthropic()
+        self.anthropic = create_anthropic_client()
+        # Planning call cap when the LLM scheduler is disabled (see _planning_slot)
+        self._model_call_semaphore = asyncio.Semaphore(max(1, ANTHROPIC_MAX_CONCURRENCY))
         self.tool_to_server_map: Dict[str, str] = {}
+        self.in_process_custom_servers = MCP_IN_PROCESS_CUSTOM_SERVERS
+        self.tool_cache = ToolResultCache(max_bytes=MCP_TOOL_CACHE_MAX_BYTES)
+        # Tool list in the exact shape passed as `tools=` to the model; None = rebuild
+        self._tool_catalog: Optional[List[Dict[str, Any]]] = None
         self.system_prompt_filename = system_prompt_filename
         self.system_prompt = self.load_system_prompt()
         self.model = model
-        logger.info(f"{self.__class__.__name__} initialized (model={self.model})")
+        self.stream_tool_use = MCP_STREAM_TOOL_USE
+        logger.info(f"{self.__class__.__name__} initialized (model={self.model}, stream_tool_use={self.stream_tool_use})")
     
     
     def load_system_prompt(self) -> str:
@@ -329,10 +499,12 @@ class BaseMCPClient:
             logger.warning(f"Server {server_id} already exists, replacing...")
             await self.remove_server(server_id)
         
-        connection = BaseMCPServerConnection(server_id, server_config)
+        connection = BaseMCPServerConnection(server_id, server_config, in_process=self.in_process_custom_servers)
+        connection.on_tools_changed = self._on_server_tools_changed
         try:
             await connection.connect()
             self.server_connections[server_id] = connection
+            self.invalidate_tool_catalog()
             
             tools = await connection.get_tools()
             logger.info(f"Server {server_id} provides {len(tools)} tools")
@@ -357,6 +529,7 @@ class BaseMCPClient:
             del self.tool_to_server_map[tool_name]
         
         del self.server_connections[server_id]
+        self.invalidate_tool_catalog()
         
         try:
             await asyncio.wait_for(connection.cleanup(), timeout=10.0)
@@ -372,21 +545,39 @@ class BaseMCPClient:
         if not connected_servers:
             raise BaseMCPClientError("No servers are connected")
     
+    def invalidate_tool_catalog(self):
+        """Drop the cached tool catalog; it is rebuilt on the next get_available_tools()"""
+        self._tool_catalog = None
+
+    def _on_server_tools_changed(self, server_id: str):
+        logger.info(f"Invalidating tool catalog (tools/list_changed from {server_id})")
+        self.invalidate_tool_catalog()
+
     async def get_available_tools(self) -> List[Dict[str, Any]]:
-        """Get list of available tools from all connected servers"""
+        """Get list of available tools from all connected servers.
+
+        The result is cached as a catalog and reused by every request until a server
+        is added/removed or reports tools/list_changed, so the common path does no IPC.
+        Callers must treat the returned list as read-only.
+        """
+        if self._tool_catalog is not None:
+            return self._tool_catalog
         try:
             await self.ensure_connected()
             all_tools = []
+            tool_to_server_map: Dict[str, str] = {}
             
-            for server_id, connection in self.server_connections.items():
+            for server_id, connection in list(self.server_connections.items()):
                 if connection.is_connected:
                     tools = await connection.get_tools()
                     for tool in tools:
                         tool_name = tool["name"]
-                        self.tool_to_server_map[tool_name] = server_id
+                        tool_to_server_map[tool_name] = server_id
                         all_tools.append(tool)
             
-            logger.debug(f"Returning {len(all_tools)} tools from all servers")
+            self.tool_to_server_map = tool_to_server_map
+            self._tool_catalog = all_tools
+            logger.info(f"Tool catalog built: {len(all_tools)} tools from {len(self.server_connections)} servers")
             return all_tools
         except Exception as e:
             logger.error(f"Error getting available tools: {str(e)}")
@@ -396,11 +587,87 @@ class BaseMCPClient:
     def is_connected(self) -> bool:
         """Check if any server is connected"""
         return any(conn.is_connected for conn in self.server_connections.values())
+
+    def _planning_slot(self, model: str):
+        """Concurrency slot for one planning call.
+
+        With the scheduler enabled the model's lane is capped at ANTHROPIC_MAX_CONCURRENCY
+        (unless LLM_MODEL_LIMITS sets it); otherwise the per-client semaphore applies.
+        """
+        if llm_scheduler.enabled:
+            llm_scheduler.set_default_limits(model, concurrency=ANTHROPIC_MAX_CONCURRENCY)
+            return llm_scheduler.slot(model, "critical")
+        return self._model_call_semaphore
+
+    async def _create_message(self, **kwargs):
+        """Call the Anthropic Messages API without blocking the event loop.
+
+        Concurrency is bounded by ANTHROPIC_MAX_CONCURRENCY (see _planning_slot) so
+        that a burst of sessions queues here instead of exhausting the HTTP connection pool.
+        """
+        model = kwargs.get("model", "anthropic")
+        with tracer.span("llm.call", _model_call_attributes(kwargs, streamed=False)) as span:
+            started = time.perf_counter()
+            try:
+                async with self._planning_slot(model):
+                    response = await self.anthropic.messages.create(**kwargs)
+            except Exception:
+                LLM_CALLS.labels(model, "plan", "error").inc()
+                raise
+            LLM_CALL_SECONDS.labels(model, "plan").observe(time.perf_counter() - started)
+            LLM_CALLS.labels(model, "plan", "ok").inc()
+            _record_usage(span, model, response)
+            return response
+
+    async def _stream_planning_step(self, **kwargs):
+        """Stream one planning response and start tool calls while it is still generating.
+
+        Each tool_use block is dispatched to its MCP server on content_block_stop,
+        i.e. as soon as its input JSON is complete, so tool execution overlaps with
+        the generation of sibling blocks.
+
+        Returns (final_message, tasks) where tasks follow the tool_use block order.
+        """
+        tasks: List[asyncio.Task] = []
+        model = kwargs.get("model", "anthropic")
+        try:
+            with tracer.span("llm.call", _model_call_attributes(kwargs, streamed=True)) as span:
+                started = time.perf_counter()
+                async with self._planning_slot(model):
+                    async with self.anthropic.messages.stream(**kwargs) as stream:
+                        async for event in stream:
+                            if event.type != "content_block_stop":
+                                continue
+                            block = getattr(event, "content_block", None)
+                            if getattr(block, "type", None) == "tool_use":
+                                logger.debug(f"[TOOL] Early dispatch: {block.name} ({block.id})")
+                                tasks.append(asyncio.create_task(self._execute_single_tool_call(block)))
+                        response = await stream.get_final_message()
+                LLM_CALL_SECONDS.labels(model, "plan").observe(time.perf_counter() - started)
+                LLM_CALLS.labels(model, "plan", "ok").inc()
+                _record_usage(span, model, response)
+                span.set_attribute("llm.early_dispatched_tools", len(tasks))
+            return response, tasks
+        except BaseException as e:
+            if isinstance(e, Exception):
+                LLM_CALLS.labels(model, "plan", "error").inc()
+            for task in tasks:
+                task.cancel()
+            raise
     
     async def _execute_single_tool_call(self, tool_call):
         """Execute a single tool call with configurable return format"""
+        with tracer.span("mcp.tool", {"mcp.tool.name": tool_call.name}) as span:
+            result_data, error = await self._call_tool(tool_call)
+            span.set_attribute("mcp.tool.server", result_data["tool_name"].rsplit(".", 1)[0])
+            if error is not None:
+                span.set_error(str(error))
+            return result_data, error
+
+    async def _call_tool(self, tool_call):
         start_time = asyncio.get_event_loop().time()
         tool_name, tool_args, tool_id = tool_call.name, tool_call.input, tool_call.id
+        server_id = None
         
         try:
  
@@ -412,26 +679,41 @@ class BaseMCPClient:
             if not server_connection.is_connected:
                 raise BaseMCPClientError(f"Server '{server_id}' is not connected")
             
-            result = await server_connection.call_tool(tool_name, tool_args)
+            server_name = server_id.replace("external_", "").replace("custom_", "")
+            cache_ttl = get_tool_cache_ttl(tool_name, server_name)
+            cache_key = ToolResultCache.make_key(server_id, tool_name, tool_args) if cache_ttl > 0 else None
+            cached_result = self.tool_cache.get(cache_key) if cache_key else None
             
-            # Extract text content from CallToolResult
-            tool_result = ""
-            if result.content and len(result.content) > 0:
-                first_content = result.content[0]
-                if hasattr(first_content, 'text'):
-                    tool_result = first_content.text
-                else:
-                    tool_result = str(first_content)
+            tracer.current_span().set_attribute("mcp.tool.cache_hit", cached_result is not None)
+            if cached_result is not None:
+                tool_result = cached_result
+            else:
+                result = await server_connection.call_tool(tool_name, tool_args)
+                
+                # Extract text content from CallToolResult
+                tool_result = ""
+                if result.content and len(result.content) > 0:
+                    first_content = result.content[0]
+                    if hasattr(first_content, 'text'):
+                        tool_result = first_content.text
+                    else:
+                        tool_result = str(first_content)
+                
+                if cache_key and not getattr(result, "isError", False):
+                    self.tool_cache.put(cache_key, tool_result, cache_ttl)
             
             execution_time = (asyncio.get_event_loop().time() - start_time) * 1000  # Convert to milliseconds
+            MCP_TOOL_SECONDS.labels(server_name).observe(execution_time / 1000)
+            MCP_TOOL_CALLS.labels(
+                server_name,
+                "cache_hit" if cached_result is not None else "error" if getattr(result, "isError", False) else "ok"
+            ).inc()
             
             logger.info(f"[TOOL] Tool Execution: {tool_name}")
             logger.info(f"  └─ Args: {tool_args}")
             logger.info(f"  └─ ID: {tool_id}")
             logger.info(f"  └─ Result: {tool_result[:300]}{'...' if len(tool_result) > 300 else ''}")
-            logger.info(f"  └─ Execution time: {execution_time:.1f}ms")
-            
-            server_name = server_id.replace("external_", "").replace("custom_", "")
+            logger.info(f"  └─ Execution time: {execution_time:.1f}ms{' (cache hit)' if cached_result is not None else ''}")
             
             result_data = {
                 "tool_name": f'{server_name}.{tool_name}',
@@ -447,7 +729,9 @@ class BaseMCPClient:
             
             error_content = f"Error executing tool: {e}"
             
-            server_name = server_id.replace("external_", "").replace("custom_", "")
+            server_name = (server_id or "unknown").replace("external_", "").replace("custom_", "")
+            MCP_TOOL_SECONDS.labels(server_name).observe(execution_time / 1000)
+            MCP_TOOL_CALLS.labels(server_name, "error").inc()
             
             error_result = {
                 "tool_name": f'{server_name}.{tool_name}',
@@ -467,6 +751,9 @@ class BaseMCPClient:
             return
         
         self.tool_to_server_map.clear()
+        self.invalidate_tool_catalog()
+        logger.info(f"Tool result cache stats: {self.tool_cache.stats()}")
+        self.tool_cache.clear()
         server_ids = list(self.server_connections.keys())
         
         for server_id in server_ids:
@@ -488,6 +775,11 @@ class BaseMCPClient:
         
         self.server_connections.clear()
         self.tool_to_server_map.clear()
+
+        try:
+            await self.anthropic.close()
+        except Exception as e:
+            logger.debug(f"Error closing Anthropic client: {e}")
         
         logger.info(f"{self.__class__.__name__} cleanup completed")
     
@@ -570,6 +862,18 @@ class BaseMCPClient:
         Query Claude with available tools and return a list of tool execution results.
         This replaces the legacy streaming behavior with a simple list return.
         """
+        with tracer.span("mcp.plan", {"gen_ai.system": "anthropic", "gen_ai.request.model": model}) as plan_span:
+            return await self._process_query_list(query, model, on_update, multi_agent_expression, plan_span)
+
+    async def _process_query_list(
+        self,
+        query: dict,
+        model: str,
+        on_update: Optional[Callable[[str], Awaitable[None]]],
+        multi_agent_expression: dict[str, List[str]],
+        plan_span,
+    ) -> List[Dict[str, Any]]:
+        """process_query_list() body, run inside its `mcp.plan` span."""
         try:
             messages = [
                 {
@@ -588,8 +892,11 @@ class BaseMCPClient:
             await self._run_initial_sequential_thinking(query, available_tools, messages, tool_results, on_update, multi_agent_expression)
             on_update_gpt_worker_tasks = []
             
+            iterations = 0
+            tool_calls_per_iteration: List[int] = []
             for _ in range(max_iterations):
-                response = self.anthropic.messages.create(
+                iterations += 1
+                request_kwargs = dict(
                     model=model,
                     max_tokens=1024,
                     system=self.system_prompt,
@@ -597,15 +904,21 @@ class BaseMCPClient:
                     tools=available_tools,
                     temperature=0.1
                 )
+                if self.stream_tool_use:
+                    response, tasks = await self._stream_planning_step(**request_kwargs)
+                else:
+                    response, tasks = await self._create_message(**request_kwargs), None
 
                 tool_calls = [content for content in response.content if content.type == 'tool_use']
+                tool_calls_per_iteration.append(len(tool_calls))
 
                 if not tool_calls:
                     break
 
                 messages.append({"role": "assistant", "content": response.content})
 
-                tasks = [asyncio.create_task(self._execute_single_tool_call(tool_call)) for tool_call in tool_calls]
+                if tasks is None:
+                    tasks = [asyncio.create_task(self._execute_single_tool_call(tool_call)) for tool_call in tool_calls]
                 
                 # Start separate on_update worker that calls GPT before sending updates
                 if on_update:
@@ -689,7 +1002,8 @@ class BaseMCPClient:
                                     "Output: The chosen line with slots replaced, plain text only."
                                 )
 
-                                gpt_text = await call_llm(prompt, model_name="gpt-4.1-mini")
+                                # Progress lines embed the per-request query (incl. timestamps): never reused
+                                gpt_text = await call_llm(prompt, model_name="gpt-4.1-mini", use_cache=False, priority="background", site="progress")
                                 clean_text = _to_plain_text(gpt_text)
                                 logger.info(clean_text)
                                 if clean_text:
@@ -709,32 +1023,51 @@ class BaseMCPClient:
                     on_update_gpt_worker_tasks.append(asyncio.create_task(_on_update_gpt_worker(tool_calls)))
                                     
 
-                for completed_task in asyncio.as_completed(tasks):
-                    try:
-                        result, error = await completed_task
-                        tool_results.append(result)
-                        logger.info(f"[TOOL] Tool completed")
-                    except Exception as e:
-                        logger.error(f"Tool execution exception: {e}")
-
+                # Per-iteration result table keyed by tool_use_id; results are still
+                # collected in completion order, but pairing no longer depends on it.
+                task_to_id = {task: tool_call.id for task, tool_call in zip(tasks, tool_calls)}
+                results_by_id: Dict[str, Dict[str, Any]] = {}
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for completed_task in done:
+                        tool_use_id = task_to_id.get(completed_task)
+                        try:
+                            result, error = completed_task.result()
+                            tool_results.append(result)
+                            results_by_id[tool_use_id] = result
+                            logger.info(f"[TOOL] Tool completed ({tool_use_id})")
+                        except Exception as e:
+                            logger.error(f"Tool execution exception ({tool_use_id}): {e}")
+                            results_by_id[tool_use_id] = {"tool_result": f"Error executing tool: {e}", "error": str(e)}
 
                 tool_result_content = []
-                for i, result in enumerate(tool_results[-len(tool_calls):]):  # Only get results from current iteration
-                    if i < len(tool_calls):
-                        tool_use_id = tool_calls[i].id
-                        
-                        tool_result_text = result.get("tool_result", "") if isinstance(result, dict) else str(result)
-                        tool_result_content.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": tool_result_text
-                        })
+                for tool_call in tool_calls:
+                    result = results_by_id.get(tool_call.id)
+                    if result is None:
+                        result = {"tool_result": "Error executing tool: no result", "error": "no result"}
+                    tool_result_text = result.get("tool_result", "") if isinstance(result, dict) else str(result)
+                    content_item = {
+                        "type": "tool_result",
+                        "tool_use_id": tool_call.id,
+                        "content": tool_result_text
+                    }
+                    if isinstance(result, dict) and result.get("error"):
+                        content_item["is_error"] = True
+                    tool_result_content.append(content_item)
 
                 if tool_result_content:
                     messages.append({"role": "user", "content": tool_result_content})
                 else:
                     logger.warning("[TOOL] No tool results to add to messages")
 
+            logger.info(f"[PLAN] Planning finished after {iterations} iteration(s), {len(tool_results)} tool result(s)")
+            plan_span.set_attributes({
+                "plan.iterations": iterations,
+                "plan.tool_calls": tool_calls_per_iteration,
+                "plan.tool_results": len(tool_results),
+            })
+
             if on_update_gpt_worker_tasks:
                 for task in on_update_gpt_worker_tasks:
                     await task
@@ -1,9 +1,15 @@
+import asyncio
 import json
 import os
+import time
 from typing import Optional, List, Dict, Any
 from loguru import logger
 from .client import BaseMCPClient, BaseMCPClientError
 
+# Startup tuning: how many servers are started at once, and how long each may take
+MCP_CONNECT_CONCURRENCY = int(os.getenv("MCP_CONNECT_CONCURRENCY", "8"))
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "120"))
+
 class BaseMCPManagerError(Exception):
     """Base exception for MCP Manager errors"""
     pass
@@ -11,12 +17,17 @@ class BaseMCPManagerError(Exception):
 class BaseMCPManager:
     """Base MCP Manager with common functionality"""
     
-    def __init__(self, client_class=None, system_prompt_filename: str = None):
+    def __init__(self, client_class=None, system_prompt_filename: str = None,
+                 connect_concurrency: int = None, connect_timeout: float = None):
         self.custom_mcp_server_paths: List[str] = []
         self.external_mcp_servers: Dict[str, Any] = {}
         self.mcp_client_instance: Optional[BaseMCPClient] = None
         self.client_class = client_class or BaseMCPClient
         self.system_prompt_filename = system_prompt_filename
+        self.connect_concurrency = max(1, connect_concurrency or MCP_CONNECT_CONCURRENCY)
+        self.connect_timeout = connect_timeout or MCP_CONNECT_TIMEOUT
+        # Per-server connect duration in seconds from the last connect_to_servers()
+        self.connect_timings: Dict[str, float] = {}
         logger.info(f"{self.__class__.__name__} initialized")
     
     def load_custom_mcp_servers(self, base_dir: str = None) -> List[str]:
@@ -60,62 +71,76 @@ class BaseMCPManager:
             return config.get('mcpServers', {})
     
     async def connect_to_servers(self, custom_servers: bool = True, external_servers: bool = True):
-        """Connect to custom and/or external servers"""
-        total_expected = 0
-        total_connected = 0
-        failed_servers = []
-        
-        # Count expected servers
-        if custom_servers:
-            total_expected += len(self.custom_mcp_server_paths)
-        if external_servers:
-            total_expected += len([s for s in self.external_mcp_servers.values() if not s.get('disabled', False)])
+        """Connect to custom and/or external servers.
+
+        Servers are started concurrently (at most `connect_concurrency` at a time) with a
+        per-server timeout of `connect_timeout` seconds. Failures are collected and returned
+        so that init_mcp_client keeps refusing to start when any server fails.
+        """
+        # (label, server_id, config) in deterministic order
+        jobs = []
         
-        # Connect to custom servers
         if custom_servers and self.custom_mcp_server_paths:
-            logger.info("Connecting to custom MCP servers...")
             for server_path in self.custom_mcp_server_paths:
                 server_name = os.path.basename(server_path)
                 if server_name.endswith('.py'):
                     server_name = server_name[:-3]  # .py 제거
-                server_id = f"custom_{server_name}"
-                
-                logger.info(f"Connecting to custom server {server_id}: {server_name}")
-                
-                try:
-                    success = await self.mcp_client_instance.add_server(server_id, server_path)
-                    if success:
-                        total_connected += 1
-                        logger.info(f"Successfully connected to custom server: {server_name}")
-                    else:
-                        failed_servers.append(f"custom server '{server_name}'")
-                        logger.error(f"Failed to connect to custom server: {server_name}")
-                except Exception as e:
-                    failed_servers.append(f"custom server '{server_name}' - {str(e)}")
-                    logger.error(f"Error connecting to custom server {server_name}: {str(e)}")
+                jobs.append((f"custom server '{server_name}'", f"custom_{server_name}", server_path))
         
-        # Connect to external servers
         if external_servers and self.external_mcp_servers:
-            logger.info("Connecting to external MCP servers...")
             for server_name, server_config in self.external_mcp_servers.items():
                 if server_config.get('disabled', False):
                     logger.info(f"⏸️ Skipping disabled external server: {server_name}")
                     continue
-                
-                server_id = f"external_{server_name}"
-                logger.info(f"Connecting to external server {server_id}: {server_name}")
-                
+                jobs.append((f"external server '{server_name}'", f"external_{server_name}", server_config))
+        
+        total_expected = len(jobs)
+        failed_servers = []
+        self.connect_timings = {}
+        semaphore = asyncio.Semaphore(self.connect_concurrency)
+        
+        async def _connect_one(label: str, server_id: str, config: Any) -> bool:
+            async with semaphore:
+                logger.info(f"Connecting to {label} ({server_id})")
+                started = time.perf_counter()
                 try:
-                    success = await self.mcp_client_instance.add_server(server_id, server_config)
-                    if success:
-                        total_connected += 1
-                        logger.info(f"✅ Successfully connected to external server: {server_name}")
-                    else:
-                        failed_servers.append(f"external server '{server_name}'")
-                        logger.error(f"❌ Failed to connect to external server: {server_name}")
+                    success = await asyncio.wait_for(
+                        self.mcp_client_instance.add_server(server_id, config),
+                        timeout=self.connect_timeout
+                    )
+                    if not success:
+                        failed_servers.append(label)
+                        logger.error(f"❌ Failed to connect to {label}")
+                    return bool(success)
+                except asyncio.TimeoutError:
+                    failed_servers.append(f"{label} - timed out after {self.connect_timeout:.0f}s")
+                    logger.error(f"❌ Timed out connecting to {label} after {self.connect_timeout:.0f}s")
+                    return False
                 except Exception as e:
-                    failed_servers.append(f"external server '{server_name}' - {str(e)}")
-                    logger.error(f"❌ Error connecting to external server {server_name}: {str(e)}")
+                    failed_servers.append(f"{label} - {str(e)}")
+                    logger.error(f"❌ Error connecting to {label}: {str(e)}")
+                    return False
+                finally:
+                    self.connect_timings[server_id] = time.perf_counter() - started
+        
+        if jobs:
+            logger.info(f"Connecting to {total_expected} MCP servers (concurrency={self.connect_concurrency}, timeout={self.connect_timeout:.0f}s)...")
+        started_all = time.perf_counter()
+        results = await asyncio.gather(*[_connect_one(*job) for job in jobs])
+        total_connected = sum(1 for ok in results if ok)
+        
+        # Keep server (and therefore tool catalog) order independent of completion order
+        connections = self.mcp_client_instance.server_connections
+        ordered = {server_id: connections[server_id] for _, server_id, _ in jobs if server_id in connections}
+        ordered.update({k: v for k, v in connections.items() if k not in ordered})
+        connections.clear()
+        connections.update(ordered)
+        self.mcp_client_instance.invalidate_tool_catalog()
+        
+        if jobs:
+            logger.info(f"MCP server startup took {time.perf_counter() - started_all:.2f}s; per-server connect timings (slowest first):")
+            for server_id, seconds in sorted(self.connect_timings.items(), key=lambda kv: kv[1], reverse=True):
+                logger.info(f"  {server_id}: {seconds:.2f}s")
         
         return total_connected, total_expected, failed_servers
     
@@ -166,16 +166,8 @@ class MCPService:
             raise BaseMCPManagerError(f"[{self.tag}] {self.service_name} not connected")
         
         try:
-            response = await self.mcp_manager.mcp_client_instance.session.list_tools()
-            tools = [
-                {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "input_schema": tool.inputSchema
-                }
-                for tool in response.tools
-            ]
-            return {"tools": tools}
+            tools = await self.mcp_manager.mcp_client_instance.get_available_tools()
+            return {"tools": list(tools)}
         except Exception as e:
             logger.error(f"[{self.tag}] Error listing MCP tools: {e}")
             raise BaseMCPManagerError(f"[{self.tag}] Error retrieving MCP tools: {str(e)}") from e
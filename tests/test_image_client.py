@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+
+from core.image_client import ImageServiceClient
+
+
+def make_client(handler, **kwargs) -> ImageServiceClient:
+    client = ImageServiceClient(backoff=0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def ndjson(*events) -> httpx.Response:
+    body = "".join(json.dumps(event) + "\n" for event in events)
+    return httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=body.encode())
+
+
+def test_failed_image_is_retried_alone():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts = [req["prompt"] for req in json.loads(request.content)["requests"]]
+        sent.append(prompts)
+        if len(sent) == 1:
+            return ndjson({"index": 1, "error": "boom"}, {"index": 0, "image_data": "img-a"})
+        return ndjson(*({"index": i, "image_data": f"img-{p}"} for i, p in enumerate(prompts)))
+
+    client = make_client(handler, chunk_size=2)
+    results = asyncio.run(client.generate("http://images/generate", [{"prompt": "a"}, {"prompt": "b"}]))
+
+    assert results == ["img-a", "img-b"]
+    assert sent == [["a", "b"], ["b"]]
+    assert client.stats() == {"images": 2, "failures": 0, "retried": 1}
+
+
+def test_missing_image_is_reported_after_last_retry():
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts = [req["prompt"] for req in json.loads(request.content)["requests"]]
+        # "b" never arrives: the stream ends without it
+        return ndjson(*({"index": i, "image_data": f"img-{p}"} for i, p in enumerate(prompts) if p != "b"))
+
+    client = make_client(handler, chunk_size=2, retries=1)
+    results = asyncio.run(client.generate("http://images/generate", [{"prompt": "a"}, {"prompt": "b"}]))
+
+    assert results == ["img-a", None]
+    assert client.stats() == {"images": 1, "failures": 1, "retried": 1}
+
+
+def test_on_image_error_retries_that_image_only():
+    delivered = []
+    failures = {1}
+
+    async def on_image(index: int, image: str) -> None:
+        if index in failures:
+            failures.discard(index)
+            raise RuntimeError("socket closed")
+        delivered.append(index)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        count = len(json.loads(request.content)["requests"])
+        return ndjson(*({"index": i, "image_data": f"img-{i}"} for i in range(count)))
+
+    client = make_client(handler, chunk_size=3)
+    requests = [{"prompt": p} for p in "abc"]
+    results = asyncio.run(client.generate("http://images/generate", requests, on_image=on_image))
+
+    # Images 0 and 2 are delivered from the first response, image 1 from the retry
+    assert sorted(delivered) == [0, 1, 2]
+    assert all(results)
+    assert client.stats() == {"images": 3, "failures": 0, "retried": 1}
@@ -0,0 +1,113 @@
+import glob
+import json
+import os
+import random
+
+import pytest
+
+from core.layout_schema import IMAGE_PATH_META_KEYS, compile_image_paths, extract_parameters_schema, is_image_tool
+
+LAYOUTS_DIR = os.path.join(os.path.dirname(__file__), "..", "layouts_json")
+
+
+def legacy_image_paths(schema, data):
+    """find_image_tool_paths_by_schema_and_data from main.py before image-path plans."""
+    paths = []
+
+    def _walk(sch, dat, cur_path):
+        if not isinstance(sch, dict):
+            return
+        sch_type = sch.get("type")
+        if sch_type == "array" and is_image_tool(sch):
+            if isinstance(dat, list) and len(dat) > 0:
+                for idx in range(len(dat)):
+                    paths.append(cur_path + [idx])
+            else:
+                paths.append(cur_path + [0])
+            return
+        if is_image_tool(sch):
+            paths.append(list(cur_path))
+            return
+        if sch_type == "array":
+            if isinstance(sch.get("data"), dict) and isinstance(dat, list):
+                for idx, item in enumerate(dat):
+                    _walk(sch["data"], item, cur_path + [idx])
+                return
+            items = sch.get("items")
+            if isinstance(items, dict) and isinstance(dat, list):
+                if is_image_tool(items):
+                    for idx in range(len(dat)):
+                        paths.append(cur_path + [idx])
+                    return
+                if items.get("type") == "object" and isinstance(items.get("properties"), dict):
+                    for idx, item in enumerate(dat):
+                        if isinstance(item, dict):
+                            for k, prop_sch in items["properties"].items():
+                                _walk(prop_sch, item.get(k), cur_path + [idx, k])
+                    return
+                return
+        if sch.get("properties") and isinstance(sch.get("properties"), dict) and isinstance(dat, dict):
+            for k, sub_sch in sch["properties"].items():
+                _walk(sub_sch, (dat or {}).get(k), cur_path + [k])
+            return
+        if isinstance(dat, dict):
+            for k, sub_sch in sch.items():
+                if k in IMAGE_PATH_META_KEYS:
+                    continue
+                _walk(sub_sch, dat.get(k), cur_path + [k])
+
+    _walk(schema or {}, data, [])
+    return paths
+
+
+def sample_data(schema, rng: random.Random, depth: int = 0):
+    """Mapped data shaped like the schema, with missing keys, empty lists and wrong types mixed in."""
+    if not isinstance(schema, dict) or depth > 8 or rng.random() < 0.05:
+        return rng.choice([None, "text", 3, [], {}])
+    if schema.get("type") == "array":
+        item = schema.get("data") if isinstance(schema.get("data"), dict) else schema.get("items")
+        return [sample_data(item, rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    if is_image_tool(schema):
+        return "https://example.com/image.png"
+    fields = schema.get("properties") if isinstance(schema.get("properties"), dict) else {
+        k: v for k, v in schema.items() if k not in IMAGE_PATH_META_KEYS
+    }
+    return {k: sample_data(v, rng, depth + 1) for k, v in fields.items() if rng.random() < 0.9}
+
+
+def layout_schemas():
+    schemas = []
+    for path in sorted(glob.glob(os.path.join(LAYOUTS_DIR, "**", "*.json"), recursive=True)):
+        try:
+            with open(path, encoding="utf-8") as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            continue
+        schema = extract_parameters_schema(layout) if isinstance(layout, dict) else None
+        if schema:
+            schemas.append(pytest.param(schema, id=os.path.relpath(path, LAYOUTS_DIR)))
+    return schemas
+
+
+@pytest.mark.parametrize("schema", layout_schemas())
+def test_plan_matches_legacy_walker(schema):
+    plan = compile_image_paths(schema)
+    rng = random.Random(16)
+    for _ in range(50):
+        data = sample_data(schema, rng)
+        assert plan.resolve(data) == legacy_image_paths(schema, data)
+
+
+def test_layouts_have_image_targets():
+    # Guard against the parametrized test passing vacuously
+    assert sum(len(compile_image_paths(p.values[0])) > 0 for p in layout_schemas()) > 10
+
+
+def test_image_array_falls_back_to_first_index():
+    schema = {
+        "hero": {"type": "array", "tool_type": "image_search"},
+        "cards": {"type": "array", "data": {"title": {"type": "string"}, "img": {"type": "string", "tool_type": "image_search"}}},
+    }
+    plan = compile_image_paths(schema)
+    assert plan.describe() == ["hero[*+]", "cards[*].img"]
+    assert plan.resolve({"hero": [], "cards": [{"img": "a"}, {"img": "b"}]}) == [["hero", 0], ["cards", 0, "img"], ["cards", 1, "img"]]
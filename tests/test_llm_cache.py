@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import core.llm
+import core.llm_cache
+from core.llm_cache import MemoryLLMCache, SqliteLLMCache, make_cache_key
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(core.llm_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    caches = []
+
+    def _make(ttl: float = 60, max_entries: int = 10):
+        if request.param == "memory":
+            cache = MemoryLLMCache(ttl=ttl, max_entries=max_entries)
+        else:
+            cache = SqliteLLMCache(str(tmp_path / "llm_cache.sqlite3"), ttl=ttl, max_entries=max_entries)
+        caches.append(cache)
+        return cache
+
+    yield _make
+    for cache in caches:
+        cache.close()
+
+
+def test_cache_key_ignores_whitespace_but_not_model():
+    assert make_cache_key("gpt-4.1", "a  b\n c ") == make_cache_key("gpt-4.1", "a b c")
+    assert make_cache_key("gpt-4.1", "a b c") != make_cache_key("gpt-4.1-mini", "a b c")
+
+
+def test_entries_expire_after_ttl(make_cache, clock):
+    cache = make_cache(ttl=10)
+
+    async def scenario():
+        await cache.set("k", "v")
+        clock.now += 9
+        assert await cache.get("k") == "v"
+        clock.now += 2
+        assert await cache.get("k") is None
+
+    asyncio.run(scenario())
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=2)
+
+    async def scenario():
+        await cache.set("a", "1")
+        clock.now += 1
+        await cache.set("b", "2")
+        clock.now += 1
+        assert await cache.get("a") == "1"  # "b" is now the least recently used
+        clock.now += 1
+        await cache.set("c", "3")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["1", None, "3"]
+
+
+def test_empty_responses_are_not_cached(make_cache, clock):
+    cache = make_cache()
+
+    async def scenario():
+        await cache.set("k", "")
+        return await cache.get("k")
+
+    assert asyncio.run(scenario()) is None
+
+
+@pytest.fixture
+def fake_gpt(monkeypatch):
+    """Serve call_gpt from a list of responses and use a fresh in-memory cache."""
+    responses = []
+    calls = []
+
+    async def call_gpt(prompt, model_name, site="other"):
+        calls.append(prompt)
+        return responses.pop(0)
+
+    monkeypatch.setattr(core.llm, "call_gpt", call_gpt)
+    core.llm.set_llm_cache(MemoryLLMCache(ttl=60, max_entries=10))
+    yield responses, calls
+    core.llm.set_llm_cache(None)
+
+
+def test_call_llm_caches_only_validated_responses(fake_gpt):
+    responses, calls = fake_gpt
+    responses.extend(["not a number", "SELECTED_INDEX: 2"])
+
+    async def scenario():
+        results = []
+        for _ in range(3):
+            results.append(await core.llm.call_llm("pick one", model_name="gpt-4.1-mini",
+                                                   validate=lambda r: r.startswith("SELECTED_INDEX:")))
+        return results
+
+    assert asyncio.run(scenario()) == ["not a number", "SELECTED_INDEX: 2", "SELECTED_INDEX: 2"]
+    # The retry after the rejected response reached the provider; the third call was a cache hit
+    assert len(calls) == 2
+
+
+def test_call_llm_skips_cached_responses_rejected_by_validate(fake_gpt):
+    responses, calls = fake_gpt
+    responses.extend(["garbage", '{"top": {}}'])
+
+    async def scenario():
+        first = await core.llm.call_llm("map it", model_name="gpt-4.1-mini")
+        second = await core.llm.call_llm("map it", model_name="gpt-4.1-mini", validate=lambda r: r.startswith("{"))
+        return first, second
+
+    assert asyncio.run(scenario()) == ("garbage", '{"top": {}}')
+    assert len(calls) == 2
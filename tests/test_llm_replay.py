@@ -0,0 +1,79 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core.llm_replay import LLMReplayMiss, LLMReplayStore, planning_prompt
+
+
+def make_store(tmp_path, **kwargs) -> LLMReplayStore:
+    kwargs.setdefault("latency_ms", 0)
+    return LLMReplayStore(str(tmp_path / "fixtures.jsonl"), **kwargs)
+
+
+def test_key_masks_dates_times_and_unix_timestamps(tmp_path):
+    store = make_store(tmp_path)
+    yesterday = 'Today is 2026-10-16 08:15:02. {"current_unix": 1792138502} Show my calendar.'
+    today = 'Today is 2026-10-17T21:40. {"current_unix": 1792230000} Show my calendar.'
+    assert store.make_key("gpt-4.1-mini", yesterday) == store.make_key("gpt-4.1-mini", today)
+
+
+def test_key_depends_on_model_and_prompt_text(tmp_path):
+    store = make_store(tmp_path)
+    key = store.make_key("gpt-4.1-mini", "Show my calendar")
+    assert key == store.make_key("gpt-4.1-mini", "Show   my\ncalendar")
+    assert key != store.make_key("gpt-4.1", "Show my calendar")
+    assert key != store.make_key("gpt-4.1-mini", "Show my photos")
+    assert key != store.make_key("gpt-4.1-mini", "Show my calendar 2")
+
+
+def test_key_ignore_can_be_disabled(tmp_path):
+    store = make_store(tmp_path, key_ignore="")
+    assert store.make_key("m", "on 2026-10-16") != store.make_key("m", "on 2026-10-17")
+
+
+def test_planning_key_ignores_tool_results():
+    def kwargs(result: str):
+        return {
+            "system": "plan tools",
+            "messages": [
+                {"role": "user", "content": "intent: sleep this week"},
+                {"role": "assistant", "content": [SimpleNamespace(type="tool_use", id="toolu_1", name="health_sleep",
+                                                                  input={"days": 7})]},
+                {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1", "content": result}]},
+            ],
+        }
+
+    assert planning_prompt(kwargs("6h 40m")) == planning_prompt(kwargs("7h 05m"))
+    assert "health_sleep" in planning_prompt(kwargs("6h 40m"))
+
+
+def test_recorded_responses_replay_in_turn(tmp_path):
+    recorder = make_store(tmp_path, mode="record")
+    key = recorder.make_key("m", "pick one at 2026-10-16 08:00")
+    recorder.record(key, "m", "classify", "SELECTED_INDEX: 1", 0.2)
+    recorder.record(key, "m", "classify", "SELECTED_INDEX: 2", 0.3)
+    recorder.close()
+    with open(recorder.path, encoding="utf-8") as f:
+        assert [json.loads(line)["latency_ms"] for line in f] == [200.0, 300.0]
+
+    player = make_store(tmp_path, mode="replay")
+
+    async def scenario():
+        return [await player.replay_text("pick one at 2026-10-17 09:30", "m", "classify") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["SELECTED_INDEX: 1", "SELECTED_INDEX: 2", "SELECTED_INDEX: 1"]
+    assert player.stats()["hits"] == {"classify": 3}
+
+
+def test_miss_raises_or_falls_back_to_site(tmp_path):
+    recorder = make_store(tmp_path, mode="record")
+    recorder.record(recorder.make_key("m", "recorded prompt"), "m", "map", '{"top": {}}', 0.1)
+    recorder.close()
+
+    with pytest.raises(LLMReplayMiss):
+        asyncio.run(make_store(tmp_path, mode="replay").replay_text("other prompt", "m", "map"))
+    fallback = make_store(tmp_path, mode="replay", on_miss="site")
+    assert asyncio.run(fallback.replay_text("other prompt", "m", "map")) == '{"top": {}}'
+    assert fallback.stats()["misses"] == {"map": 1}
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from core.llm_scheduler import LLMScheduler
+
+
+def make_scheduler(**limits) -> LLMScheduler:
+    return LLMScheduler(enabled=True, default_concurrency=1, default_rate_per_minute=0, default_burst=0,
+                        model_limits={"m": limits} if limits else {})
+
+
+async def run_queued(scheduler: LLMScheduler, calls):
+    """Hold the only slot, queue `calls` as (name, priority), then release and record start order."""
+    order = []
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("m", "background"):
+            await release.wait()
+
+    async def call(name, priority):
+        async with scheduler.slot("m", priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    first = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, priority in calls:
+        tasks.append(asyncio.create_task(call(name, priority)))
+        await asyncio.sleep(0)  # enqueue in this order
+    release.set()
+    await asyncio.gather(first, *tasks)
+    return order
+
+
+def test_waiters_run_by_priority_then_fifo():
+    calls = [("bg1", "background"), ("n1", "normal"), ("c1", "critical"), ("bg2", "background"),
+             ("c2", "critical"), ("n2", "normal")]
+    order = asyncio.run(run_queued(make_scheduler(), calls))
+    assert order == ["c1", "c2", "n1", "n2", "bg1", "bg2"]
+
+
+def test_concurrency_cap_per_model():
+    scheduler = make_scheduler(concurrency=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with scheduler.slot("m", "normal"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert scheduler.stats()["m"]["completed"] == 6
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("m", "normal"):
+                await release.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.slot("m", "critical").__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        async with scheduler.slot("m", "normal"):
+            pass
+        return scheduler.stats()["m"]
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == {"critical": 0, "normal": 0, "background": 0}
+
+
+def test_model_limits_override_set_default_limits():
+    scheduler = LLMScheduler(enabled=True, default_concurrency=8, model_limits={"a": {"concurrency": 3}})
+    scheduler.set_default_limits("a", concurrency=16)
+    scheduler.set_default_limits("b", concurrency=16)
+    assert scheduler._lane("a").concurrency == 3
+    assert scheduler._lane("b").concurrency == 16
+    assert scheduler._lane("c").concurrency == 8